@@ -6,6 +6,8 @@ from datetime import datetime, UTC
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    from serialization.provider import FastJSONProvider
+    app.json = FastJSONProvider(app)
     # JWT config
     app.config.setdefault('JWT_SECRET_KEY', app.config.get('SECRET_KEY'))
 
@@ -17,6 +19,16 @@ def create_app():
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    from scheduling.cache import slot_cache
+    slot_cache.init_app(app)
+    from pricing.schedule import live_offers
+    live_offers.init_app(app)
+    from billing.pdf import bill_pdfs
+    bill_pdfs.init_app(app)
+    from billing.pipeline import billing_queue
+    billing_queue.init_app(app)
+    from billing.webhooks import webhook_worker
+    webhook_worker.init_app(app)
 
     # register blueprints
     from routes.auth_routes import auth_bp
@@ -48,6 +60,8 @@ def create_app():
     app.register_blueprint(pay_bp, url_prefix='/payments')
     with app.app_context():
         db.create_all()
+        from inventory.summary import backfill_if_empty
+        backfill_if_empty()
 
     return app
 
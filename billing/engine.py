@@ -0,0 +1,291 @@
+from collections import defaultdict, namedtuple
+from decimal import ROUND_HALF_UP
+from flask import current_app
+from sqlalchemy import and_, insert, literal, select, union_all
+from extensions import db
+from checkout.orders import CENTS, to_decimal
+from models import Appointment, Bill, BillDetail, Booking, Offer, Order, OrderItem, Product, Service
+from pricing.offers import ZERO, combine, discounted, valid_on
+import datetime
+
+# Server-side bill computation. Prices and the offers valid on the billing
+# day come from one query for every line of every bill being made; amounts
+# are Decimal throughout and rounded to paise per line. GST is added on top
+# of list prices (or taken out of them with GST_PRICES_INCLUDE_TAX, or for a
+# charge marked tax_included) at
+# GST_SERVICE_RATE for services and plain charges and GST_PRODUCT_RATE for
+# products.
+
+
+class BillingError(ValueError):
+    pass
+
+
+# one computed bill line; unit_price is the list price, discount and tax are
+# line totals and amount is what the line costs before exclusive tax
+BillLine = namedtuple('BillLine', 'service_id product_id description quantity unit_price discount tax amount')
+
+# a computed bill: Decimal totals and its lines
+Quote = namedtuple('Quote', 'subtotal discount tax total lines')
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _quantity(value):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        raise BillingError('quantity must be an integer')
+    if quantity < 1:
+        raise BillingError('quantity must be at least 1')
+    return quantity
+
+
+def _parse_items(items):
+    # [(kind, id, quantity, description)] from [{service_id|product_id, quantity, description}]
+    parsed = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise BillingError('each item must be an object')
+        service_id, product_id = item.get('service_id'), item.get('product_id')
+        if (service_id is None) == (product_id is None):
+            raise BillingError('each item needs exactly one of service_id and product_id')
+        kind, item_id = ('service', service_id) if service_id is not None else ('product', product_id)
+        try:
+            item_id = int(item_id)
+        except (TypeError, ValueError):
+            raise BillingError(f'{kind}_id must be an integer')
+        parsed.append((kind, item_id, _quantity(item.get('quantity', 1)), item.get('description')))
+    return parsed
+
+
+def _parse_charges(charges):
+    # [(description, amount, tax_included)] from [{description, amount,
+    # tax_included}]; extra lines such as a home visit charge. tax_included
+    # marks an amount that already contains GST (default GST_PRICES_INCLUDE_TAX)
+    parsed = []
+    for charge in charges:
+        if not isinstance(charge, dict) or not charge.get('description'):
+            raise BillingError('each charge needs a description and an amount')
+        try:
+            amount = to_decimal(charge.get('amount')).quantize(CENTS)
+        except ArithmeticError:
+            raise BillingError('charge amount must be a number')
+        if amount < 0:
+            raise BillingError('charge amount must not be negative')
+        tax_included = charge.get('tax_included')
+        if tax_included is not None and not isinstance(tax_included, bool):
+            raise BillingError('charge tax_included must be true or false')
+        parsed.append((charge['description'], amount, tax_included))
+    return parsed
+
+
+def price_rows(service_ids, product_ids, day):
+    # {(kind, id): (name, list price, [offer percents])} for the given ids,
+    # each item outer-joined to the offers valid on day, in one query
+    parts = []
+    if service_ids:
+        parts.append(select(literal('service').label('kind'), Service.id, Service.name, Service.price,
+                            Offer.discount_percent)
+                     .outerjoin(Offer, and_(Offer.service_id == Service.id, *valid_on(day)))
+                     .where(Service.id.in_(service_ids)))
+    if product_ids:
+        parts.append(select(literal('product').label('kind'), Product.id, Product.name, Product.price,
+                            Offer.discount_percent)
+                     .outerjoin(Offer, and_(Offer.product_id == Product.id, *valid_on(day)))
+                     .where(Product.id.in_(product_ids)))
+    if not parts:
+        return {}
+    stmt = parts[0] if len(parts) == 1 else union_all(*parts)
+    found = {}
+    for kind, item_id, name, price, percent in db.session.execute(stmt):
+        entry = found.setdefault((kind, item_id), (name, to_decimal(price).quantize(CENTS), []))
+        if percent is not None:
+            entry[2].append(percent)
+    return found
+
+
+def _tax(amount, rate, inclusive):
+    # GST on a line amount, rounded half up to paise
+    if inclusive:
+        tax = amount * rate / (100 + rate)
+    else:
+        tax = amount * rate / 100
+    return tax.quantize(CENTS, rounding=ROUND_HALF_UP)
+
+
+def _rates():
+    return {'service': to_decimal(_config('GST_SERVICE_RATE', '18')),
+            'product': to_decimal(_config('GST_PRODUCT_RATE', '18'))}
+
+
+def _line(kind, item_id, description, quantity, price, percent, rates, inclusive):
+    # discounted per unit, as the effective price shown in the catalog
+    unit_discount = price - discounted(price, percent) if percent else ZERO
+    amount = (price - unit_discount) * quantity
+    return BillLine(item_id if kind == 'service' else None, item_id if kind == 'product' else None,
+                    description, quantity, price, unit_discount * quantity,
+                    _tax(amount, rates[kind], inclusive), amount)
+
+
+def _totals(lines, included):
+    # included: per line, whether its tax is already in its amount
+    subtotal = sum((line.unit_price * line.quantity for line in lines), ZERO)
+    discount = sum((line.discount for line in lines), ZERO)
+    tax = sum((line.tax for line in lines), ZERO)
+    added = sum((line.tax for line, inclusive in zip(lines, included) if not inclusive), ZERO)
+    return Quote(subtotal, discount, tax, subtotal - discount + added, lines)
+
+
+def _quote(items, charges, prices, rates, inclusive, stacking, cap):
+    lines, included = [], []
+    for kind, item_id, quantity, description in items:
+        entry = prices.get((kind, item_id))
+        if entry is None:
+            raise BillingError(f'{kind} {item_id} not found')
+        name, price, percents = entry
+        percent = combine(percents, stacking, cap) if percents else ZERO
+        lines.append(_line(kind, item_id, description or name, quantity, price, percent, rates, inclusive))
+        included.append(inclusive)
+    for description, amount, tax_included in charges:
+        charge_inclusive = inclusive if tax_included is None else tax_included
+        lines.append(_line('service', None, description, 1, amount, ZERO, rates, charge_inclusive))
+        included.append(charge_inclusive)
+    return _totals(lines, included)
+
+
+def quote_many(requests, day=None):
+    # Quote for each (items, charges) pair, with prices and offers for all
+    # of them from one query. Offers are those valid on day (default today).
+    # Raises BillingError for malformed input or unknown ids.
+    day = day or datetime.date.today()
+    parsed = [(_parse_items(items), _parse_charges(charges)) for items, charges in requests]
+    ids = defaultdict(set)
+    for items, _ in parsed:
+        for kind, item_id, _, _ in items:
+            ids[kind].add(item_id)
+    prices = price_rows(sorted(ids['service']), sorted(ids['product']), day)
+    rates, inclusive = _rates(), bool(_config('GST_PRICES_INCLUDE_TAX', False))
+    stacking, cap = _config('OFFER_STACKING', 'best'), _config('OFFER_MAX_DISCOUNT_PERCENT', 100)
+    return [_quote(items, charges, prices, rates, inclusive, stacking, cap) for items, charges in parsed]
+
+
+def quote(items, charges=(), day=None):
+    return quote_many([(items, charges)], day)[0]
+
+
+def agreed_quote(lines):
+    # Quote for [(kind, id, description, quantity, unit_price)] at prices
+    # the customer already paid (an order's items). Offers are not applied
+    # again and GST is taken out of the prices rather than added, so the
+    # total is what was paid.
+    rates = _rates()
+    bill_lines = [_line(kind, item_id, description, quantity, to_decimal(price).quantize(CENTS), ZERO, rates, True)
+                  for kind, item_id, description, quantity, price in lines]
+    return _totals(bill_lines, [True] * len(bill_lines))
+
+
+def add_bills(bills):
+    # Add a Bill per (fields, quote) in the current transaction: the bills in
+    # one flush, then every line of every bill in one bulk insert. Returns
+    # the Bill objects; the caller commits. status defaults to 'unpaid'.
+    objs = [Bill(total_amount=q.total, tax_amount=q.tax, discount_amount=q.discount, **dict({'status': 'unpaid'}, **fields))
+            for fields, q in bills]
+    if not objs:
+        return objs
+    db.session.add_all(objs)
+    db.session.flush()
+    rows = [{'bill_id': bill.id, 'service_id': line.service_id, 'product_id': line.product_id,
+             'description': line.description, 'quantity': line.quantity,
+             'unit_price': line.unit_price, 'amount': line.amount}
+            for bill, (_, q) in zip(objs, bills) for line in q.lines]
+    if rows:
+        db.session.execute(insert(BillDetail), rows)
+    return objs
+
+
+def add_bill(customer_id, quote, **fields):
+    return add_bills([(dict(fields, customer_id=customer_id), quote)])[0]
+
+
+def _visit_charges(home_charge):
+    amount = to_decimal(home_charge).quantize(CENTS)
+    return [{'description': 'Home visit charge', 'amount': amount}] if amount > 0 else []
+
+
+def _unbilled(model, kind, home_charge, conditions):
+    return db.session.query(literal(kind), model.id, model.customer_id, model.service_id, home_charge,
+                            model.start_datetime) \
+        .outerjoin(Bill, getattr(Bill, f'{kind}_id') == model.id) \
+        .filter(model.status == 'completed', Bill.id.is_(None), *conditions) \
+        .order_by(model.id).all()
+
+
+def unbilled_visits(day):
+    # ('appointment' | 'booking', id, customer_id, service_id, home_charge,
+    # start_datetime) for every visit on day that is completed and has no bill yet
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    return _unbilled(Appointment, 'appointment', literal(0),
+                     [Appointment.start_datetime >= start, Appointment.start_datetime < end]) + \
+        _unbilled(Booking, 'booking', Booking.home_charge,
+                  [Booking.start_datetime >= start, Booking.start_datetime < end])
+
+
+def unbilled_visits_by_id(appointment_ids=(), booking_ids=()):
+    # unbilled_visits() rows for the given ids that are completed and have no bill yet
+    rows = []
+    if appointment_ids:
+        rows += _unbilled(Appointment, 'appointment', literal(0), [Appointment.id.in_(appointment_ids)])
+    if booking_ids:
+        rows += _unbilled(Booking, 'booking', Booking.home_charge, [Booking.id.in_(booking_ids)])
+    return rows
+
+
+def bill_visits(visits):
+    # Bills for unbilled_visits() rows, each priced with the offers of its
+    # visit day, added in the current transaction: one price query per day,
+    # one flush and one detail insert. The unique visit columns on Bill make
+    # a concurrent run fail on commit instead of billing a visit twice.
+    by_day = defaultdict(list)
+    for visit in visits:
+        by_day[visit[5].date()].append(visit)
+    bills = []
+    for day, rows in sorted(by_day.items()):
+        quotes = quote_many([([{'service_id': service_id}], _visit_charges(home_charge))
+                             for _, _, _, service_id, home_charge, _ in rows], day)
+        bills += [({'customer_id': customer_id, f'{kind}_id': visit_id}, q)
+                  for (kind, visit_id, customer_id, _, _, _), q in zip(rows, quotes)]
+    return add_bills(bills)
+
+
+def bill_completed_visits(day):
+    return bill_visits(unbilled_visits(day))
+
+
+def bill_orders(order_ids):
+    # Bills for the given orders that are delivered and have no bill yet, at
+    # the prices their items were ordered at (GST included, see
+    # agreed_quote), in the current transaction. A bill is created paid only
+    # when the order's payment was verified (paid_at); an order can be
+    # delivered without one, and its bill is then unpaid like a visit's.
+    orders = db.session.query(Order.id, Order.customer_id, Order.paid_at) \
+        .outerjoin(Bill, Bill.order_id == Order.id) \
+        .filter(Order.id.in_(order_ids), Order.status == 'delivered', Bill.id.is_(None)) \
+        .order_by(Order.id).all()
+    if not orders:
+        return []
+    items = defaultdict(list)
+    for order_id, product_id, name, quantity, price in db.session.query(
+            OrderItem.order_id, OrderItem.product_id, Product.name, OrderItem.quantity, OrderItem.unit_price) \
+            .outerjoin(Product, Product.id == OrderItem.product_id) \
+            .filter(OrderItem.order_id.in_([o for o, _, _ in orders])).order_by(OrderItem.id):
+        items[order_id].append(('product', product_id, name, quantity or 0, price))
+    return add_bills([({'customer_id': customer_id, 'order_id': order_id,
+                        'status': 'paid' if paid_at is not None else 'unpaid'}, agreed_quote(items[order_id]))
+                      for order_id, customer_id, paid_at in orders])
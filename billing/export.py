@@ -0,0 +1,139 @@
+from collections import defaultdict, deque
+from flask import current_app
+from sqlalchemy import select
+from extensions import db
+from models import Bill, BillDetail, Payment
+from billing.pdf import bill_pdfs, plain_bill
+from serialization.rows import columns, row_dicts
+import csv
+import io
+import time
+import zipfile
+
+# Streamed bill exports. Bills are read through a server-side cursor on a
+# connection of their own, EXPORT_CHUNK rows at a time; each chunk's details
+# and payments come from one IN query each on the session. Output is yielded
+# as it is produced, so memory does not grow with the number of bills.
+
+LEDGER_FIELDS = [
+    'record', 'bill_id', 'created_at', 'customer_id', 'status',
+    'total_amount', 'tax_amount', 'discount_amount', 'appointment_id', 'booking_id', 'order_id',
+    'line_id', 'service_id', 'product_id', 'description', 'quantity', 'unit_price', 'amount',
+    'payment_id', 'method', 'provider', 'provider_payment_id',
+]
+
+
+def _grouped(model, bill_ids):
+    rows = db.session.query(*columns(model)).filter(model.bill_id.in_(bill_ids)).order_by(model.id).all()
+    out = defaultdict(list)
+    for row in row_dicts(rows):
+        out[row['bill_id']].append(row)
+    return out
+
+
+def bill_chunks(conditions, chunk=None):
+    # lists of (bill, details, payments) column dicts, in bill id order
+    chunk = chunk or current_app.config.get('EXPORT_CHUNK', 500)
+    stmt = select(*columns(Bill)).where(*conditions).order_by(Bill.id)
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk).execute(stmt)
+        for partition in result.partitions():
+            bills = [dict(row._mapping) for row in partition]
+            ids = [b['id'] for b in bills]
+            details, payments = _grouped(BillDetail, ids), _grouped(Payment, ids)
+            yield [(b, details[b['id']], payments[b['id']]) for b in bills]
+
+
+def _ledger_rows(bill, details, payments):
+    # the bill, then one row per detail line and per payment
+    yield {'record': 'bill', 'bill_id': bill['id'], 'created_at': bill['created_at'],
+           'customer_id': bill['customer_id'], 'status': bill['status'],
+           'total_amount': bill['total_amount'], 'tax_amount': bill['tax_amount'],
+           'discount_amount': bill['discount_amount'], 'appointment_id': bill['appointment_id'],
+           'booking_id': bill['booking_id'], 'order_id': bill['order_id']}
+    for d in details:
+        yield {'record': 'line', 'bill_id': bill['id'], 'line_id': d['id'], 'service_id': d['service_id'],
+               'product_id': d['product_id'], 'description': d['description'], 'quantity': d['quantity'],
+               'unit_price': d['unit_price'], 'amount': d['amount']}
+    for p in payments:
+        yield {'record': 'payment', 'bill_id': bill['id'], 'payment_id': p['id'], 'created_at': p['created_at'],
+               'status': p['status'], 'amount': p['amount'], 'method': p['method'], 'provider': p['provider'],
+               'provider_payment_id': p['provider_payment_id']}
+
+
+def ledger_csv(conditions):
+    # CSV text of every matching bill with its lines and payments, one chunk at a time
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, LEDGER_FIELDS)
+    writer.writeheader()
+    for chunk in bill_chunks(conditions):
+        for bill, details, payments in chunk:
+            writer.writerows(_ledger_rows(bill, details, payments))
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    yield buf.getvalue()
+
+
+class _Sink(io.RawIOBase):
+    # write-only, unseekable file for ZipFile; drain() hands over what was
+    # written since the last call
+
+    def __init__(self):
+        self._chunks = []
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._written += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._written
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry(name, stamp):
+    return zipfile.ZipInfo(name, stamp)
+
+
+def bills_zip(conditions, with_pdfs=True):
+    # ZIP bytes with ledger.csv and bills/bill_<id>.pdf for every matching
+    # bill. PDFs come from the bill PDF cache; missing ones are rendered in
+    # its worker pool, keeping at most EXPORT_PDF_WINDOW renders in flight.
+    # Only the central directory (a small ZipInfo per entry, written at the
+    # end as the format requires) is kept until the archive is closed.
+    stamp = time.localtime()[:6]
+    sink = _Sink()
+    zf = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+    with zf.open(_entry('ledger.csv', stamp), 'w') as f:
+        for text in ledger_csv(conditions):
+            f.write(text.encode())
+            yield sink.drain()
+    if with_pdfs:
+        window = current_app.config.get('EXPORT_PDF_WINDOW', 8)
+        pending = deque()
+
+        def write_oldest():
+            bill_id, future = pending.popleft()
+            with open(future.result(), 'rb') as pdf:
+                zf.writestr(_entry(f'bills/bill_{bill_id}.pdf', stamp), pdf.read())
+
+        for chunk in bill_chunks(conditions):
+            for bill, details, _ in chunk:
+                pending.append((bill['id'], bill_pdfs.render(bill['id'], plain_bill(bill, details))))
+                while len(pending) > window:
+                    write_oldest()
+                    yield sink.drain()
+        while pending:
+            write_oldest()
+            yield sink.drain()
+    zf.close()
+    yield sink.drain()
@@ -0,0 +1,303 @@
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from flask import current_app
+from extensions import db
+from models import Bill, BillDetail
+from serialization.rows import columns, row_dicts
+import datetime
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+
+# optional imports
+try:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.utils import simpleSplit
+    from reportlab.pdfgen import canvas
+except Exception:
+    letter = None
+    simpleSplit = None
+    canvas = None
+
+# bump when the layout changes so every cached PDF is rendered again
+LAYOUT_VERSION = 2
+
+# export job progress is written to its state file every this many bills
+JOB_PROGRESS_EVERY = 50
+
+TOP, BOTTOM, LEFT, RIGHT = 750, 60, 50, 50
+LINE_HEIGHT = 15
+
+
+def plain_bill(bill, details):
+    # render input from column dicts of a bill and its details, through the
+    # app's encoder so Decimals and datetimes come out as in the API
+    return json.loads(current_app.json.dumps({'bill': bill, 'details': details}))
+
+
+def bill_data(bill_id):
+    # plain_bill() of the bill, or None; two queries
+    rows = db.session.query(*columns(Bill)).filter(Bill.id == bill_id).all()
+    if not rows:
+        return None
+    details = db.session.query(*columns(BillDetail)) \
+        .filter(BillDetail.bill_id == bill_id).order_by(BillDetail.id).all()
+    return plain_bill(row_dicts(rows)[0], row_dicts(details))
+
+
+def content_key(data):
+    # identical bills (and layout) give identical keys; any change gives a new one
+    raw = json.dumps([LAYOUT_VERSION, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _paginate(data, width):
+    # [[line, ...] per page]; descriptions wider than the page are wrapped
+    lines = []
+    for d in data['details']:
+        text = f"- {d['description'] or ''} Qty:{d['quantity']} Amount: {d['amount']}"
+        lines.extend(simpleSplit(text, 'Helvetica', 12, width - LEFT - RIGHT) or [''])
+    bill = data['bill']
+    totals = [f"Tax: {bill['tax_amount']}", f"Discount: {bill['discount_amount']}", f"Total: {bill['total_amount']}"]
+    first = (TOP - 3 * LINE_HEIGHT - BOTTOM) // LINE_HEIGHT
+    rest = (TOP - 2 * LINE_HEIGHT - BOTTOM) // LINE_HEIGHT
+    pages = [lines[:first]]
+    lines = lines[first:]
+    while lines:
+        pages.append(lines[:rest])
+        lines = lines[rest:]
+    # the totals block stays together, after a blank line
+    room = (first if len(pages) == 1 else rest) - len(pages[-1])
+    if room < len(totals) + 1:
+        pages.append([])
+    pages[-1] = pages[-1] + [''] + totals
+    return pages
+
+
+def render_pdf(data):
+    # invoice PDF bytes for bill_data(); pages break between lines and repeat
+    # a short header, and the output is byte-for-byte reproducible
+    width, _ = letter
+    bill = data['bill']
+    pages = _paginate(data, width)
+    buf = io.BytesIO()
+    c = canvas.Canvas(buf, pagesize=letter, invariant=1)
+    for number, lines in enumerate(pages, 1):
+        c.setFont('Helvetica', 12)
+        if number == 1:
+            c.drawString(LEFT, TOP, f"Bill ID: {bill['id']}")
+            c.drawString(LEFT, TOP - LINE_HEIGHT, f"Customer ID: {bill['customer_id']}")
+            c.drawString(LEFT, TOP - 2 * LINE_HEIGHT, f"Date: {bill['created_at']}")
+            y = TOP - 3 * LINE_HEIGHT - 5
+        else:
+            c.drawString(LEFT, TOP, f"Bill ID: {bill['id']} (continued)")
+            y = TOP - 2 * LINE_HEIGHT
+        for line in lines:
+            c.drawString(LEFT, y, line)
+            y -= LINE_HEIGHT
+        c.setFont('Helvetica', 9)
+        c.drawRightString(width - RIGHT, BOTTOM - 25, f"Page {number} of {len(pages)}")
+        c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _write_atomic(path, payload):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def render_to_file(data, path):
+    # runs in the worker pool (threads or processes), so plain data only
+    if not os.path.exists(path):
+        _write_atomic(path, render_pdf(data))
+    return path
+
+
+class BillPdfs:
+    # Rendered bill PDFs, stored on disk under BILL_PDF_DIR and named by bill id
+    # and content key, so a changed bill is simply a new file (older files of
+    # the bill are removed once it exists) and repeated downloads are served
+    # from disk. Rendering runs in a pool of BILL_PDF_WORKERS threads, or
+    # processes with BILL_PDF_POOL='process'; concurrent requests for the same
+    # file share one render.
+
+    def __init__(self):
+        self.app = None
+        self.root = None
+        self._pool = None
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.root = app.config.get('BILL_PDF_DIR') or os.path.join(app.instance_path, 'bill_pdfs')
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                workers = self.app.config.get('BILL_PDF_WORKERS', 2)
+                if self.app.config.get('BILL_PDF_POOL', 'thread') == 'process':
+                    self._pool = ProcessPoolExecutor(max_workers=workers)
+                else:
+                    self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bill-pdf')
+            return self._pool
+
+    def available(self):
+        return canvas is not None
+
+    def path_for(self, bill_id, key):
+        return os.path.join(self.root, f'bill_{bill_id}_{key[:32]}.pdf')
+
+    def _prune(self, bill_id, keep):
+        for path in glob.glob(os.path.join(self.root, f'bill_{bill_id}_*.pdf')):
+            if path != keep:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+    def submit(self, bill_id):
+        # Future resolving to the PDF path of the bill as it is now, or None
+        # when the bill does not exist. Needs an app context.
+        data = bill_data(bill_id)
+        if data is None:
+            return None
+        return self.render(bill_id, data)
+
+    def render(self, bill_id, data):
+        # Future resolving to the PDF path for plain_bill() data
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path_for(bill_id, content_key(data))
+        pool = self.pool
+        with self._lock:
+            future = self._pending.get(path)
+            if future is not None:
+                return future
+            if os.path.exists(path):
+                future = Future()
+                future.set_result(path)
+                return future
+            future = self._pending[path] = pool.submit(render_to_file, data, path)
+
+        def finished(f):
+            with self._lock:
+                self._pending.pop(path, None)
+            if f.exception() is None:
+                self._prune(bill_id, path)
+        future.add_done_callback(finished)
+        return future
+
+    # Monthly export jobs. A job's state is a JSON file under
+    # exports/jobs, so every worker process (gunicorn -w N) can answer for
+    # jobs another one runs. Job files and archives older than
+    # BILL_EXPORT_TTL seconds are removed whenever a job is started.
+
+    def _exports_dir(self, *parts):
+        return os.path.join(self.root, 'exports', *parts)
+
+    def _save_job(self, job):
+        os.makedirs(self._exports_dir('jobs'), exist_ok=True)
+        _write_atomic(self._exports_dir('jobs', f"{job['id']}.json"), json.dumps(job).encode())
+
+    def _load_job(self, job_id):
+        if not re.fullmatch(r'[0-9a-f]{32}', job_id or ''):
+            return None
+        try:
+            with open(self._exports_dir('jobs', f'{job_id}.json')) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _expire_exports(self):
+        cutoff = time.time() - self.app.config.get('BILL_EXPORT_TTL', 86400)
+        for path in glob.glob(self._exports_dir('jobs', '*.json')) + glob.glob(self._exports_dir('*.zip')):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def export_month(self, year, month):
+        # start zipping every bill created in the month; returns the job dict
+        self._expire_exports()
+        job = {'id': uuid.uuid4().hex, 'month': f'{year:04d}-{month:02d}', 'status': 'queued',
+               'bills': 0, 'rendered': 0, 'error': None}
+        self._save_job(job)
+        threading.Thread(target=self._run_export, args=(job, year, month), daemon=True).start()
+        return dict(job)
+
+    def job(self, job_id):
+        job = self._load_job(job_id)
+        return {k: v for k, v in job.items() if k != 'path'} if job else None
+
+    def job_path(self, job_id):
+        job = self._load_job(job_id)
+        if not job or job['status'] != 'done' or not os.path.exists(job['path']):
+            return None
+        return job['path']
+
+    def _run_export(self, job, year, month):
+        try:
+            with self.app.app_context():
+                start = datetime.datetime(year, month, 1)
+                end = datetime.datetime(year + month // 12, month % 12 + 1, 1)
+                bill_ids = [b for b, in db.session.query(Bill.id)
+                            .filter(Bill.created_at >= start, Bill.created_at < end).order_by(Bill.id)]
+                job.update(status='rendering', bills=len(bill_ids))
+                self._save_job(job)
+                files = []
+                for bill_id in bill_ids:
+                    future = self.submit(bill_id)
+                    if future is not None:
+                        files.append((bill_id, future))
+                paths = []
+                for bill_id, future in files:
+                    paths.append((bill_id, future.result()))
+                    job['rendered'] += 1
+                    if job['rendered'] % JOB_PROGRESS_EVERY == 0:
+                        self._save_job(job)
+                db.session.remove()
+            # the same set of bill versions always gives the same archive
+            digest = hashlib.sha256('\n'.join(p for _, p in paths).encode()).hexdigest()[:32]
+            exports = self._exports_dir()
+            os.makedirs(exports, exist_ok=True)
+            path = os.path.join(exports, f"bills_{job['month']}_{digest}.zip")
+            if os.path.exists(path):
+                # reused; keep it from expiring under this job
+                os.utime(path)
+            else:
+                job['status'] = 'zipping'
+                self._save_job(job)
+                fd, tmp = tempfile.mkstemp(dir=exports, suffix='.tmp')
+                os.close(fd)
+                try:
+                    with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_DEFLATED) as zf:
+                        for bill_id, pdf in paths:
+                            zf.write(pdf, f'bill_{bill_id}.pdf')
+                    os.replace(tmp, path)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            job.update(status='done', path=path)
+        except Exception as e:
+            self.app.logger.exception('bill export %s failed', job['month'])
+            job.update(status='failed', error=str(e))
+        self._save_job(job)
+
+
+bill_pdfs = BillPdfs()
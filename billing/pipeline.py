@@ -0,0 +1,159 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from extensions import db
+from models import Appointment, Booking, Order
+from billing import engine
+import itertools
+import threading
+
+# Bills generated from status transitions. A committed transaction that
+# moves an appointment or booking to 'completed' or an order to 'delivered'
+# queues it; a worker thread bills everything queued every
+# BILLING_BATCH_INTERVAL seconds (sooner once BILLING_BATCH_SIZE are
+# waiting) in one transaction, through billing.engine. Transitions made by
+# ORM attribute changes are seen; bulk UPDATE statements are not. The queue
+# is per process and lost on restart, so POST /bills/daily stays the
+# backstop for visits.
+
+# the status that makes each model billable, and its kind in the queue
+BILLABLE = {Appointment: ('appointment', 'completed'),
+            Booking: ('booking', 'completed'),
+            Order: ('order', 'delivered')}
+
+
+def _transitions(session):
+    return session.info.setdefault('billing_transitions', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_transitions(session, flush_context):
+    for obj in itertools.chain(session.new, session.dirty):
+        billable = BILLABLE.get(type(obj))
+        if billable is None:
+            continue
+        kind, status = billable
+        if status in (inspect(obj).attrs.status.history.added or ()):
+            _transitions(session).add((kind, obj.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _queue_committed(session):
+    transitions = session.info.pop('billing_transitions', None)
+    if transitions:
+        billing_queue.put(transitions)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_rolled_back(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('billing_transitions', None)
+
+
+def bill_transitions(transitions):
+    # bills for (kind, id) transitions that are still billable, in the
+    # current transaction; the caller commits
+    ids = {'appointment': set(), 'booking': set(), 'order': set()}
+    for kind, item_id in transitions:
+        ids[kind].add(item_id)
+    visits = engine.unbilled_visits_by_id(sorted(ids['appointment']), sorted(ids['booking']))
+    bills = engine.bill_visits(visits)
+    if ids['order']:
+        bills += engine.bill_orders(sorted(ids['order']))
+    return bills
+
+
+class BillingQueue:
+    # Transitions waiting to be billed, and the worker that bills them.
+    # A batch that fails on a unique constraint (billed concurrently by
+    # another process or by /bills/daily) is retried at once, which skips
+    # what is billed by now. A batch failing otherwise is billed one
+    # transition at a time, and the ones that still fail are kept for the
+    # next run, up to BILLING_MAX_ATTEMPTS runs.
+
+    def __init__(self):
+        self.app = None
+        self._pending = set()
+        self._attempts = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('BILLING_PIPELINE', True):
+            self._thread = threading.Thread(target=self._loop, name='billing-queue', daemon=True)
+            self._thread.start()
+
+    def put(self, transitions):
+        with self._lock:
+            self._pending.update(transitions)
+            full = len(self._pending) >= self.app.config.get('BILLING_BATCH_SIZE', 200)
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.app.config.get('BILLING_BATCH_INTERVAL', 10))
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                self.app.logger.exception('billing queue run failed')
+
+    def flush(self):
+        # bill everything queued now; returns the number of bills made
+        with self._run_lock:
+            with self._lock:
+                batch, self._pending = self._pending, set()
+            if not batch:
+                return 0
+            failed = set()
+            with self.app.app_context():
+                try:
+                    made = self._bill(batch)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception('billing %s transitions failed, billing them one by one', len(batch))
+                    made = 0
+                    for transition in sorted(batch):
+                        try:
+                            made += self._bill({transition})
+                        except Exception:
+                            db.session.rollback()
+                            failed.add(transition)
+            self._retry_later(batch, failed)
+            return made
+
+    def _bill(self, batch):
+        for attempt in range(3):
+            try:
+                bills = bill_transitions(batch)
+                db.session.commit()
+                return len(bills)
+            except IntegrityError:
+                db.session.rollback()
+                if attempt == 2:
+                    raise
+
+    def _retry_later(self, batch, failed):
+        limit = self.app.config.get('BILLING_MAX_ATTEMPTS', 3)
+        with self._lock:
+            for transition in batch - failed:
+                self._attempts.pop(transition, None)
+            for transition in failed:
+                attempts = self._attempts.get(transition, 0) + 1
+                if attempts < limit:
+                    self._attempts[transition] = attempts
+                    self._pending.add(transition)
+                else:
+                    self._attempts.pop(transition, None)
+                    self.app.logger.error('giving up billing %s %s', *transition)
+
+
+billing_queue = BillingQueue()
@@ -0,0 +1,185 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Payment, WebhookEvent
+import datetime
+import hashlib
+import hmac
+import json
+import threading
+
+# Payment webhook ingestion. A delivery is verified, stored once under its
+# provider event id and acknowledged straight away; a worker thread applies
+# stored events in order, retrying failures with exponential backoff. The
+# events table is the queue, so events survive restarts and any number of
+# worker processes can share it: a worker claims an event with a
+# conditional UPDATE on its attempt count before applying it.
+
+PROVIDER = 'razorpay'
+
+
+def _now():
+    return datetime.datetime.utcnow()
+
+
+def valid_signature(secret, payload, signature):
+    # Razorpay signs the raw body with HMAC-SHA256 of the webhook secret
+    expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+
+def event_id(payload, header=None):
+    # Razorpay sends a unique X-Razorpay-Event-Id per event (the same on
+    # redelivery); without it the body digest identifies the event
+    return header or 'sha256:' + hashlib.sha256(payload).hexdigest()
+
+
+def record_event(event_key, name, payload, provider=PROVIDER):
+    # Store a delivery in the current transaction. Returns False when the
+    # event is already stored; the caller commits either way.
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(WebhookEvent), [{
+                'provider': provider, 'event_id': event_key, 'event': name,
+                'payload': payload.decode('utf-8', 'replace'),
+                'status': 'pending', 'attempts': 0, 'next_attempt_at': _now(), 'received_at': _now(),
+            }])
+        return True
+    except IntegrityError:
+        return False
+
+
+def _payment_status(name, entity):
+    # new Payment status for a payment entity event, or None to leave it
+    if name == 'payment.captured' or entity.get('status') == 'captured':
+        return 'completed'
+    if name == 'payment.failed' or entity.get('status') == 'failed':
+        return 'failed'
+    return None
+
+
+def apply_razorpay(body):
+    # Apply a Razorpay event to our payments in the current transaction.
+    # Payments are found by the provider id they were stored with: the
+    # Razorpay order id from /payments/create_order, or the payment id once
+    # verified. A completed payment is never moved back. Applying the same
+    # event twice changes nothing.
+    name = body.get('event') or ''
+    payload = body.get('payload') or {}
+    payment = (payload.get('payment') or {}).get('entity') or {}
+    order = (payload.get('order') or {}).get('entity') or {}
+    if name == 'order.paid':
+        status, ids = 'completed', [payment.get('id'), order.get('id')]
+    elif name.startswith('payment.'):
+        status, ids = _payment_status(name, payment), [payment.get('id'), payment.get('order_id')]
+    else:
+        return 0
+    ids = [i for i in ids if i]
+    if status is None or not ids:
+        return 0
+    changed = 0
+    for p in Payment.query.filter(Payment.provider_payment_id.in_(ids)).all():
+        if p.status == 'completed' or p.status == status:
+            continue
+        p.status = status
+        if payment.get('id'):
+            p.provider_payment_id = payment['id']
+        changed += 1
+    return changed
+
+
+HANDLERS = {PROVIDER: apply_razorpay}
+
+
+class WebhookWorker:
+    # Applies stored webhook events. Wakes when the webhook view stores one
+    # and every WEBHOOK_POLL_INTERVAL seconds (events stored by other
+    # processes, retries). An event failing to apply is retried after
+    # WEBHOOK_RETRY_DELAY * 2^(attempts - 1) seconds and marked failed after
+    # WEBHOOK_MAX_ATTEMPTS; a claim held longer than WEBHOOK_CLAIM_TIMEOUT
+    # (a worker that died mid-event) counts as a failed attempt.
+
+    def __init__(self):
+        self.app = None
+        self._wake = threading.Event()
+        self._thread = None
+        self._run_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('WEBHOOK_WORKER', True):
+            self._thread = threading.Thread(target=self._loop, name='webhook-worker', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.app.config.get('WEBHOOK_POLL_INTERVAL', 5))
+            self._wake.clear()
+            try:
+                while self.run_once():
+                    pass
+            except Exception:
+                self.app.logger.exception('webhook worker run failed')
+
+    def run_once(self):
+        # apply one batch of due events; returns how many were handled
+        with self._run_lock, self.app.app_context():
+            due = db.session.execute(
+                select(WebhookEvent.id, WebhookEvent.attempts)
+                .where(WebhookEvent.status.in_(('pending', 'processing')), WebhookEvent.next_attempt_at <= _now())
+                .order_by(WebhookEvent.id).limit(self.app.config.get('WEBHOOK_BATCH_SIZE', 100))).all()
+            db.session.commit()
+            handled = 0
+            for event_pk, attempts in due:
+                if attempts >= self.app.config.get('WEBHOOK_MAX_ATTEMPTS', 5):
+                    # its last claim timed out
+                    self._give_up(event_pk, attempts)
+                elif self._claim(event_pk, attempts):
+                    self._process(event_pk)
+                    handled += 1
+            return handled
+
+    def _claim(self, event_pk, attempts):
+        # take the event unless another worker took it since it was read
+        lease = datetime.timedelta(seconds=self.app.config.get('WEBHOOK_CLAIM_TIMEOUT', 60))
+        result = db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id == event_pk, WebhookEvent.attempts == attempts,
+                   WebhookEvent.status.in_(('pending', 'processing')))
+            .values(status='processing', attempts=attempts + 1, next_attempt_at=_now() + lease)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _give_up(self, event_pk, attempts):
+        db.session.execute(
+            update(WebhookEvent)
+            .where(WebhookEvent.id == event_pk, WebhookEvent.attempts == attempts,
+                   WebhookEvent.status.in_(('pending', 'processing')))
+            .values(status='failed', last_error='claim timed out on the last attempt')
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+
+    def _process(self, event_pk):
+        ev = db.session.get(WebhookEvent, event_pk)
+        try:
+            HANDLERS[ev.provider](json.loads(ev.payload))
+            ev.status, ev.processed_at, ev.last_error = 'processed', _now(), None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception('webhook event %s (%s) failed', event_pk, ev.event_id)
+            ev = db.session.get(WebhookEvent, event_pk)
+            if ev.attempts >= self.app.config.get('WEBHOOK_MAX_ATTEMPTS', 5):
+                ev.status = 'failed'
+            else:
+                delay = self.app.config.get('WEBHOOK_RETRY_DELAY', 30) * 2 ** (ev.attempts - 1)
+                ev.status, ev.next_attempt_at = 'pending', _now() + datetime.timedelta(seconds=delay)
+            ev.last_error = f'{type(e).__name__}: {e}'[:255]
+            db.session.commit()
+
+
+webhook_worker = WebhookWorker()
@@ -0,0 +1,131 @@
+from functools import wraps
+from flask import current_app, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+import datetime
+import hashlib
+import itertools
+import threading
+import time
+import uuid
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def _now():
+    return datetime.datetime.now(datetime.UTC).replace(microsecond=0)
+
+
+class TableVersions:
+    # Per-process write counter and last-write time of every table, bumped
+    # when a transaction that wrote to the table commits.
+
+    def __init__(self):
+        self.token = uuid.uuid4().hex[:8]   # versions restart with the process
+        self.started = _now()
+        self._versions = {}
+        self._modified = {}
+        self._lock = threading.Lock()
+
+    def bump(self, tables):
+        now = _now()
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+                self._modified[table] = now
+
+    def get(self, tables):
+        # ((version, ...) in tables order, last modified of any of them)
+        with self._lock:
+            return (tuple(self._versions.get(t, 0) for t in tables),
+                    max(self._modified.get(t, self.started) for t in tables))
+
+
+table_versions = TableVersions()
+
+
+def _written(session):
+    return session.info.setdefault('written_tables', set())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        _written(session).add(obj.__table__.name)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(state):
+    # insert()/update()/delete() statements run through the session
+    if (state.is_insert or state.is_update or state.is_delete) and state.bind_mapper is not None:
+        _written(state.session).add(state.bind_mapper.local_table.name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    tables = session.info.pop('written_tables', None)
+    if tables:
+        table_versions.bump(tables)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_rolled_back(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('written_tables', None)
+
+
+def version_key(tables, daily=False):
+    # (parts, last_modified): what the current data of tables depends on, as
+    # strings. Other worker processes do not see this process's versions, so
+    # a version only vouches for CATALOG_CACHE_TTL seconds; daily adds the
+    # date for data that changes at midnight (offer prices).
+    versions, last_modified = table_versions.get(tables)
+    parts = [table_versions.token, ','.join(map(str, versions))]
+    ttl = _config('CATALOG_CACHE_TTL', 60)
+    if ttl:
+        window = int(time.time() // ttl) * ttl
+        parts.append(str(window))
+        last_modified = max(last_modified, datetime.datetime.fromtimestamp(window, datetime.UTC))
+    if daily:
+        parts.append(datetime.date.today().isoformat())
+    return parts, last_modified
+
+
+def validators(tables, daily=False):
+    # (etag, last_modified) of the current request's URL over tables
+    parts, last_modified = version_key(tables, daily)
+    return hashlib.sha1(':'.join([request.full_path] + parts).encode()).hexdigest(), last_modified
+
+
+def http_cached(*tables, daily=False):
+    # ETag / Last-Modified for a GET endpoint whose response depends only on
+    # its URL and the given tables. A matching If-None-Match or
+    # If-Modified-Since gets a 304 before the view (and the database) runs;
+    # clients must revalidate on every use.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag, last_modified = validators(tables, daily)
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                resp = current_app.response_class(status=304)
+            else:
+                resp = make_response(view(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(etag)
+            resp.last_modified = last_modified
+            # responses to authenticated requests (admin views) stay out of shared caches
+            if request.headers.get('Authorization'):
+                resp.cache_control.private = True
+            else:
+                resp.cache_control.public = True
+            resp.cache_control.no_cache = True
+            return resp
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy.orm import selectinload
+from catalog.http_cache import version_key
+from models import Category, SubCategory, Service, Package
+from pricing.offers import price_book, price_fields
+import hashlib
+import threading
+
+# every table the catalog is built from; a committed write to any of them,
+# the date changing (offer prices) or a new CATALOG_CACHE_TTL window (see
+# version_key) makes the next request rebuild it
+TABLES = ('category', 'sub_category', 'service', 'package', 'package_detail', 'offer')
+
+# the serialized catalog and the version key it was built for
+Snapshot = namedtuple('Snapshot', 'key version body')
+
+
+def build_catalog():
+    # {'categories': category -> subcategory -> service tree, 'services':
+    # services outside any known category, 'packages': active packages with
+    # their services expanded}, from five queries
+    book = price_book.get()
+    categories = {c.id: dict(c.to_dict(), subcategories=[], services=[])
+                  for c in Category.query.order_by(Category.name, Category.id).all()}
+    subcategories = {}
+    for sub in SubCategory.query.order_by(SubCategory.name, SubCategory.id).all():
+        node = subcategories[sub.id] = dict(sub.to_dict(), services=[])
+        if sub.category_id in categories:
+            categories[sub.category_id]['subcategories'].append(node)
+    services, loose = {}, []
+    for svc in Service.query.order_by(Service.name, Service.id).all():
+        node = services[svc.id] = dict(svc.to_dict(), **price_fields(book.service(svc.id, svc.price)))
+        sub = subcategories.get(svc.subcategory_id)
+        if sub is not None and svc.category_id in (None, sub['category_id']) and sub['category_id'] in categories:
+            sub['services'].append(node)
+        elif svc.category_id in categories:
+            categories[svc.category_id]['services'].append(node)
+        else:
+            loose.append(node)
+    packages = []
+    for pkg in Package.query.options(selectinload(Package.details)) \
+            .filter(Package.is_active.is_(True)).order_by(Package.id).all():
+        node = pkg.to_dict()
+        node['services'] = [
+            {'service_id': d.service_id, 'quantity': d.quantity,
+             'name': services[d.service_id]['name'] if d.service_id in services else None,
+             'price': services[d.service_id]['price'] if d.service_id in services else None}
+            for d in pkg.details
+        ]
+        packages.append(node)
+    return {'categories': list(categories.values()), 'services': loose, 'packages': packages}
+
+
+class CatalogSnapshot:
+    # /api/catalog body, serialized once and kept until one of TABLES is
+    # written or the CATALOG_CACHE_TTL window moves on, since writes made by
+    # other worker processes are not seen here (see catalog.http_cache). version
+    # is a hash of the content, so rebuilds that change nothing keep it.
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        key, _ = version_key(TABLES, daily=True)
+        with self._lock:
+            if self._snapshot is None or self._snapshot.key != key:
+                catalog = build_catalog()
+                dumps = current_app.json.dumps
+                version = hashlib.sha1(dumps(catalog).encode()).hexdigest()[:16]
+                self._snapshot = Snapshot(key, version, dumps(dict(catalog, version=version)).encode())
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+catalog_snapshot = CatalogSnapshot()
@@ -0,0 +1,138 @@
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from checkout.orders import CENTS, to_decimal
+from models import Cart, CartItem, Product
+from pricing.offers import price_book
+
+
+class CartError(ValueError):
+    pass
+
+
+def get_or_create_cart(customer_id):
+    cart = Cart.query.filter_by(customer_id=customer_id).order_by(Cart.id).first()
+    if not cart:
+        cart = Cart(customer_id=customer_id)
+        db.session.add(cart)
+        db.session.flush()
+    return cart
+
+
+def _quantity(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CartError('quantity must be an integer')
+
+
+def _product_id(value):
+    # ids as stored, so "1" and 1 name the same cart line
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise CartError('product_id must be an integer')
+
+
+def add_item(cart_id, product_id, quantity):
+    # Upsert: raise the quantity of the cart's row for product_id, or insert
+    # it. The unique (cart_id, product_id) constraint settles concurrent adds.
+    # Lines are lowered or removed through set_items, so quantity must be positive.
+    product_id, quantity = _product_id(product_id), _quantity(quantity)
+    if quantity < 1:
+        raise CartError('quantity must be at least 1')
+    inc = update(CartItem).where(CartItem.cart_id == cart_id, CartItem.product_id == product_id) \
+        .values(quantity=CartItem.quantity + quantity).execution_options(synchronize_session=False)
+    if db.session.execute(inc).rowcount == 0:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(CartItem), [{'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity}])
+        except IntegrityError:
+            # inserted concurrently; add to that row instead
+            db.session.execute(inc)
+    invalidate(cart_ids=[cart_id])
+
+
+def set_items(cart_id, changes, replace=False):
+    # Apply many {product_id, quantity} changes in one go: quantity sets the
+    # line's quantity, 0 or less removes it. With replace, lines for products
+    # not mentioned are removed too. One read, then at most one bulk insert,
+    # one bulk update and one delete.
+    wanted = {}
+    for change in changes:
+        if not isinstance(change, dict) or change.get('product_id') is None:
+            raise CartError('each item needs a product_id')
+        wanted[_product_id(change['product_id'])] = _quantity(change.get('quantity', 1))
+    existing = {product_id: (item_id, quantity) for item_id, product_id, quantity in
+                db.session.query(CartItem.id, CartItem.product_id, CartItem.quantity)
+                .filter(CartItem.cart_id == cart_id).all()}
+    inserts, updates, removals = [], [], []
+    for product_id, quantity in wanted.items():
+        current = existing.get(product_id)
+        if quantity <= 0:
+            if current:
+                removals.append(current[0])
+        elif current is None:
+            inserts.append({'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity})
+        elif current[1] != quantity:
+            updates.append({'id': current[0], 'quantity': quantity})
+    if replace:
+        removals.extend(item_id for product_id, (item_id, _) in existing.items() if product_id not in wanted)
+    if inserts:
+        db.session.execute(insert(CartItem), inserts)
+    if updates:
+        db.session.execute(update(CartItem), updates)
+    if removals:
+        db.session.execute(delete(CartItem).where(CartItem.id.in_(removals)).execution_options(synchronize_session=False))
+    if inserts or updates or removals:
+        invalidate(cart_ids=[cart_id])
+
+
+def price_cart(cart_id):
+    # (subtotal, discount, day) of the cart at current list prices and the
+    # day's offer prices from the price book, in one query
+    book = price_book.get()
+    rows = db.session.query(CartItem.product_id, CartItem.quantity, Product.price) \
+        .outerjoin(Product, Product.id == CartItem.product_id) \
+        .filter(CartItem.cart_id == cart_id).all()
+    subtotal = discount = Decimal('0')
+    for product_id, quantity, price in rows:
+        entry = book.product(product_id, price)
+        subtotal += entry.price * (quantity or 0)
+        discount += (entry.price - entry.effective) * (quantity or 0)
+    return subtotal.quantize(CENTS), discount.quantize(CENTS), book.day
+
+
+def cart_totals(cart_id):
+    # {'subtotal', 'discount', 'total'} from the cart row's cache, repricing
+    # only when it was invalidated or priced on an earlier day (other offers
+    # may apply today). The fresh price is stored only if no write bumped
+    # pricing_version meanwhile, so a slow reader cannot cache a stale total;
+    # it is written in the current transaction and the caller commits.
+    today = date.today()
+    row = db.session.query(Cart.subtotal_cache, Cart.discount_cache, Cart.priced_on, Cart.pricing_version) \
+        .filter(Cart.id == cart_id).first()
+    if row is None:
+        return None
+    subtotal, discount, priced_on, version = row
+    if subtotal is None or discount is None or priced_on != today:
+        subtotal, discount, priced_on = price_cart(cart_id)
+        db.session.execute(update(Cart).where(Cart.id == cart_id, Cart.pricing_version == version)
+                           .values(subtotal_cache=subtotal, discount_cache=discount, priced_on=priced_on)
+                           .execution_options(synchronize_session=False))
+    subtotal, discount = to_decimal(subtotal), to_decimal(discount)
+    return {'subtotal': float(subtotal), 'discount': float(discount), 'total': float(subtotal - discount)}
+
+
+def invalidate(cart_ids=None, product_ids=None):
+    # Mark cached totals stale: for the given carts, for every cart holding
+    # one of product_ids, or for all carts when neither is given.
+    stmt = update(Cart).values(subtotal_cache=None, discount_cache=None, pricing_version=Cart.pricing_version + 1)
+    if cart_ids is not None:
+        stmt = stmt.where(Cart.id.in_(list(cart_ids)))
+    elif product_ids is not None:
+        holding = select(CartItem.cart_id).where(CartItem.product_id.in_(list(product_ids)))
+        stmt = stmt.where(Cart.id.in_(holding))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
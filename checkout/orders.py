@@ -0,0 +1,51 @@
+from collections import namedtuple
+from decimal import Decimal
+from sqlalchemy import insert
+from extensions import db
+from models import CartItem, Order, OrderItem, Product
+
+CENTS = Decimal('0.01')
+
+# one priced cart line; unit_price is the Decimal price after offers
+OrderLine = namedtuple('OrderLine', 'product_id quantity unit_price')
+
+
+def to_decimal(value):
+    if value is None:
+        return Decimal('0')
+    if isinstance(value, Decimal):
+        return value
+    # via str so floats from drivers without native decimals keep their printed value
+    return Decimal(str(value))
+
+
+def cart_lines(cart_id):
+    # every item of the cart at today's price after offers, from one query
+    # and the price book, so the order costs what the cart total showed;
+    # items whose product is gone are priced at 0 as before
+    from pricing.offers import price_book   # pricing.offers imports this module
+    book = price_book.get()
+    rows = db.session.query(CartItem.product_id, CartItem.quantity, Product.price) \
+        .outerjoin(Product, Product.id == CartItem.product_id) \
+        .filter(CartItem.cart_id == cart_id) \
+        .order_by(CartItem.id).all()
+    return [OrderLine(product_id, quantity or 0, book.product(product_id, price).effective)
+            for product_id, quantity, price in rows]
+
+
+def order_total(lines):
+    return sum((line.unit_price * line.quantity for line in lines), Decimal('0')).quantize(CENTS)
+
+
+def place_order(customer_id, cart_id, lines):
+    # add the order and bulk-insert its items in the current transaction;
+    # the caller commits
+    order = Order(customer_id=customer_id, cart_id=cart_id, total_amount=order_total(lines), status='pending')
+    db.session.add(order)
+    db.session.flush()
+    if lines:
+        db.session.execute(insert(OrderItem), [
+            {'order_id': order.id, 'product_id': line.product_id, 'quantity': line.quantity, 'unit_price': line.unit_price}
+            for line in lines
+        ])
+    return order
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import update
+from extensions import db
+from inventory import summary
+from models import Stock
+
+# a product's stock can move between reading the rows and decrementing them
+# (other checkouts); re-plan from fresh rows this many times before giving up
+MAX_REPLANS = 3
+
+
+class OutOfStock(Exception):
+
+    def __init__(self, product_id, requested, available):
+        super().__init__(f'insufficient stock for product {product_id}: requested {requested}, available {available}')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+    def to_dict(self):
+        return {'message': 'insufficient stock', 'product_id': self.product_id,
+                'requested': self.requested, 'available': self.available}
+
+
+def demand(lines):
+    # {product_id: total quantity} in first-seen order
+    out = OrderedDict()
+    for line in lines:
+        if line.quantity > 0:
+            out[line.product_id] = out.get(line.product_id, 0) + line.quantity
+    return out
+
+
+def _stock_rows(product_ids, locked=False):
+    # {product_id: [(stock_id, quantity)]} oldest stock row first (FIFO).
+    # locked reads with FOR UPDATE, which sees the latest committed rows:
+    # a plain re-read inside the same REPEATABLE READ transaction (MySQL's
+    # default) would return the snapshot the lost race was planned from.
+    q = db.session.query(Stock.id, Stock.product_id, Stock.quantity) \
+        .filter(Stock.product_id.in_(product_ids), Stock.quantity > 0) \
+        .order_by(Stock.product_id, Stock.id)
+    if locked:
+        q = q.with_for_update()
+    rows = q.all()
+    out = {pid: [] for pid in product_ids}
+    for stock_id, product_id, quantity in rows:
+        out[product_id].append((stock_id, quantity))
+    return out
+
+
+def _plan(rows, wanted):
+    # [(stock_id, take)] drawing from rows in order until wanted is covered
+    plan = []
+    for stock_id, quantity in rows:
+        if wanted <= 0:
+            break
+        take = min(quantity, wanted)
+        plan.append((stock_id, take))
+        wanted -= take
+    return plan
+
+
+def _decrement(stock_id, n):
+    # conditional decrement: succeeds only if the row still holds n units,
+    # so concurrent checkouts can never drive a row below zero
+    result = db.session.execute(
+        update(Stock)
+        .where(Stock.id == stock_id, Stock.quantity >= n)
+        .values(quantity=Stock.quantity - n, last_updated=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def reserve_stock(lines):
+    # Decrement stock for every line in the current transaction, spreading a
+    # product across its Stock rows (one per supplier delivery) in FIFO order.
+    # Raises OutOfStock when a product cannot be covered; the caller must then
+    # roll back, which also undoes decrements already made for this order.
+    wanted = demand(lines)
+    if not wanted:
+        return
+    summary.ensure(wanted)
+    rows = _stock_rows(list(wanted))
+    for product_id, quantity in wanted.items():
+        remaining = quantity
+        for attempt in range(MAX_REPLANS + 1):
+            if attempt:
+                rows[product_id] = _stock_rows([product_id], locked=True)[product_id]
+            available = sum(q for _, q in rows[product_id])
+            if available < remaining:
+                raise OutOfStock(product_id, quantity, available - remaining + quantity)
+            for stock_id, take in _plan(rows[product_id], remaining):
+                if not _decrement(stock_id, take):
+                    # lost a race for this row; re-read and plan what is left
+                    break
+                remaining -= take
+            if remaining == 0:
+                break
+        else:
+            raise OutOfStock(product_id, quantity, quantity - remaining)
+        # taken off the shelf (on_hand) and counted as sold but not yet
+        # delivered (reserved) until the order is delivered
+        summary.adjust(product_id, on_hand=-quantity, reserved=quantity)
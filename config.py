@@ -11,3 +11,63 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', '')
     RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '')
+    # salon opening hours ('HH:MM') and booking slot spacing; staff shifts are clipped to these
+    WORK_START = os.getenv('WORK_START', '09:00')
+    WORK_END = os.getenv('WORK_END', '18:00')
+    SLOT_INTERVAL_MINS = int(os.getenv('SLOT_INTERVAL_MINS', '30'))
+    # seconds before the in-process staff schedule index and roster reload from the DB
+    SCHEDULE_INDEX_TTL = int(os.getenv('SCHEDULE_INDEX_TTL', '30'))
+    # travel time blocked before and after every home booking
+    HOME_TRAVEL_BUFFER_MINS = int(os.getenv('HOME_TRAVEL_BUFFER_MINS', '30'))
+    # slot grid cache: 'memory' (per-process LRU) or 'redis' (shared, needs the redis package)
+    SLOT_CACHE_BACKEND = os.getenv('SLOT_CACHE_BACKEND', 'memory')
+    SLOT_CACHE_URL = os.getenv('SLOT_CACHE_URL', 'redis://localhost:6379/0')
+    SLOT_CACHE_SIZE = int(os.getenv('SLOT_CACHE_SIZE', '512'))
+    SLOT_CACHE_TTL = int(os.getenv('SLOT_CACHE_TTL', '300'))
+    # offer pricing: how several valid offers on one item combine ('best' applies
+    # the largest, 'compound' applies each in turn), the total discount cap, and
+    # seconds before the in-process price book reloads (offer edits in other workers)
+    OFFER_STACKING = os.getenv('OFFER_STACKING', 'best')
+    OFFER_MAX_DISCOUNT_PERCENT = int(os.getenv('OFFER_MAX_DISCOUNT_PERCENT', '100'))
+    OFFER_PRICES_TTL = int(os.getenv('OFFER_PRICES_TTL', '60'))
+    # run the midnight timer that expires offers and rebuilds the live offers list
+    OFFER_SCHEDULER = os.getenv('OFFER_SCHEDULER', '1') == '1'
+    # catalog endpoints send ETag/Last-Modified from per-process table versions;
+    # seconds a worker may answer 304 before writes made in other workers show
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '60'))
+    # JSON encoder behind jsonify: 'auto' uses orjson when installed, 'stdlib' the json module
+    JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto')
+    # bill PDFs: rendered in a pool of BILL_PDF_WORKERS threads ('thread') or processes
+    # ('process'), kept under BILL_PDF_DIR (default instance/bill_pdfs); a download
+    # waits up to BILL_PDF_WAIT seconds for a render before answering 202
+    BILL_PDF_DIR = os.getenv('BILL_PDF_DIR', '')
+    BILL_PDF_POOL = os.getenv('BILL_PDF_POOL', 'thread')
+    BILL_PDF_WORKERS = int(os.getenv('BILL_PDF_WORKERS', '2'))
+    BILL_PDF_WAIT = float(os.getenv('BILL_PDF_WAIT', '10'))
+    # seconds monthly export jobs and their archives are kept (BILL_PDF_DIR/exports)
+    BILL_EXPORT_TTL = int(os.getenv('BILL_EXPORT_TTL', '86400'))
+    # streamed bill exports: bills read per server-side cursor batch, and PDF renders in flight
+    EXPORT_CHUNK = int(os.getenv('EXPORT_CHUNK', '500'))
+    EXPORT_PDF_WINDOW = int(os.getenv('EXPORT_PDF_WINDOW', '8'))
+    # GST percent on bill lines: services and plain charges (home visits) and
+    # products; added on top of list prices unless GST_PRICES_INCLUDE_TAX
+    GST_SERVICE_RATE = os.getenv('GST_SERVICE_RATE', '18')
+    GST_PRODUCT_RATE = os.getenv('GST_PRODUCT_RATE', '18')
+    GST_PRICES_INCLUDE_TAX = os.getenv('GST_PRICES_INCLUDE_TAX', '0') == '1'
+    # bills for completed appointments and bookings and delivered orders: the
+    # worker bills queued transitions every BILLING_BATCH_INTERVAL seconds, or
+    # once BILLING_BATCH_SIZE are waiting, and gives up on one after BILLING_MAX_ATTEMPTS runs
+    BILLING_PIPELINE = os.getenv('BILLING_PIPELINE', '1') == '1'
+    BILLING_BATCH_INTERVAL = float(os.getenv('BILLING_BATCH_INTERVAL', '10'))
+    BILLING_BATCH_SIZE = int(os.getenv('BILLING_BATCH_SIZE', '200'))
+    BILLING_MAX_ATTEMPTS = int(os.getenv('BILLING_MAX_ATTEMPTS', '3'))
+    # payment webhooks are stored and applied by a worker thread: polled every
+    # WEBHOOK_POLL_INTERVAL seconds, WEBHOOK_BATCH_SIZE events per run, retried
+    # after WEBHOOK_RETRY_DELAY * 2^(attempt - 1) seconds up to WEBHOOK_MAX_ATTEMPTS
+    # times; a claimed event is taken over after WEBHOOK_CLAIM_TIMEOUT seconds
+    WEBHOOK_WORKER = os.getenv('WEBHOOK_WORKER', '1') == '1'
+    WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', '5'))
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))
+    WEBHOOK_RETRY_DELAY = float(os.getenv('WEBHOOK_RETRY_DELAY', '30'))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '5'))
+    WEBHOOK_CLAIM_TIMEOUT = int(os.getenv('WEBHOOK_CLAIM_TIMEOUT', '60'))
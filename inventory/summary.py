@@ -0,0 +1,138 @@
+from datetime import datetime
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models import Order, OrderItem, Stock, StockSummary
+
+# Incremental maintenance of StockSummary. Writers of Stock (and of the
+# orders that reserve it) report each change as deltas in the transaction
+# that makes it. A product's summary row is built from the current data the
+# first time it is touched (ensure()), so that has to happen before the
+# change itself reaches the database.
+
+DELIVERED = 'delivered'
+
+
+def _stock_totals(product_ids=None):
+    # {product_id: (on_hand, reorder_level)} summed over Stock rows
+    q = db.session.query(Stock.product_id, func.coalesce(func.sum(Stock.quantity), 0),
+                         func.coalesce(func.sum(Stock.reorder_level), 0)).group_by(Stock.product_id)
+    if product_ids is not None:
+        q = q.filter(Stock.product_id.in_(product_ids))
+    return {pid: (int(on_hand), int(reorder)) for pid, on_hand, reorder in q.all()}
+
+
+def _reserved_totals(product_ids=None):
+    # {product_id: units} sold but not delivered yet; these are already off
+    # on_hand (checkout decrements Stock), so availability is on_hand alone
+    q = db.session.query(OrderItem.product_id, func.coalesce(func.sum(OrderItem.quantity), 0)) \
+        .join(Order, Order.id == OrderItem.order_id) \
+        .filter(Order.status != DELIVERED).group_by(OrderItem.product_id)
+    if product_ids is not None:
+        q = q.filter(OrderItem.product_id.in_(product_ids))
+    return {pid: int(units) for pid, units in q.all()}
+
+
+def _rows(product_ids):
+    stock = _stock_totals(product_ids)
+    reserved = _reserved_totals(product_ids)
+    out = []
+    for pid in product_ids:
+        on_hand, reorder = stock.get(pid, (0, 0))
+        out.append({'product_id': pid, 'on_hand': on_hand, 'reserved': reserved.get(pid, 0),
+                    'reorder_level': reorder, 'is_low': on_hand <= reorder, 'updated_at': datetime.utcnow()})
+    return out
+
+
+def ensure(product_ids):
+    # create summary rows that do not exist yet for product_ids; pending ORM
+    # changes are not flushed first, so call it before or with the change unflushed
+    product_ids = {pid for pid in product_ids if pid is not None}
+    if not product_ids:
+        return
+    with db.session.no_autoflush:
+        _ensure(product_ids)
+
+
+def _ensure(product_ids):
+    existing = {pid for (pid,) in db.session.query(StockSummary.product_id)
+                .filter(StockSummary.product_id.in_(product_ids)).all()}
+    missing = sorted(product_ids - existing)
+    if not missing:
+        return
+    for row in _rows(missing):
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(StockSummary), [row])
+        except IntegrityError:
+            # created concurrently by another writer; its row is just as good
+            pass
+
+
+def adjust(product_id, on_hand=0, reserved=0, reorder_level=0):
+    # Apply deltas to one product's summary in a single UPDATE. is_low is
+    # assigned first so it is computed from the old column values on every
+    # backend (MySQL evaluates SET left to right with already updated values).
+    if not (on_hand or reserved or reorder_level):
+        return
+    db.session.execute(
+        update(StockSummary)
+        .where(StockSummary.product_id == product_id)
+        .ordered_values(
+            (StockSummary.is_low, StockSummary.on_hand + on_hand <= StockSummary.reorder_level + reorder_level),
+            (StockSummary.on_hand, StockSummary.on_hand + on_hand),
+            (StockSummary.reserved, StockSummary.reserved + reserved),
+            (StockSummary.reorder_level, StockSummary.reorder_level + reorder_level),
+            (StockSummary.updated_at, datetime.utcnow()),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def stock_row_changed(old, new):
+    # old/new are (product_id, quantity, reorder_level) of one Stock row
+    # before and after a write, None for an insert or delete; call with the
+    # write made on the ORM object but not yet flushed
+    old = (old[0], int(old[1] or 0), int(old[2] or 0)) if old else None
+    new = (new[0], int(new[1] or 0), int(new[2] or 0)) if new else None
+    ensure([old[0] if old else None, new[0] if new else None])
+    if old and new and old[0] == new[0]:
+        adjust(new[0], on_hand=new[1] - old[1], reorder_level=new[2] - old[2])
+        return
+    if old:
+        adjust(old[0], on_hand=-old[1], reorder_level=-old[2])
+    if new:
+        adjust(new[0], on_hand=new[1], reorder_level=new[2])
+
+
+def order_status_changed(order_id, old_status, new_status):
+    # delivering an order moves its units out of reserved (sold, not yet
+    # delivered); moving it back counts them again. on_hand is not touched:
+    # the units left it at checkout. Call with the new status set on the
+    # Order but not yet flushed.
+    if (old_status == DELIVERED) == (new_status == DELIVERED):
+        return
+    with db.session.no_autoflush:
+        units = db.session.query(OrderItem.product_id, func.sum(OrderItem.quantity)) \
+            .filter(OrderItem.order_id == order_id).group_by(OrderItem.product_id).all()
+        _ensure({pid for pid, _ in units})
+    sign = -1 if new_status == DELIVERED else 1
+    for product_id, quantity in units:
+        adjust(product_id, reserved=sign * int(quantity or 0))
+
+
+def rebuild():
+    # recompute every summary row from Stock and open orders
+    product_ids = set(_stock_totals()) | set(_reserved_totals()) | \
+        {pid for (pid,) in db.session.query(StockSummary.product_id).all()}
+    db.session.query(StockSummary).delete(synchronize_session=False)
+    if product_ids:
+        db.session.execute(insert(StockSummary), _rows(sorted(product_ids)))
+
+
+def backfill_if_empty():
+    # first start on a database created by create_all(): build the table once
+    if db.session.query(StockSummary.product_id).first() is None and \
+            db.session.query(Stock.id).first() is not None:
+        rebuild()
+        db.session.commit()
@@ -0,0 +1,24 @@
+"""
+Track updated_at on appointment and booking for incremental staff assignment sync
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_appointment_booking_updated_at'
+down_revision = 'add_appointment_start_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    for table in ('appointment', 'booking'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = created_at')
+        op.create_index(f'ix_{table}_updated_at', table, ['updated_at'])
+    op.create_index('ix_booking_start_datetime', 'booking', ['start_datetime'])
+
+def downgrade():
+    op.drop_index('ix_booking_start_datetime', table_name='booking')
+    for table in ('appointment', 'booking'):
+        op.drop_index(f'ix_{table}_updated_at', table_name=table)
+        op.drop_column(table, 'updated_at')
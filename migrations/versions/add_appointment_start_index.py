@@ -0,0 +1,17 @@
+"""
+Index appointment.start_datetime for date-range filters and keyset pagination
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_appointment_start_index'
+down_revision = 'add_staff_roster_tables'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_appointment_start_datetime', 'appointment', ['start_datetime'])
+
+def downgrade():
+    op.drop_index('ix_appointment_start_datetime', table_name='appointment')
@@ -0,0 +1,21 @@
+"""
+Link bills to the order they were generated for
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_bill_order_link'
+down_revision = 'add_bill_visit_links'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('bill', sa.Column('order_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_bill_order', 'bill', 'order_tbl', ['order_id'], ['id'])
+    op.create_unique_constraint('uq_bill_order', 'bill', ['order_id'])
+
+def downgrade():
+    op.drop_constraint('uq_bill_order', 'bill', type_='unique')
+    op.drop_constraint('fk_bill_order', 'bill', type_='foreignkey')
+    op.drop_column('bill', 'order_id')
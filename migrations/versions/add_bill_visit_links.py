@@ -0,0 +1,27 @@
+"""
+Link bills to the appointment or booking they were generated for
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_bill_visit_links'
+down_revision = 'add_offer_validity_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('bill', sa.Column('appointment_id', sa.Integer(), nullable=True))
+    op.add_column('bill', sa.Column('booking_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('fk_bill_appointment', 'bill', 'appointment', ['appointment_id'], ['id'])
+    op.create_foreign_key('fk_bill_booking', 'bill', 'booking', ['booking_id'], ['id'])
+    op.create_unique_constraint('uq_bill_appointment', 'bill', ['appointment_id'])
+    op.create_unique_constraint('uq_bill_booking', 'bill', ['booking_id'])
+
+def downgrade():
+    op.drop_constraint('uq_bill_booking', 'bill', type_='unique')
+    op.drop_constraint('uq_bill_appointment', 'bill', type_='unique')
+    op.drop_constraint('fk_bill_booking', 'bill', type_='foreignkey')
+    op.drop_constraint('fk_bill_appointment', 'bill', type_='foreignkey')
+    op.drop_column('bill', 'booking_id')
+    op.drop_column('bill', 'appointment_id')
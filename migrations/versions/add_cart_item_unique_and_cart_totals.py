@@ -0,0 +1,36 @@
+"""
+Merge duplicate cart items, make (cart_id, product_id) unique and cache cart totals
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_cart_item_unique_and_cart_totals'
+down_revision = 'add_stock_summary'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # fold duplicate rows into the oldest one per (cart, product)
+    op.execute("""
+        UPDATE cart_item SET quantity = (
+            SELECT SUM(d.quantity) FROM (SELECT * FROM cart_item) d
+            WHERE d.cart_id = cart_item.cart_id AND d.product_id = cart_item.product_id)
+        WHERE id IN (SELECT MIN(k.id) FROM (SELECT * FROM cart_item) k GROUP BY k.cart_id, k.product_id)
+    """)
+    op.execute("""
+        DELETE FROM cart_item
+        WHERE id NOT IN (SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM cart_item GROUP BY cart_id, product_id) k)
+    """)
+    op.create_unique_constraint('uq_cart_item_cart_product', 'cart_item', ['cart_id', 'product_id'])
+    op.add_column('cart', sa.Column('subtotal_cache', sa.Numeric(10, 2), nullable=True))
+    op.add_column('cart', sa.Column('discount_cache', sa.Numeric(10, 2), nullable=True))
+    op.add_column('cart', sa.Column('priced_on', sa.Date(), nullable=True))
+    op.add_column('cart', sa.Column('pricing_version', sa.Integer(), nullable=False, server_default='0'))
+
+def downgrade():
+    op.drop_column('cart', 'pricing_version')
+    op.drop_column('cart', 'priced_on')
+    op.drop_column('cart', 'discount_cache')
+    op.drop_column('cart', 'subtotal_cache')
+    op.drop_constraint('uq_cart_item_cart_product', 'cart_item', type_='unique')
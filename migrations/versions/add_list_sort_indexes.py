@@ -0,0 +1,27 @@
+"""
+Index the default sort columns of collection endpoints for keyset pagination
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_list_sort_indexes'
+down_revision = 'add_appointment_booking_updated_at'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_order_tbl_created_at', 'order_tbl', 'created_at'),
+    ('ix_bill_created_at', 'bill', 'created_at'),
+    ('ix_complaint_created_at', 'complaint', 'created_at'),
+    ('ix_product_name', 'product', 'name'),
+    ('ix_users_name', 'users', 'name'),
+]
+
+def upgrade():
+    for name, table, column in INDEXES:
+        op.create_index(name, table, [column])
+
+def downgrade():
+    for name, table, column in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,17 @@
+"""
+Index offers by validity window for the live-offers query
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_offer_validity_index'
+down_revision = 'add_cart_item_unique_and_cart_totals'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_offer_validity', 'offer', ['is_active', 'start_date', 'end_date'])
+
+def downgrade():
+    op.drop_index('ix_offer_validity', table_name='offer')
@@ -0,0 +1,19 @@
+"""
+Record when an order's payment was verified
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_paid_at'
+down_revision = 'add_webhook_events'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column('order_tbl', sa.Column('paid_at', sa.DateTime(), nullable=True))
+    # orders still in 'paid' are known to be paid; when is not
+    op.execute("UPDATE order_tbl SET paid_at = created_at WHERE status = 'paid'")
+
+def downgrade():
+    op.drop_column('order_tbl', 'paid_at')
@@ -0,0 +1,38 @@
+"""
+Add staff_shift, staff_break and holiday tables for staff rosters
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_staff_roster_tables'
+down_revision = 'add_service_type_to_appointments'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    for table in ('staff_shift', 'staff_break'):
+        op.create_table(
+            table,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('staff_id', sa.Integer(), sa.ForeignKey('staff.id'), nullable=False),
+            sa.Column('weekday', sa.Integer(), nullable=False),
+            sa.Column('start_time', sa.Time(), nullable=False),
+            sa.Column('end_time', sa.Time(), nullable=False),
+        )
+        op.create_index(f'ix_{table}_staff_id', table, ['staff_id'])
+    op.create_table(
+        'holiday',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('staff_id', sa.Integer(), sa.ForeignKey('staff.id'), nullable=True),
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('reason', sa.String(length=255), nullable=True),
+    )
+    op.create_index('ix_holiday_date', 'holiday', ['date'])
+
+def downgrade():
+    op.drop_index('ix_holiday_date', table_name='holiday')
+    op.drop_table('holiday')
+    for table in ('staff_break', 'staff_shift'):
+        op.drop_index(f'ix_{table}_staff_id', table_name=table)
+        op.drop_table(table)
@@ -0,0 +1,17 @@
+"""
+Index stock.product_id for per-product FIFO stock reservation at checkout
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stock_product_index'
+down_revision = 'add_list_sort_indexes'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_index('ix_stock_product_id', 'stock', ['product_id'])
+
+def downgrade():
+    op.drop_index('ix_stock_product_id', table_name='stock')
@@ -0,0 +1,44 @@
+"""
+Materialized per-product stock summary with an indexed low-stock flag
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_stock_summary'
+down_revision = 'add_stock_product_index'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'stock_summary',
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('product.id'), primary_key=True),
+        sa.Column('on_hand', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('reserved', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('reorder_level', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('is_low', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+    )
+    op.create_index('ix_stock_summary_is_low', 'stock_summary', ['is_low'])
+    # backfill from current stock rows and undelivered orders
+    op.execute("""
+        INSERT INTO stock_summary (product_id, on_hand, reserved, reorder_level, is_low, updated_at)
+        SELECT p.id,
+               COALESCE(s.on_hand, 0),
+               COALESCE(r.reserved, 0),
+               COALESCE(s.reorder_level, 0),
+               COALESCE(s.on_hand, 0) <= COALESCE(s.reorder_level, 0),
+               CURRENT_TIMESTAMP
+        FROM product p
+        LEFT JOIN (SELECT product_id, SUM(quantity) AS on_hand, SUM(reorder_level) AS reorder_level
+                   FROM stock GROUP BY product_id) s ON s.product_id = p.id
+        LEFT JOIN (SELECT oi.product_id, SUM(oi.quantity) AS reserved
+                   FROM order_item oi JOIN order_tbl o ON o.id = oi.order_id
+                   WHERE o.status <> 'delivered' GROUP BY oi.product_id) r ON r.product_id = p.id
+        WHERE s.product_id IS NOT NULL OR r.product_id IS NOT NULL
+    """)
+
+def downgrade():
+    op.drop_index('ix_stock_summary_is_low', table_name='stock_summary')
+    op.drop_table('stock_summary')
@@ -0,0 +1,36 @@
+"""
+Store payment webhook deliveries for deduplicated background processing and
+index payments by provider id
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_webhook_events'
+down_revision = 'add_bill_order_link'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        'webhook_event',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('provider', sa.String(50), nullable=False),
+        sa.Column('event_id', sa.String(100), nullable=False),
+        sa.Column('event', sa.String(100)),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime()),
+        sa.Column('last_error', sa.String(255)),
+        sa.Column('received_at', sa.DateTime()),
+        sa.Column('processed_at', sa.DateTime()),
+        sa.UniqueConstraint('provider', 'event_id', name='uq_webhook_event_provider_event'),
+    )
+    op.create_index('ix_webhook_event_due', 'webhook_event', ['status', 'next_attempt_at'])
+    op.create_index('ix_payment_provider_payment_id', 'payment', ['provider_payment_id'])
+
+def downgrade():
+    op.drop_index('ix_payment_provider_payment_id', table_name='payment')
+    op.drop_index('ix_webhook_event_due', table_name='webhook_event')
+    op.drop_table('webhook_event')
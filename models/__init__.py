@@ -1,23 +1,23 @@
 from .user import Users
 from .customer import Customer
-from .staff import Staff
+from .staff import Staff, StaffShift, StaffBreak, Holiday
 from .location import State, City, Area
 from .category import Category, SubCategory
 from .service import Service
 from .package import Package, PackageDetail
 from .appointment import Appointment, AppointmentDetail, Booking, BookingDetail
-from .billing import Bill, BillDetail, Payment, Charge, ChargeDetail
-from .product import Brand, Product, ProductDetail, Supplier, Stock
+from .billing import Bill, BillDetail, Payment, Charge, ChargeDetail, WebhookEvent
+from .product import Brand, Product, ProductDetail, Supplier, Stock, StockSummary
 from .order import Cart, CartItem, Order, OrderItem
 from .delivery import Delivery
 from .offer import Offer
 from .feedback import Complaint, Feedback
 
 __all__ = [
-	'Users', 'Customer', 'Staff', 'State', 'City', 'Area',
+	'Users', 'Customer', 'Staff', 'StaffShift', 'StaffBreak', 'Holiday', 'State', 'City', 'Area',
 	'Category', 'SubCategory', 'Service', 'Package', 'PackageDetail'
 	'Appointment', 'AppointmentDetail', 'Booking', 'BookingDetail',
-	'Bill', 'BillDetail', 'Payment', 'Charge', 'ChargeDetail',
-	'Brand', 'Product', 'ProductDetail', 'Supplier', 'Stock',
+	'Bill', 'BillDetail', 'Payment', 'Charge', 'ChargeDetail', 'WebhookEvent',
+	'Brand', 'Product', 'ProductDetail', 'Supplier', 'Stock', 'StockSummary',
 	'Cart', 'CartItem', 'Order', 'OrderItem', 'Delivery', 'Offer', 'Complaint', 'Feedback'
 ]
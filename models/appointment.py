@@ -7,10 +7,11 @@ class Appointment(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
-    start_datetime = db.Column(db.DateTime, nullable=False)
+    start_datetime = db.Column(db.DateTime, nullable=False, index=True)
     end_datetime = db.Column(db.DateTime, nullable=False)
     status = db.Column(db.String(30), nullable=False, default='pending')  # pending, approved, rejected, cancelled, completed
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
     service_type = db.Column(db.String(10), nullable=False, default='salon')  # salon or home
 
     customer = db.relationship('Customer', backref=db.backref('appointments', lazy=True))
@@ -45,7 +46,7 @@ class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
-    start_datetime = db.Column(db.DateTime, nullable=False)
+    start_datetime = db.Column(db.DateTime, nullable=False, index=True)
     end_datetime = db.Column(db.DateTime, nullable=False)
     address = db.Column(db.String(255), nullable=False)
     pincode = db.Column(db.String(20), nullable=True)
@@ -53,6 +54,7 @@ class Booking(db.Model):
     staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
     status = db.Column(db.String(30), nullable=False, default='pending')
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
 
     customer = db.relationship('Customer', backref=db.backref('bookings', lazy=True))
     staff = db.relationship('Staff')
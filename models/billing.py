@@ -3,13 +3,21 @@ from datetime import datetime
 
 
 class Bill(db.Model):
+    # a visit or order is billed at most once
+    __table_args__ = (db.UniqueConstraint('appointment_id', name='uq_bill_appointment'),
+                      db.UniqueConstraint('booking_id', name='uq_bill_booking'),
+                      db.UniqueConstraint('order_id', name='uq_bill_order'))
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     total_amount = db.Column(db.Numeric(10, 2), default=0.00)
     tax_amount = db.Column(db.Numeric(10, 2), default=0.00)
     discount_amount = db.Column(db.Numeric(10, 2), default=0.00)
     status = db.Column(db.String(50), default='unpaid')
+    # the visit or order the bill is for, when billed by billing.engine
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointment.id'), nullable=True)
+    booking_id = db.Column(db.Integer, db.ForeignKey('booking.id'), nullable=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order_tbl.id'), nullable=True)
 
     details = db.relationship('BillDetail', backref='bill', lazy=True)
     payments = db.relationship('Payment', backref='bill', lazy=True)
@@ -23,6 +31,9 @@ class Bill(db.Model):
             'tax_amount': float(self.tax_amount),
             'discount_amount': float(self.discount_amount),
             'status': self.status,
+            'appointment_id': self.appointment_id,
+            'booking_id': self.booking_id,
+            'order_id': self.order_id,
             'details': [d.to_dict() for d in self.details]
         }
 
@@ -56,7 +67,8 @@ class Payment(db.Model):
     amount = db.Column(db.Numeric(10, 2), default=0.00)
     method = db.Column(db.String(50))
     provider = db.Column(db.String(50))
-    provider_payment_id = db.Column(db.String(255))
+    # webhooks look payments up by the provider's order or payment id
+    provider_payment_id = db.Column(db.String(255), index=True)
     status = db.Column(db.String(50), default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -104,3 +116,39 @@ class ChargeDetail(db.Model):
 
     def to_dict(self):
         return {'id': self.id, 'charge_id': self.charge_id, 'key_name': self.key_name, 'key_value': self.key_value}
+
+
+class WebhookEvent(db.Model):
+    # A payment provider webhook delivery, stored as received and applied by
+    # billing.webhooks. (provider, event_id) is unique, so a redelivered
+    # event is recognised and not stored or applied again. status is
+    # pending, processing (claimed by a worker until next_attempt_at),
+    # processed or failed (gave up after WEBHOOK_MAX_ATTEMPTS).
+    __tablename__ = 'webhook_event'
+    __table_args__ = (db.UniqueConstraint('provider', 'event_id', name='uq_webhook_event_provider_event'),
+                      db.Index('ix_webhook_event_due', 'status', 'next_attempt_at'))
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(50), nullable=False)
+    event_id = db.Column(db.String(100), nullable=False)
+    event = db.Column(db.String(100))
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.String(255))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'provider': self.provider,
+            'event_id': self.event_id,
+            'event': self.event,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
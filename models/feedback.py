@@ -8,7 +8,7 @@ class Complaint(db.Model):
     subject = db.Column(db.String(200))
     message = db.Column(db.Text)
     status = db.Column(db.String(50), default='open')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     reviewed_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
 
     def to_dict(self):
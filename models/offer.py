@@ -14,6 +14,9 @@ class Offer(db.Model):
     end_date = db.Column(db.Date)
     is_active = db.Column(db.Boolean, default=True)
 
+    # live offers are looked up by is_active and today's date in the window
+    __table_args__ = (db.Index('ix_offer_validity', 'is_active', 'start_date', 'end_date'),)
+
     def is_valid(self):
         today = date.today()
         if not self.is_active:
@@ -6,6 +6,12 @@ class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # cached totals, see checkout.cart; NULL (or priced_on before today) means
+    # stale, pricing_version is bumped by every invalidation
+    subtotal_cache = db.Column(db.Numeric(10, 2), nullable=True)
+    discount_cache = db.Column(db.Numeric(10, 2), nullable=True)
+    priced_on = db.Column(db.Date, nullable=True)
+    pricing_version = db.Column(db.Integer, nullable=False, default=0)
 
     items = db.relationship('CartItem', backref='cart', lazy=True)
 
@@ -14,6 +20,8 @@ class Cart(db.Model):
 
 
 class CartItem(db.Model):
+    # one row per product in a cart; adding a product again raises its quantity
+    __table_args__ = (db.UniqueConstraint('cart_id', 'product_id', name='uq_cart_item_cart_product'),)
     id = db.Column(db.Integer, primary_key=True)
     cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
@@ -30,7 +38,9 @@ class Order(db.Model):
     cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=True)
     total_amount = db.Column(db.Numeric(10, 2), default=0.00)
     status = db.Column(db.String(50), default='pending')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # set when /razorpay/verify confirms payment; status moves on from 'paid'
+    paid_at = db.Column(db.DateTime, nullable=True)
 
     items = db.relationship('OrderItem', backref='order', lazy=True)
 
@@ -13,7 +13,7 @@ class Brand(db.Model):
 
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(200), nullable=False)
+    name = db.Column(db.String(200), nullable=False, index=True)
     brand_id = db.Column(db.Integer, db.ForeignKey('brand.id'), nullable=True)
     sku = db.Column(db.String(120))
     price = db.Column(db.Numeric(10, 2), default=0.00)
@@ -56,7 +56,7 @@ class Supplier(db.Model):
 
 class Stock(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
     supplier_id = db.Column(db.Integer, db.ForeignKey('supplier.id'), nullable=True)
     quantity = db.Column(db.Integer, default=0)
     reorder_level = db.Column(db.Integer, default=5)
@@ -66,3 +66,23 @@ class Stock(db.Model):
 
     def to_dict(self):
         return {'id': self.id, 'product_id': self.product_id, 'supplier_id': self.supplier_id, 'quantity': self.quantity, 'reorder_level': self.reorder_level}
+
+
+class StockSummary(db.Model):
+    # Per-product stock totals, maintained incrementally by inventory.summary
+    # on every Stock write and checkout. on_hand and reorder_level are sums
+    # over the product's Stock rows, so on_hand is what is available to sell.
+    # reserved counts units sold but not yet delivered; checkout already took
+    # them off on_hand, so it is for tracking deliveries only and must not be
+    # subtracted from on_hand again. is_low is on_hand <= reorder_level,
+    # stored so low-stock alerts are an index lookup.
+    __tablename__ = 'stock_summary'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    on_hand = db.Column(db.Integer, nullable=False, default=0)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+    reorder_level = db.Column(db.Integer, nullable=False, default=0)
+    is_low = db.Column(db.Boolean, nullable=False, default=True, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {'product_id': self.product_id, 'on_hand': self.on_hand, 'reserved': self.reserved, 'reorder_level': self.reorder_level, 'is_low': self.is_low}
@@ -18,3 +18,56 @@ class Staff(db.Model):
             'is_active': self.is_active,
             'is_available': self.is_available
         }
+
+
+class StaffShift(db.Model):
+    # weekly working hours; a staff member without any shift works the salon's default hours
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+
+    staff = db.relationship('Staff', backref=db.backref('shifts', lazy=True, cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'staff_id': self.staff_id,
+            'weekday': self.weekday,
+            'start': self.start_time.strftime('%H:%M'),
+            'end': self.end_time.strftime('%H:%M')
+        }
+
+
+class StaffBreak(db.Model):
+    # weekly recurring break carved out of the shifts of that weekday
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+
+    staff = db.relationship('Staff', backref=db.backref('breaks', lazy=True, cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'staff_id': self.staff_id,
+            'weekday': self.weekday,
+            'start': self.start_time.strftime('%H:%M'),
+            'end': self.end_time.strftime('%H:%M')
+        }
+
+
+class Holiday(db.Model):
+    # day off for one staff member, or for the whole salon when staff_id is empty
+    id = db.Column(db.Integer, primary_key=True)
+    staff_id = db.Column(db.Integer, db.ForeignKey('staff.id'), nullable=True)
+    date = db.Column(db.Date, nullable=False, index=True)
+    reason = db.Column(db.String(255))
+
+    staff = db.relationship('Staff', backref=db.backref('holidays', lazy=True, cascade='all, delete-orphan'))
+
+    def to_dict(self):
+        return {'id': self.id, 'staff_id': self.staff_id, 'date': self.date.isoformat(), 'reason': self.reason}
@@ -0,0 +1,140 @@
+from collections import defaultdict, namedtuple
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import or_
+from extensions import db
+from checkout.orders import CENTS, to_decimal
+from models import Offer, Product, Service
+import datetime
+import threading
+import time
+
+ZERO = Decimal('0')
+
+# list price, combined discount percent and price after offers, all Decimal
+Price = namedtuple('Price', 'price discount_percent effective')
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def valid_on(day):
+    # SQL conditions for offers that apply on day
+    return (Offer.is_active.is_(True),
+            or_(Offer.start_date.is_(None), Offer.start_date <= day),
+            or_(Offer.end_date.is_(None), Offer.end_date >= day))
+
+
+def combine(percents, stacking='best', cap=100):
+    # Total discount percent of several offers on one item: the largest one
+    # ('best') or each applied to what the previous left ('compound', so 10%
+    # and 20% give 28%), never more than cap.
+    percents = [min(max(int(p or 0), 0), 100) for p in percents]
+    if not percents:
+        return ZERO
+    if stacking == 'compound':
+        left = Decimal('1')
+        for p in percents:
+            left *= (100 - Decimal(p)) / 100
+        total = (1 - left) * 100
+    else:
+        total = Decimal(max(percents))
+    return min(total, Decimal(cap)).quantize(CENTS)
+
+
+def discounted(price, percent):
+    price = to_decimal(price).quantize(CENTS)
+    return price - (price * percent / 100).quantize(CENTS)
+
+
+class PriceBook:
+    # Effective prices of every product and service on one day, built from
+    # three queries. Looking one up is a dict hit; items created or repriced
+    # since the build are priced from their current list price and the
+    # offers known for their id, so only offer edits need a rebuild.
+
+    def __init__(self, day, offers, product_prices, service_prices, stacking='best', cap=100):
+        self.day = day
+        found = {'product': defaultdict(list), 'service': defaultdict(list)}
+        for product_id, service_id, percent in offers:
+            if product_id is not None:
+                found['product'][product_id].append(percent)
+            if service_id is not None:
+                found['service'][service_id].append(percent)
+        self._percents = {kind: {item_id: combine(p, stacking, cap) for item_id, p in by_id.items()}
+                          for kind, by_id in found.items()}
+        self._prices = {'product': self._precompute('product', product_prices),
+                        'service': self._precompute('service', service_prices)}
+
+    def _precompute(self, kind, rows):
+        percents = self._percents[kind]
+        out = {}
+        for item_id, price in rows:
+            price = to_decimal(price).quantize(CENTS)
+            percent = percents.get(item_id, ZERO)
+            out[item_id] = Price(price, percent, discounted(price, percent) if percent else price)
+        return out
+
+    def lookup(self, kind, item_id, price):
+        # Price of item_id whose list price is now `price`
+        price = to_decimal(price).quantize(CENTS)
+        entry = self._prices[kind].get(item_id)
+        if entry is not None and entry.price == price:
+            return entry
+        percent = self._percents[kind].get(item_id, ZERO)
+        return Price(price, percent, discounted(price, percent) if percent else price)
+
+    def product(self, product_id, price):
+        return self.lookup('product', product_id, price)
+
+    def service(self, service_id, price):
+        return self.lookup('service', service_id, price)
+
+
+def build(day):
+    offers = db.session.query(Offer.product_id, Offer.service_id, Offer.discount_percent) \
+        .filter(*valid_on(day)) \
+        .filter(or_(Offer.product_id.isnot(None), Offer.service_id.isnot(None))).all()
+    return PriceBook(
+        day, offers,
+        db.session.query(Product.id, Product.price).all(),
+        db.session.query(Service.id, Service.price).all(),
+        stacking=_config('OFFER_STACKING', 'best'),
+        cap=_config('OFFER_MAX_DISCOUNT_PERCENT', 100),
+    )
+
+
+class PriceBookStore:
+    # process-wide PriceBook for today, rebuilt after invalidate(), when the
+    # date changes (offers start and end at day boundaries) or once it is older
+    # than OFFER_PRICES_TTL seconds (offer edits made in other worker processes)
+
+    def __init__(self):
+        self._book = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        today = datetime.date.today()
+        with self._lock:
+            ttl = _config('OFFER_PRICES_TTL', 60)
+            if self._book is None or self._book.day != today or time.monotonic() - self._loaded_at >= ttl:
+                self._book = build(today)
+                self._loaded_at = time.monotonic()
+            return self._book
+
+    def invalidate(self):
+        with self._lock:
+            self._book = None
+
+
+def price_fields(entry):
+    # extra keys for a product's or service's to_dict()
+    return {'discount_percent': float(entry.discount_percent), 'effective_price': float(entry.effective)}
+
+
+price_book = PriceBookStore()
@@ -0,0 +1,95 @@
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import update
+from extensions import db
+from models import Offer
+from pricing.offers import price_book, valid_on
+import datetime
+import threading
+import time
+
+# today's live offers as the JSON body /offers sends
+Snapshot = namedtuple('Snapshot', 'day body')
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def expire_offers(day):
+    # switch off active offers whose end date is before day; returns how many
+    result = db.session.execute(
+        update(Offer)
+        .where(Offer.is_active.is_(True), Offer.end_date < day)
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def live_offer_rows(day):
+    return Offer.query.filter(*valid_on(day)).order_by(Offer.id).all()
+
+
+class LiveOffers:
+    # Today's live offers, serialized once and served from memory. A timer
+    # thread wakes just after every midnight to switch off expired offers,
+    # drop the price book and rebuild the list; offers starting that day
+    # appear through the date filter. The list is also rebuilt after
+    # invalidate(), on the first request of a new day when the timer is off,
+    # and once older than OFFER_PRICES_TTL seconds (offer edits made in other
+    # worker processes).
+
+    def __init__(self):
+        self.app = None
+        self._snapshot = None
+        self._loaded_at = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        if app.config.get('OFFER_SCHEDULER', True):
+            self._schedule()
+
+    def _schedule(self):
+        now = datetime.datetime.now()
+        midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time.min)
+        self._timer = threading.Timer((midnight - now).total_seconds() + 1, self._tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _tick(self):
+        try:
+            with self.app.app_context():
+                expired = expire_offers(datetime.date.today())
+                price_book.invalidate()
+                self.invalidate()
+                self.get()
+                self.app.logger.info('offer schedule: %s offers expired', expired)
+        except Exception:
+            self.app.logger.exception('offer schedule run failed')
+        finally:
+            self._schedule()
+
+    def get(self):
+        today = datetime.date.today()
+        with self._lock:
+            ttl = _config('OFFER_PRICES_TTL', 60)
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.day != today or time.monotonic() - self._loaded_at >= ttl:
+                body = current_app.json.dumps([o.to_dict() for o in live_offer_rows(today)]).encode()
+                snapshot = self._snapshot = Snapshot(today, body)
+                self._loaded_at = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+
+
+live_offers = LiveOffers()
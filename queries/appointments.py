@@ -0,0 +1,63 @@
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Appointment, Customer, Service, Staff, Users
+from queries.pagination import fetch_page
+
+CustomerUser = aliased(Users)
+StaffUser = aliased(Users)
+
+# sort key for keyset pagination; id breaks ties between equal start times
+SORT_COLUMNS = (Appointment.start_datetime, Appointment.id)
+
+
+def appointment_query(date_from=None, date_to=None, status=None, customer_id=None, staff_id=None):
+    # One SELECT projecting appointment columns plus customer, service and staff
+    # names through outer joins, so listing never lazy-loads relationships.
+    # date_from/date_to are datetimes bounding start_datetime as [from, to).
+    q = db.session.query(
+        Appointment.id, Appointment.customer_id, Appointment.staff_id, Appointment.service_id,
+        Appointment.start_datetime, Appointment.end_datetime, Appointment.status,
+        Appointment.service_type, Appointment.created_at,
+        CustomerUser.name.label('customer_name'),
+        Service.name.label('service_name'),
+        StaffUser.name.label('staff_name'),
+    ).outerjoin(Customer, Customer.id == Appointment.customer_id) \
+     .outerjoin(CustomerUser, CustomerUser.id == Customer.user_id) \
+     .outerjoin(Service, Service.id == Appointment.service_id) \
+     .outerjoin(Staff, Staff.id == Appointment.staff_id) \
+     .outerjoin(StaffUser, StaffUser.id == Staff.user_id)
+    if date_from is not None:
+        q = q.filter(Appointment.start_datetime >= date_from)
+    if date_to is not None:
+        q = q.filter(Appointment.start_datetime < date_to)
+    if status:
+        q = q.filter(Appointment.status == status)
+    if customer_id is not None:
+        q = q.filter(Appointment.customer_id == customer_id)
+    if staff_id is not None:
+        q = q.filter(Appointment.staff_id == staff_id)
+    return q
+
+
+def row_to_dict(row):
+    return {
+        'id': row.id,
+        'customer_id': row.customer_id,
+        'staff_id': row.staff_id,
+        'service_id': row.service_id,
+        'start_datetime': row.start_datetime.isoformat() if row.start_datetime else None,
+        'end_datetime': row.end_datetime.isoformat() if row.end_datetime else None,
+        'status': row.status,
+        'service_type': row.service_type,
+        'customer_name': row.customer_name,
+        'service_name': row.service_name,
+        'staff_name': row.staff_name,
+        'created_display': row.created_at.strftime('%Y-%m-%d %H:%M') if row.created_at else None,
+    }
+
+
+def fetch_appointments(q, descending=False, limit=None, cursor=None):
+    # Returns (rows as dicts, next_cursor). Without a limit every matching row
+    # is returned and next_cursor is None. Raises ValueError on a bad cursor.
+    rows, next_cursor = fetch_page(q, SORT_COLUMNS, descending=descending, limit=limit, cursor=cursor)
+    return [row_to_dict(r) for r in rows], next_cursor
@@ -0,0 +1,51 @@
+from sqlalchemy import literal, select, union_all
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Appointment, Booking, Customer, Service, Users
+
+CustomerUser = aliased(Users)
+
+
+def _assignment_select(model, kind, location, staff_id, window_start, window_end, since):
+    stmt = select(
+        literal(kind).label('type'),
+        model.id.label('id'),
+        CustomerUser.name.label('customer_name'),
+        model.service_id.label('service_id'),
+        Service.name.label('service_name'),
+        model.start_datetime.label('start_datetime'),
+        model.end_datetime.label('end_datetime'),
+        literal(location).label('location'),
+        model.status.label('status'),
+    ).select_from(model) \
+     .outerjoin(Customer, Customer.id == model.customer_id) \
+     .outerjoin(CustomerUser, CustomerUser.id == Customer.user_id) \
+     .outerjoin(Service, Service.id == model.service_id) \
+     .where(model.staff_id == staff_id,
+            model.start_datetime >= window_start,
+            model.start_datetime < window_end)
+    if since is not None:
+        stmt = stmt.where(model.updated_at >= since)
+    return stmt
+
+
+def load_staff_assignments(staff_id, window_start, window_end, since=None):
+    # Appointments (salon) and bookings (home) of one staff member starting in
+    # [window_start, window_end), optionally only those changed at or after
+    # `since`, as a single UNION ALL ordered by start time in SQL.
+    u = union_all(
+        _assignment_select(Appointment, 'appointment', 'salon', staff_id, window_start, window_end, since),
+        _assignment_select(Booking, 'booking', 'home', staff_id, window_start, window_end, since),
+    ).subquery('assignments')
+    rows = db.session.execute(select(u).order_by(u.c.start_datetime, u.c.type, u.c.id)).all()
+    return [{
+        'type': r.type,
+        'id': r.id,
+        'customer_name': r.customer_name,
+        'service_id': r.service_id,
+        'service_name': r.service_name,
+        'start_datetime': r.start_datetime.isoformat() if r.start_datetime else None,
+        'end_datetime': r.end_datetime.isoformat() if r.end_datetime else None,
+        'location': r.location,
+        'status': r.status,
+    } for r in rows]
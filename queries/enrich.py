@@ -0,0 +1,38 @@
+from models import Customer, Users
+
+# Batch lookups for decorating a page of already-loaded rows: collect the
+# foreign keys of the page and resolve each referenced table with one IN
+# query, instead of a get() plus lazy loads per row.
+
+
+def load_by_ids(model, ids, *options):
+    # {id: row} for the distinct, non-null ids; options are loader options
+    # such as selectinload() for relationships the caller will serialize
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {row.id: row for row in model.query.options(*options).filter(model.id.in_(ids)).all()}
+
+
+def load_customers(customer_ids):
+    # ({customer_id: Customer}, {user_id: Users}) in two queries
+    customers = load_by_ids(Customer, customer_ids)
+    users = load_by_ids(Users, (c.user_id for c in customers.values()))
+    return customers, users
+
+
+def attach_customers(items, customer_ids, email=False):
+    # Set customer_name (and customer_email) on each dict in items from the
+    # customer id at the same position. Items whose customer or user cannot
+    # be found are left untouched.
+    customer_ids = list(customer_ids)
+    customers, users = load_customers(customer_ids)
+    for item, customer_id in zip(items, customer_ids):
+        cust = customers.get(customer_id)
+        user = users.get(cust.user_id) if cust else None
+        if not user:
+            continue
+        item['customer_name'] = user.name
+        if email:
+            item['customer_email'] = user.email
+    return items
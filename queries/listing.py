@@ -0,0 +1,122 @@
+from flask import request, jsonify
+from queries.pagination import fetch_page, parse_limit
+import datetime
+import decimal
+
+# Shared list layer for collection endpoints. A route builds its base query
+# and hands it to list_response() together with:
+#   id_column  unique column closing every sort key (usually the primary key)
+#   serialize  function turning a page of rows into a list of dicts
+#   sorts      {name: column} accepted by ?sort=name / ?sort=-name
+#   filters    {arg: filter} applied when ?arg= is present, see equals() etc.
+# Query string:
+#   limit, cursor  keyset pagination; without either the whole (filtered)
+#                  collection is returned as a plain list, as before
+#   sort           one of the sort names, '-' prefix for descending
+#   fields         comma separated keys to keep in each item
+
+
+class ListArgumentError(ValueError):
+    pass
+
+
+def as_bool(value):
+    value = value.strip().lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValueError(value)
+
+
+def as_date(value):
+    return datetime.date.fromisoformat(value)
+
+
+def equals(column, cast=str):
+    return lambda value: column == cast(value)
+
+
+def one_of(column, cast=str):
+    # ?arg=a,b,c
+    return lambda value: column.in_([cast(v) for v in value.split(',') if v.strip()])
+
+
+def contains(column):
+    # case-insensitive substring match
+    return lambda value: column.ilike(f'%{value}%')
+
+
+def at_least(column, cast=decimal.Decimal):
+    return lambda value: column >= cast(value)
+
+
+def at_most(column, cast=decimal.Decimal):
+    return lambda value: column <= cast(value)
+
+
+def on_or_after(column):
+    # ?arg=YYYY-MM-DD against a datetime column
+    return lambda value: column >= datetime.datetime.combine(as_date(value), datetime.time())
+
+
+def on_or_before(column):
+    # inclusive: everything before the start of the following day
+    return lambda value: column < datetime.datetime.combine(as_date(value) + datetime.timedelta(days=1), datetime.time())
+
+
+def apply_filters(q, filters, args):
+    for arg, build in (filters or {}).items():
+        value = args.get(arg)
+        if value is None or value == '':
+            continue
+        try:
+            q = q.filter(build(value))
+        except (ValueError, TypeError, ArithmeticError):
+            raise ListArgumentError(f'invalid value for {arg}')
+    return q
+
+
+def sort_columns(sorts, id_column, sort, default_sort):
+    # (columns, descending) for ?sort=; id_column breaks ties
+    sort = sort or default_sort
+    descending = sort.startswith('-')
+    name = sort.lstrip('-')
+    if name == id_column.key:
+        return (id_column,), descending
+    if name not in (sorts or {}):
+        raise ListArgumentError(f'cannot sort by {name}')
+    return (sorts[name], id_column), descending
+
+
+def project(items, fields):
+    if not fields:
+        return items
+    keys = [f.strip() for f in fields.split(',') if f.strip()]
+    return [{k: item[k] for k in keys if k in item} for item in items]
+
+
+def list_page(q, id_column, serialize, sorts=None, filters=None, default_sort=None, args=None):
+    # Returns (items, next_cursor, paginated). Raises ListArgumentError.
+    args = request.args if args is None else args
+    q = apply_filters(q, filters, args)
+    columns, descending = sort_columns(sorts, id_column, args.get('sort'), default_sort or id_column.key)
+    paginated = 'limit' in args or 'cursor' in args
+    limit = parse_limit(args.get('limit')) if paginated else None
+    try:
+        rows, next_cursor = fetch_page(q, columns, descending=descending, limit=limit, cursor=args.get('cursor'))
+    except ValueError:
+        raise ListArgumentError('invalid cursor')
+    return project(serialize(rows), args.get('fields')), next_cursor, paginated
+
+
+def list_response(q, id_column, serialize, key='items', **options):
+    # JSON response for a collection endpoint: the legacy plain list, or
+    # {key: [...], 'next_cursor': ...} when limit/cursor is given
+    try:
+        items, next_cursor, paginated = list_page(q, id_column, serialize, **options)
+    except ListArgumentError as e:
+        return jsonify({'message': str(e)}), 400
+    if not paginated:
+        return jsonify(items)
+    return jsonify({key: items, 'next_cursor': next_cursor})
@@ -0,0 +1,153 @@
+from sqlalchemy import and_, false, or_
+import base64
+import datetime
+import decimal
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# backends whose ORDER BY already puts NULL before every value
+NULLS_LOW_DIALECTS = ('mysql', 'mariadb', 'sqlite', 'mssql')
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(limit, maximum))
+
+
+def _plain(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    # opaque, URL-safe token for the sort key of the last row of a page
+    raw = json.dumps([_plain(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+# JSON types a cursor value may have for each column python type
+_CURSOR_TYPES = {int: (int,), float: (int, float), bool: (bool,), str: (str,),
+                 decimal.Decimal: (str, int, float), datetime.datetime: (str,), datetime.date: (str,)}
+
+
+def _cursor_value(value, python_type):
+    if value is None or python_type is None:
+        return value
+    expected = _CURSOR_TYPES.get(python_type)
+    if expected and (not isinstance(value, expected) or (isinstance(value, bool) and python_type is not bool)):
+        raise ValueError('invalid cursor')
+    if python_type is int and not -2 ** 63 <= value < 2 ** 63:
+        # wider than any integer column, and than drivers bind
+        raise ValueError('invalid cursor')
+    if python_type is datetime.datetime:
+        return datetime.datetime.fromisoformat(value)
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    if python_type in (decimal.Decimal, float):
+        # json accepts NaN and Infinity, which no sort key holds
+        try:
+            number = decimal.Decimal(str(value))
+        except ArithmeticError:
+            raise ValueError('invalid cursor')
+        if not number.is_finite():
+            raise ValueError('invalid cursor')
+        return number if python_type is decimal.Decimal else value
+    return value
+
+
+def decode_cursor(cursor, columns):
+    # inverse of encode_cursor; each value must fit its column's type
+    # (datetime/date columns are parsed back from ISO strings), so a forged
+    # cursor raises ValueError here instead of failing in the query
+    padded = cursor + '=' * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('invalid cursor')
+    out = []
+    for col, value in zip(columns, values):
+        python_type = None
+        try:
+            python_type = col.type.python_type
+        except (AttributeError, NotImplementedError):
+            pass
+        out.append(_cursor_value(value, python_type))
+    return out
+
+
+def _after(column, value, descending):
+    # rows strictly after value in column order, NULL sorting lowest
+    if value is None:
+        return None if descending else column.is_not(None)
+    return or_(column < value, column.is_(None)) if descending else column > value
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def keyset_filter(columns, values, descending=False):
+    # rows strictly after `values` in (columns...) order, written as
+    # a >= x AND (a > x OR (a = x AND b > y) ...); the leading range on a
+    # lets every backend seek the (a, ...) index instead of scanning it.
+    # Sort columns may be NULL (nullable or outer-joined); NULL sorts lowest,
+    # as fetch_page orders it.
+    clauses = []
+    for i, col in enumerate(columns):
+        cmp = _after(col, values[i], descending)
+        if cmp is not None:
+            clauses.append(and_(*[_equal(c, v) for c, v in zip(columns[:i], values[:i])], cmp))
+    if len(columns) == 1:
+        return clauses[0] if clauses else false()
+    if values[0] is None:
+        return or_(*clauses) if clauses else false()
+    lead = or_(columns[0] <= values[0], columns[0].is_(None)) if descending else columns[0] >= values[0]
+    return and_(lead, or_(*clauses))
+
+
+def _order(q, columns, descending):
+    # NULL lowest: first ascending, last descending. MySQL, SQLite and SQL
+    # Server already sort it so and keep a plain ORDER BY that an index can
+    # serve; other backends are told explicitly.
+    native = q.session.get_bind().dialect.name in NULLS_LOW_DIALECTS
+    order = []
+    for c in columns:
+        c = c.desc() if descending else c.asc()
+        order.append(c if native else c.nulls_last() if descending else c.nulls_first())
+    return q.order_by(*order)
+
+
+def _sort_value(row, column):
+    # rows are model instances, named tuples of columns, or (entity, extra
+    # columns) tuples; sort columns are looked up by key in that order
+    try:
+        return getattr(row, column.key)
+    except AttributeError:
+        return getattr(row[0], column.key)
+
+
+def fetch_page(q, columns, descending=False, limit=None, cursor=None):
+    # Order q by columns (the last one must be unique) and return (rows,
+    # next_cursor) for the page after cursor. Without a limit every remaining
+    # row is returned and next_cursor is None. Raises ValueError on a bad cursor.
+    if cursor:
+        try:
+            values = decode_cursor(cursor, columns)
+        except Exception:
+            raise ValueError('invalid cursor')
+        q = q.filter(keyset_filter(columns, values, descending))
+    q = _order(q, columns, descending)
+    if limit is None:
+        return q.all(), None
+    rows = q.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([_sort_value(rows[-1], c) for c in columns])
+    return rows, next_cursor
@@ -1,22 +1,23 @@
-from flask import Blueprint, request, jsonify, send_file, make_response
+from flask import Blueprint, Response, request, jsonify, send_file, make_response, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt
+from sqlalchemy.exc import IntegrityError
 from extensions import db
 from models import Bill, BillDetail, Payment
+from billing import engine as billing
+from billing import export as bill_export
+from billing import webhooks
+from billing.pdf import bill_pdfs
+from queries.listing import list_response, equals, on_or_after, on_or_before
+from serialization.rows import attach_children, columns, row_dicts
+import json
 import os
-import io
-from datetime import datetime
+from datetime import date, datetime
 
 # optional imports
 try:
     import razorpay
 except Exception:
     razorpay = None
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-except Exception:
-    letter = None
-    canvas = None
 
 billing_bp = Blueprint('billing', __name__)
 
@@ -29,29 +30,88 @@ def admin_required():
 @billing_bp.route('/bills', methods=['GET'])
 @jwt_required()
 def list_bills():
-    bills = Bill.query.all()
-    return jsonify([b.to_dict() for b in bills])
+    return list_response(
+        db.session.query(*columns(Bill)), Bill.id, _serialize_bills, key='bills',
+        sorts={'created_at': Bill.created_at, 'total_amount': Bill.total_amount},
+        filters={
+            'customer_id': equals(Bill.customer_id, int),
+            'status': equals(Bill.status),
+            'from': on_or_after(Bill.created_at),
+            'to': on_or_before(Bill.created_at),
+        },
+    )
+
+
+def _serialize_bills(rows):
+    # plain column rows; details for the whole page come from one extra IN query
+    return attach_children(row_dicts(rows), columns(BillDetail), BillDetail.bill_id, 'details')
 
 
 @billing_bp.route('/bills', methods=['POST'])
 @jwt_required()
 def create_bill():
+    # {"customer_id", "items": [{"service_id" | "product_id", "quantity", "description"}],
+    # "charges": [{"description", "amount", "tax_included"}]}; prices, offers, GST and totals
+    # are computed here (see billing.engine). The older "details" list is still
+    # accepted: lines with an id are priced, amounts are only taken for lines
+    # without one, as charges (described "Charge" and 0 when left out, as
+    # before). Those amounts are what the bill used to total, so they are
+    # taken as GST-inclusive rather than having GST added on top.
     if not admin_required():
         return jsonify({'message': 'admin role required'}), 403
     data = request.get_json() or {}
     customer_id = data.get('customer_id')
-    details = data.get('details', [])
-    total = sum([float(d.get('amount', 0)) for d in details])
-    bill = Bill(customer_id=customer_id, total_amount=total)
-    db.session.add(bill)
-    db.session.flush()
-    for d in details:
-        bd = BillDetail(bill_id=bill.id, service_id=d.get('service_id'), product_id=d.get('product_id'), description=d.get('description'), quantity=d.get('quantity',1), unit_price=d.get('unit_price',0), amount=d.get('amount',0))
-        db.session.add(bd)
+    if not customer_id:
+        return jsonify({'message': 'customer_id required'}), 400
+    items, charges = data.get('items'), data.get('charges') or []
+    if items is None:
+        details = data.get('details') or []
+        if not isinstance(details, list) or not all(isinstance(d, dict) for d in details):
+            return jsonify({'message': 'details must be a list of objects'}), 400
+        items = [d for d in details if d.get('service_id') is not None or d.get('product_id') is not None]
+        charges = charges + [{'description': d.get('description') or 'Charge', 'amount': d.get('amount', 0),
+                              'tax_included': True}
+                             for d in details if d.get('service_id') is None and d.get('product_id') is None]
+    if not isinstance(items, list) or not isinstance(charges, list) or not (items or charges):
+        return jsonify({'message': 'items or charges required'}), 400
+    try:
+        bill = billing.add_bill(customer_id, billing.quote(items, charges))
+    except billing.BillingError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
     db.session.commit()
+    if bill_pdfs.available():
+        # render ahead of the first download
+        bill_pdfs.submit(bill.id)
     return jsonify(bill.to_dict()), 201
 
 
+@billing_bp.route('/bills/daily', methods=['POST'])
+@jwt_required()
+def bill_day():
+    # bill every completed appointment and booking of {"date": "YYYY-MM-DD"}
+    # (default today) that has no bill yet, one bill per visit, in one transaction
+    if not admin_required():
+        return jsonify({'message': 'admin role required'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        day = datetime.strptime(data['date'], '%Y-%m-%d').date() if data.get('date') else date.today()
+    except (TypeError, ValueError):
+        return jsonify({'message': 'date must be YYYY-MM-DD'}), 400
+    try:
+        bills = billing.bill_completed_visits(day)
+        db.session.commit()
+    except billing.BillingError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'visits of this day are being billed by another request'}), 409
+    ids = [b.id for b in bills]
+    rows = db.session.query(*columns(Bill)).filter(Bill.id.in_(ids)).order_by(Bill.id).all() if ids else []
+    return jsonify({'date': day.isoformat(), 'count': len(ids), 'bills': _serialize_bills(rows)}), 201
+
+
 @billing_bp.route('/bills/<int:bill_id>', methods=['GET'])
 @jwt_required()
 def get_bill(bill_id):
@@ -134,57 +194,111 @@ def verify_payment():
 
 @billing_bp.route('/webhook/razorpay', methods=['POST'])
 def razorpay_webhook():
+    # verify, store once per Razorpay event id and acknowledge; the event is
+    # applied by billing.webhooks' worker, so redeliveries are answered 200
+    # without doing anything again
     payload = request.get_data()
-    sig = request.headers.get('X-Razorpay-Signature')
     secret = os.environ.get('RAZORPAY_WEBHOOK_SECRET')
-    # verify signature if secret available
-    if secret and sig:
-        import hmac, hashlib
-        expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
-        if not hmac.compare_digest(expected, sig):
-            return jsonify({'message': 'invalid signature'}), 400
-    # process payload minimally
+    if secret and not webhooks.valid_signature(secret, payload, request.headers.get('X-Razorpay-Signature')):
+        return jsonify({'message': 'invalid signature'}), 400
     try:
-        ev = request.get_json() or {}
-        # example: payment.captured
-        ev_name = ev.get('event')
-        data = ev.get('payload', {})
-        # handle basic events
-        if ev_name and 'payment' in ev_name:
-            payment_obj = data.get('payment', {}).get('entity')
-            if payment_obj:
-                provider_id = payment_obj.get('id')
-                # try find Payment
-                p = Payment.query.filter_by(provider_payment_id=provider_id).first()
-                if p:
-                    p.status = 'completed' if 'captured' in ev_name or payment_obj.get('status') == 'captured' else p.status
-                    db.session.commit()
-    except Exception:
-        pass
-    return jsonify({'ok': True})
+        name = (json.loads(payload) or {}).get('event')
+    except (ValueError, AttributeError):
+        return jsonify({'message': 'invalid payload'}), 400
+    key = webhooks.event_id(payload, request.headers.get('X-Razorpay-Event-Id'))
+    stored = webhooks.record_event(key, name, payload)
+    db.session.commit()
+    if stored:
+        webhooks.webhook_worker.wake()
+    return jsonify({'ok': True, 'duplicate': not stored})
 
 
 @billing_bp.route('/bills/<int:bill_id>/pdf', methods=['GET'])
 @jwt_required()
 def bill_pdf(bill_id):
-    b = Bill.query.get(bill_id)
-    if not b:
+    if not bill_pdfs.available():
+        b = Bill.query.get(bill_id)
+        if not b:
+            return jsonify({'message': 'not found'}), 404
+        return jsonify(b.to_dict())
+    # rendered in the worker pool and kept on disk; wait a little for a fresh
+    # render, otherwise tell the client to come back
+    future = bill_pdfs.submit(bill_id)
+    if future is None:
         return jsonify({'message': 'not found'}), 404
-    if canvas and letter:
-        buf = io.BytesIO()
-        c = canvas.Canvas(buf, pagesize=letter)
-        c.setFont('Helvetica', 12)
-        c.drawString(50, 750, f"Bill ID: {b.id}")
-        c.drawString(50, 735, f"Customer ID: {b.customer_id}")
-        c.drawString(50, 720, f"Date: {b.created_at.isoformat()}")
-        y = 700
-        for d in b.details:
-            c.drawString(50, y, f"- {d.description or ''} Qty:{d.quantity} Amount: {float(d.amount)}")
-            y -= 15
-        c.drawString(50, y-10, f"Total: {float(b.total_amount)}")
-        c.showPage()
-        c.save()
-        buf.seek(0)
-        return send_file(buf, mimetype='application/pdf', download_name=f'bill_{b.id}.pdf')
+    try:
+        path = future.result(timeout=current_app.config.get('BILL_PDF_WAIT', 10))
+    except TimeoutError:
+        resp = jsonify({'message': 'pdf is being rendered', 'bill_id': bill_id})
+        resp.headers['Retry-After'] = '2'
+        return resp, 202
+    return send_file(path, mimetype='application/pdf', download_name=f'bill_{bill_id}.pdf', conditional=True)
+
+
+@billing_bp.route('/bills/export', methods=['GET'])
+@jwt_required()
+def export_bill_range():
+    # every bill created between ?from= and ?to= (YYYY-MM-DD, inclusive),
+    # streamed as it is read: a ZIP of ledger.csv plus one PDF per bill, or
+    # with ?format=csv the ledger alone
+    if not admin_required():
+        return jsonify({'message': 'admin role required'}), 403
+    start, end, fmt = request.args.get('from'), request.args.get('to'), request.args.get('format', 'zip')
+    if not start or not end or fmt not in ('zip', 'csv'):
+        return jsonify({'message': 'from and to (YYYY-MM-DD) required, format zip or csv'}), 400
+    try:
+        conditions = [on_or_after(Bill.created_at)(start), on_or_before(Bill.created_at)(end)]
+    except ValueError:
+        return jsonify({'message': 'from and to must be YYYY-MM-DD'}), 400
+    name = f'bills_{start}_{end}'
+    if fmt == 'csv':
+        body, mimetype = bill_export.ledger_csv(conditions), 'text/csv'
     else:
-        return jsonify(b.to_dict())
+        body, mimetype = bill_export.bills_zip(conditions, with_pdfs=bill_pdfs.available()), 'application/zip'
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={name}.{fmt}'})
+
+
+@billing_bp.route('/bills/exports', methods=['POST'])
+@jwt_required()
+def export_bills():
+    # zip of the PDFs of every bill created in {"month": "YYYY-MM"}, built in the background
+    if not admin_required():
+        return jsonify({'message': 'admin role required'}), 403
+    if not bill_pdfs.available():
+        return jsonify({'message': 'pdf rendering unavailable'}), 501
+    data = request.get_json() or {}
+    try:
+        month = datetime.strptime(data.get('month') or '', '%Y-%m')
+    except ValueError:
+        return jsonify({'message': 'month must be YYYY-MM'}), 400
+    job = bill_pdfs.export_month(month.year, month.month)
+    resp = jsonify(job)
+    resp.headers['Location'] = f"/bills/exports/{job['id']}"
+    return resp, 202
+
+
+@billing_bp.route('/bills/exports/<job_id>', methods=['GET'])
+@jwt_required()
+def export_status(job_id):
+    if not admin_required():
+        return jsonify({'message': 'admin role required'}), 403
+    job = bill_pdfs.job(job_id)
+    if not job:
+        return jsonify({'message': 'not found'}), 404
+    return jsonify(job)
+
+
+@billing_bp.route('/bills/exports/<job_id>/zip', methods=['GET'])
+@jwt_required()
+def export_download(job_id):
+    if not admin_required():
+        return jsonify({'message': 'admin role required'}), 403
+    job = bill_pdfs.job(job_id)
+    if not job:
+        return jsonify({'message': 'not found'}), 404
+    path = bill_pdfs.job_path(job_id)
+    if not path:
+        return jsonify(job), 409
+    return send_file(path, mimetype='application/zip', as_attachment=True,
+                     download_name=f"bills_{job['month']}.zip", conditional=True)
@@ -2,10 +2,25 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
 from models import Service, Appointment, Booking, Customer, Staff
+from scheduling.slots import availability_range
+from scheduling.cache import slot_cache
+from scheduling.index import schedule_index
+from scheduling.occupancy import occupied_interval
+from scheduling.reservation import reserve
+from scheduling.roster import roster_store
+from queries.appointments import appointment_query, fetch_appointments
+from queries.assignments import load_staff_assignments
+from queries.pagination import decode_cursor, encode_cursor, parse_limit
 import datetime
 
 booking_bp = Blueprint('booking', __name__)
 
+# longest window /slots/range computes in one request
+MAX_RANGE_DAYS = 31
+# default /staff/me/assignments window: this many days either side of today
+ASSIGNMENT_WINDOW_DAYS = 7
+ASSIGNMENT_SYNC_OVERLAP = datetime.timedelta(seconds=5)
+
 
 def role_from_jwt():
     claims = get_jwt()
@@ -23,9 +38,10 @@ def overlaps(start1, end1, start2, end2):
 
 @booking_bp.route('/slots', methods=['GET'])
 def available_slots():
-    # params: service_id, date (YYYY-MM-DD)
+    # params: service_id, date (YYYY-MM-DD), optional location (salon|home)
     service_id = request.args.get('service_id')
     date = request.args.get('date')
+    home = request.args.get('location') == 'home'
     if not service_id or not date:
         return jsonify({'message': 'service_id and date required'}), 400
 
@@ -33,45 +49,50 @@ def available_slots():
     if not svc:
         return jsonify({'message': 'service not found'}), 404
 
-    # Basic working hours and slot interval
-    WORK_START = 9
-    WORK_END = 18
-    INTERVAL = 30  # minutes
-
-    slots = []
     dt = datetime.date.fromisoformat(date)
-    start_dt = datetime.datetime(dt.year, dt.month, dt.day, WORK_START, 0)
-    end_dt = datetime.datetime(dt.year, dt.month, dt.day, WORK_END, 0)
-    cur = start_dt
-    # collect staff list
-    staffs = Staff.query.filter_by(is_available=True, is_active=True).all()
-
-    while cur + datetime.timedelta(minutes=svc.duration_mins) <= end_dt:
-        slot_end = cur + datetime.timedelta(minutes=svc.duration_mins)
-        # check if any staff is free for this slot
-        free_staff_ids = []
-        for staff in staffs:
-            # check appointments overlapping with this slot
-            conflict = Appointment.query.filter(
-                Appointment.staff_id == staff.id,
-                Appointment.status.in_(['approved','pending']),
-                db.or_(
-                    db.and_(Appointment.start_datetime <= cur, Appointment.end_datetime > cur),
-                    db.and_(Appointment.start_datetime < slot_end, Appointment.end_datetime >= slot_end),
-                    db.and_(Appointment.start_datetime >= cur, Appointment.end_datetime <= slot_end),
-                )
-            ).first()
-            if not conflict:
-                free_staff_ids.append(staff.id)
-
-        if free_staff_ids:
-            slots.append({'start': cur.isoformat(), 'end': slot_end.isoformat(), 'available_staff': free_staff_ids})
-
-        cur += datetime.timedelta(minutes=INTERVAL)
+    slots = slot_cache.slots_for_day(dt, svc.duration_mins, home=home)
 
     return jsonify(slots)
 
 
+@booking_bp.route('/slots/range', methods=['GET'])
+def available_slots_range():
+    # params: service_id, from, to (YYYY-MM-DD, inclusive, at most 31 days), optional location (salon|home)
+    service_id = request.args.get('service_id')
+    from_str = request.args.get('from')
+    to_str = request.args.get('to')
+    if not service_id or not from_str or not to_str:
+        return jsonify({'message': 'service_id, from and to required'}), 400
+    try:
+        first_day = datetime.date.fromisoformat(from_str)
+        last_day = datetime.date.fromisoformat(to_str)
+    except ValueError:
+        return jsonify({'message': 'invalid date format'}), 400
+    if last_day < first_day:
+        return jsonify({'message': 'from must not be after to'}), 400
+    if (last_day - first_day).days + 1 > MAX_RANGE_DAYS:
+        return jsonify({'message': f'range limited to {MAX_RANGE_DAYS} days'}), 400
+
+    svc = Service.query.get(service_id)
+    if not svc:
+        return jsonify({'message': 'service not found'}), 404
+
+    home = request.args.get('location') == 'home'
+    staffs = Staff.query.filter_by(is_available=True, is_active=True).order_by(Staff.id).all()
+    staff_ids = [s.id for s in staffs]
+    out = availability_range(first_day, last_day, svc.duration_mins, staff_ids, home=home)
+    out.update({'service_id': svc.id, 'duration_mins': svc.duration_mins, 'staff_ids': staff_ids})
+    return jsonify(out)
+
+
+@booking_bp.route('/slots/cache', methods=['GET'])
+@jwt_required()
+def slot_cache_stats():
+    if role_from_jwt() != 'admin':
+        return jsonify({'message': 'admin required'}), 403
+    return jsonify(slot_cache.stats())
+
+
 @booking_bp.route('/appointments', methods=['POST'])
 @jwt_required()
 def create_appointment():
@@ -101,45 +122,35 @@ def create_appointment():
     start_dt = parse_datetime(date, time)
     end_dt = start_dt + datetime.timedelta(minutes=svc.duration_mins)
 
+    # plain ids: reserve() commits between attempts, which expires ORM objects
+    customer_id, service_id = customer.id, svc.id
+
+    def make_appointment(assigned_staff_id):
+        return Appointment(customer_id=customer_id, staff_id=assigned_staff_id,
+                           service_id=service_id, start_datetime=start_dt, end_datetime=end_dt, status='pending')
+
     # if staff provided, check availability
-    assigned_staff = None
     if staff_id:
         st = Staff.query.get(staff_id)
         if not st or not st.is_active or not st.is_available:
             return jsonify({'message': 'staff not available'}), 400
-        conflict = Appointment.query.filter(
-            Appointment.staff_id == st.id,
-            Appointment.status.in_(['approved','pending']),
-            db.or_(
-                db.and_(Appointment.start_datetime <= start_dt, Appointment.end_datetime > start_dt),
-                db.and_(Appointment.start_datetime < end_dt, Appointment.end_datetime >= end_dt),
-                db.and_(Appointment.start_datetime >= start_dt, Appointment.end_datetime <= end_dt),
-            )
-        ).first()
-        if conflict:
+        if not roster_store.get().is_working(st.id, start_dt, end_dt):
+            return jsonify({'message': 'staff not working at that time'}), 400
+        appt = reserve([st.id], start_dt, end_dt, make_appointment)
+        if not appt:
             return jsonify({'message': 'staff has conflicting appointment'}), 400
-        assigned_staff = st
     else:
-        # auto-assign first free staff
-        st = Staff.query.filter_by(is_active=True, is_available=True).all()
-        for candidate in st:
-            conflict = Appointment.query.filter(
-                Appointment.staff_id == candidate.id,
-                Appointment.status.in_(['approved','pending']),
-                db.or_(
-                    db.and_(Appointment.start_datetime <= start_dt, Appointment.end_datetime > start_dt),
-                    db.and_(Appointment.start_datetime < end_dt, Appointment.end_datetime >= end_dt),
-                    db.and_(Appointment.start_datetime >= start_dt, Appointment.end_datetime <= end_dt),
-                )
-            ).first()
-            if not conflict:
-                assigned_staff = candidate
-                break
-
-    appt = Appointment(customer_id=customer.id, staff_id=assigned_staff.id if assigned_staff else None,
-                       service_id=svc.id, start_datetime=start_dt, end_datetime=end_dt, status='pending')
-    db.session.add(appt)
-    db.session.commit()
+        # auto-assign first free staff on shift, moving on to the next one if it was taken meanwhile
+        roster = roster_store.get()
+        candidates = [s.id for s in Staff.query.filter_by(is_active=True, is_available=True).all()
+                      if roster.is_working(s.id, start_dt, end_dt)]
+        appt = reserve(schedule_index.free_staff(candidates, start_dt, end_dt), start_dt, end_dt, make_appointment)
+        if not appt:
+            appt = make_appointment(None)
+            db.session.add(appt)
+            db.session.commit()
+    schedule_index.sync_appointment(appt)
+    slot_cache.sync_appointment(appt)
     return jsonify({'appointment': appt.to_dict()}), 201
 
 
@@ -177,28 +188,27 @@ def create_booking():
     area = Area.query.filter_by(pincode=pincode).first() if pincode else None
     home_charge = 0.0 if area else 200.0
 
-    # assign staff same as appointment auto-assign logic
-    assigned_staff = None
-    for candidate in Staff.query.filter_by(is_active=True, is_available=True).all():
-        conflict = Appointment.query.filter(
-            Appointment.staff_id == candidate.id,
-            Appointment.status.in_(['approved','pending']),
-            db.or_(
-                db.and_(Appointment.start_datetime <= start_dt, Appointment.end_datetime > start_dt),
-                db.and_(Appointment.start_datetime < end_dt, Appointment.end_datetime >= end_dt),
-                db.and_(Appointment.start_datetime >= start_dt, Appointment.end_datetime <= end_dt),
-            )
-        ).first()
-        if not conflict:
-            assigned_staff = candidate
-            break
-
-    booking = Booking(customer_id=customer.id, service_id=svc.id, start_datetime=start_dt,
-                      end_datetime=end_dt, address=address, pincode=pincode, home_charge=home_charge,
-                      staff_id=assigned_staff.id if assigned_staff else None, status='pending')
-
-    db.session.add(booking)
-    db.session.commit()
+    # plain ids: reserve() commits between attempts, which expires ORM objects
+    customer_id, service_id = customer.id, svc.id
+
+    def make_booking(assigned_staff_id):
+        return Booking(customer_id=customer_id, service_id=service_id, start_datetime=start_dt,
+                       end_datetime=end_dt, address=address, pincode=pincode, home_charge=home_charge,
+                       staff_id=assigned_staff_id, status='pending')
+
+    # assign staff same as appointment auto-assign logic; the staff member
+    # also needs the travel time around the visit free
+    busy_start, busy_end = occupied_interval('booking', start_dt, end_dt)
+    roster = roster_store.get()
+    candidates = [s.id for s in Staff.query.filter_by(is_active=True, is_available=True).all()
+                  if roster.is_working(s.id, start_dt, end_dt)]
+    booking = reserve(schedule_index.free_staff(candidates, busy_start, busy_end), busy_start, busy_end, make_booking)
+    if not booking:
+        booking = make_booking(None)
+        db.session.add(booking)
+        db.session.commit()
+    schedule_index.sync_booking(booking)
+    slot_cache.sync_booking(booking)
     return jsonify({'booking': booking.to_dict()}), 201
 
 
@@ -212,6 +222,8 @@ def approve_appointment(appt_id):
         return jsonify({'message': 'appointment not found'}), 404
     appt.status = 'approved'
     db.session.commit()
+    schedule_index.sync_appointment(appt)
+    slot_cache.sync_appointment(appt)
     return jsonify({'appointment': appt.to_dict()}), 200
 
 
@@ -225,9 +237,62 @@ def reject_appointment(appt_id):
         return jsonify({'message': 'appointment not found'}), 404
     appt.status = 'rejected'
     db.session.commit()
+    schedule_index.sync_appointment(appt)
+    slot_cache.sync_appointment(appt)
+    return jsonify({'appointment': appt.to_dict()}), 200
+
+
+def _staff_id_from_jwt():
+    try:
+        user_id = int(get_jwt_identity())
+    except Exception:
+        return None
+    st = Staff.query.filter_by(user_id=user_id).first()
+    return st.id if st else None
+
+
+def _may_complete(visit):
+    # admins, or the staff member the visit is assigned to
+    role = role_from_jwt()
+    return role == 'admin' or (role == 'staff' and visit.staff_id is not None and visit.staff_id == _staff_id_from_jwt())
+
+
+@booking_bp.route('/appointments/<int:appt_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_appointment(appt_id):
+    # the visit took place; it is billed by billing.pipeline shortly after
+    appt = Appointment.query.get(appt_id)
+    if not appt:
+        return jsonify({'message': 'appointment not found'}), 404
+    if not _may_complete(appt):
+        return jsonify({'message': 'admin or assigned staff required'}), 403
+    if appt.status not in ('approved', 'pending'):
+        return jsonify({'message': f'appointment is {appt.status}'}), 409
+    appt.status = 'completed'
+    db.session.commit()
+    schedule_index.sync_appointment(appt)
+    slot_cache.sync_appointment(appt)
     return jsonify({'appointment': appt.to_dict()}), 200
 
 
+@booking_bp.route('/bookings/<int:booking_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_booking(booking_id):
+    # the home visit took place; it is billed, home charge included, by billing.pipeline
+    booking = Booking.query.get(booking_id)
+    if not booking:
+        return jsonify({'message': 'booking not found'}), 404
+    if not _may_complete(booking):
+        return jsonify({'message': 'admin or assigned staff required'}), 403
+    if booking.status not in ('approved', 'pending'):
+        return jsonify({'message': f'booking is {booking.status}'}), 409
+    booking.status = 'completed'
+    db.session.commit()
+    schedule_index.sync_booking(booking)
+    slot_cache.sync_booking(booking)
+    return jsonify({'booking': booking.to_dict()}), 200
+
+
 @booking_bp.route('/staff/jobs', methods=['GET'])
 @jwt_required()
 def staff_jobs():
@@ -249,7 +314,9 @@ def staff_jobs():
 @booking_bp.route('/staff/me/assignments', methods=['GET'])
 @jwt_required()
 def staff_assignments():
-    # returns combined appointments and bookings assigned to the logged-in staff
+    # Appointments and bookings assigned to the logged-in staff, starting within
+    # ?from=&to= (default today - 7 days .. today + 7 days). Pass the returned
+    # cursor back as ?since= to receive only rows changed after the previous call.
     if role_from_jwt() != 'staff':
         return jsonify({'message': 'staff role required'}), 403
     uid = get_jwt_identity()
@@ -261,54 +328,66 @@ def staff_assignments():
     if not st:
         return jsonify({'message': 'staff profile not found'}), 404
 
-    # get appointments and bookings assigned to this staff (pending or approved or in-progress)
-    appts = Appointment.query.filter(Appointment.staff_id == st.id).all()
-    bookings = Booking.query.filter(Booking.staff_id == st.id).all()
-
-    out = []
-    for a in appts:
-        try:
-            customer_name = a.customer.user.name if a.customer and a.customer.user else None
-        except Exception:
-            customer_name = None
-        out.append({
-            'type': 'appointment',
-            'id': a.id,
-            'customer_name': customer_name,
-            'service_id': a.service_id,
-            'service_name': a.service.name if a.service else None,
-            'start_datetime': a.start_datetime.isoformat() if a.start_datetime else None,
-            'end_datetime': a.end_datetime.isoformat() if a.end_datetime else None,
-            'location': 'salon',
-            'status': a.status
-        })
-
-    for b in bookings:
-        try:
-            customer_name = b.customer.user.name if b.customer and b.customer.user else None
-        except Exception:
-            customer_name = None
-        out.append({
-            'type': 'booking',
-            'id': b.id,
-            'customer_name': customer_name,
-            'service_id': b.service_id,
-            'service_name': b.service.name if b.service else None,
-            'start_datetime': b.start_datetime.isoformat() if b.start_datetime else None,
-            'end_datetime': b.end_datetime.isoformat() if b.end_datetime else None,
-            'location': 'home',
-            'status': b.status
-        })
-
-    # sort by start_datetime
-    def _key(x):
+    try:
+        window_start, window_end = _date_window()
+    except ValueError:
+        return jsonify({'message': 'invalid date format'}), 400
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+    if window_start is None:
+        window_start = today - datetime.timedelta(days=ASSIGNMENT_WINDOW_DAYS)
+    if window_end is None:
+        window_end = today + datetime.timedelta(days=ASSIGNMENT_WINDOW_DAYS + 1)
+
+    since = None
+    if request.args.get('since'):
         try:
-            return x.get('start_datetime') or ''
+            since = decode_cursor(request.args['since'], (Appointment.updated_at,))[0]
         except Exception:
-            return ''
+            return jsonify({'message': 'invalid cursor'}), 400
+    # taken before the query and moved back a little so rows committed while
+    # it runs are sent again next time rather than missed; clients upsert by (type, id)
+    cursor = encode_cursor([datetime.datetime.utcnow() - ASSIGNMENT_SYNC_OVERLAP])
+    rows = load_staff_assignments(st.id, window_start, window_end, since=since)
+    return jsonify({'assignments': rows, 'cursor': cursor})
 
-    out_sorted = sorted(out, key=_key)
-    return jsonify(out_sorted)
+
+def _date_window():
+    # ?date=YYYY-MM-DD for one day, or ?from=&to= (inclusive) for a range;
+    # returns (start, end) datetimes, either may be None
+    date_str = request.args.get('date')
+    from_str = request.args.get('from')
+    to_str = request.args.get('to')
+    start = end = None
+    if date_str:
+        dt = datetime.date.fromisoformat(date_str)
+        start = datetime.datetime(dt.year, dt.month, dt.day, 0, 0)
+        end = start + datetime.timedelta(days=1)
+    if from_str:
+        dt = datetime.date.fromisoformat(from_str)
+        start = datetime.datetime(dt.year, dt.month, dt.day, 0, 0)
+    if to_str:
+        dt = datetime.date.fromisoformat(to_str)
+        end = datetime.datetime(dt.year, dt.month, dt.day, 0, 0) + datetime.timedelta(days=1)
+    return start, end
+
+
+def _appointment_listing(descending=False, **filters):
+    # shared by the appointment list endpoints; paginates when limit or cursor is given
+    try:
+        date_from, date_to = _date_window()
+    except ValueError:
+        return jsonify({'message': 'invalid date format'}), 400
+    q = appointment_query(date_from=date_from, date_to=date_to, **filters)
+    paginate = 'limit' in request.args or 'cursor' in request.args
+    limit = parse_limit(request.args.get('limit')) if paginate else None
+    try:
+        rows, next_cursor = fetch_appointments(q, descending=descending, limit=limit,
+                                               cursor=request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'invalid cursor'}), 400
+    if not paginate:
+        return jsonify(rows)
+    return jsonify({'appointments': rows, 'next_cursor': next_cursor})
 
 
 @booking_bp.route('/my/appointments', methods=['GET'])
@@ -322,8 +401,7 @@ def my_appointments():
     customer = Customer.query.filter_by(user_id=user_id).first()
     if not customer:
         return jsonify({'message': 'customer profile not found'}), 404
-    appts = Appointment.query.filter_by(customer_id=customer.id).order_by(Appointment.start_datetime.desc()).all()
-    return jsonify([a.to_dict() for a in appts])
+    return _appointment_listing(descending=True, customer_id=customer.id)
 
 
 @booking_bp.route('/appointments/pending', methods=['GET'])
@@ -332,49 +410,15 @@ def pending_appointments():
     # admin only
     if role_from_jwt() != 'admin':
         return jsonify({'message': 'admin required'}), 403
-    appts = Appointment.query.filter_by(status='pending').order_by(Appointment.start_datetime.asc()).all()
-    return jsonify([a.to_dict() for a in appts])
+    return _appointment_listing(status='pending')
 
 
 @booking_bp.route('/appointments', methods=['GET'])
 @jwt_required()
 def list_appointments_all():
-    # allow admin and staff to view appointments; support optional date filter (YYYY-MM-DD)
+    # allow admin and staff to view appointments; supports date=YYYY-MM-DD or from/to
+    # ranges, status and staff_id filters, and keyset pagination via limit/cursor
     if role_from_jwt() not in ('admin', 'staff'):
         return jsonify({'message': 'forbidden'}), 403
-    date_str = request.args.get('date')
-    q = Appointment.query
-    if date_str:
-        try:
-            dt = datetime.date.fromisoformat(date_str)
-            start = datetime.datetime(dt.year, dt.month, dt.day, 0, 0)
-            end = start + datetime.timedelta(days=1)
-            q = q.filter(Appointment.start_datetime >= start, Appointment.start_datetime < end)
-        except Exception:
-            return jsonify({'message': 'invalid date format'}), 400
-    appts = q.order_by(Appointment.start_datetime.asc()).all()
-    out = []
-    for a in appts:
-        d = a.to_dict()
-        # enrich with related names when available
-        try:
-            d['customer_name'] = a.customer.user.name if a.customer and a.customer.user else None
-        except Exception:
-            d['customer_name'] = None
-        try:
-            d['service_name'] = a.service.name if a.service else None
-        except Exception:
-            d['service_name'] = None
-        try:
-            # prefer staff user name when available
-            d['staff_name'] = a.staff.user.name if a.staff and getattr(a.staff, 'user', None) else None
-        except Exception:
-            # fallback to staff id
-            d['staff_name'] = None
-        try:
-            # human-friendly created timestamp for admin view
-            d['created_display'] = a.created_at.strftime('%Y-%m-%d %H:%M') if a.created_at else None
-        except Exception:
-            d['created_display'] = None
-        out.append(d)
-    return jsonify(out)
+    staff_id = request.args.get('staff_id', type=int)
+    return _appointment_listing(status=request.args.get('status'), staff_id=staff_id)
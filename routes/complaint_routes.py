@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from models import Complaint, Feedback, Customer
 from extensions import db
 from models import Complaint, Feedback
+from queries.enrich import attach_customers
+from queries.listing import list_response, equals
 
 cmp_bp = Blueprint('complaint', __name__)
 
@@ -54,23 +56,16 @@ def my_complaints():
 def list_complaints():
     if not admin_required():
         return jsonify({'message': 'admin role required'}), 403
-    out = []
-    for c in Complaint.query.all():
-        d = c.to_dict()
-        # try to add customer name/email if available
-        try:
-            cust = Customer.query.get(c.customer_id)
-            if cust and getattr(cust, 'user', None):
-                d['customer_name'] = cust.user.name
-                d['customer_email'] = cust.user.email
-            elif cust:
-                d['customer_name'] = None
-                d['customer_email'] = None
-        except Exception:
-            d['customer_name'] = None
-            d['customer_email'] = None
-        out.append(d)
-    return jsonify(out)
+    return list_response(
+        Complaint.query, Complaint.id, _serialize_complaints, key='complaints',
+        sorts={'created_at': Complaint.created_at},
+        filters={'status': equals(Complaint.status), 'customer_id': equals(Complaint.customer_id, int)},
+    )
+
+
+def _serialize_complaints(complaints):
+    # customer name/email for the whole page come from one Customer and one Users query
+    return attach_customers([c.to_dict() for c in complaints], [c.customer_id for c in complaints], email=True)
 
 
 @cmp_bp.route('/complaints/<int:complaint_id>/review', methods=['PUT'])
@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
-from models import Customer, Area
+from models import Customer, Area, Users
+from catalog.http_cache import http_cached
+from queries.listing import list_response, equals, contains
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import or_
 
@@ -107,27 +109,41 @@ def list_customers():
     claims = get_jwt()
     if claims.get('role') not in ('admin', 'staff'):
         return jsonify({'message': 'forbidden'}), 403
-    customers = Customer.query.all()
+    q = db.session.query(Customer, Users.name.label('name'), Users.email.label('email')) \
+        .outerjoin(Users, Users.id == Customer.user_id)
+    return list_response(
+        q, Customer.id, _serialize_customers, key='customers',
+        sorts={'name': Users.name},
+        filters={
+            'area_id': equals(Customer.area_id, int),
+            'q': contains(Users.name),
+            'email': contains(Users.email),
+            'phone': contains(Customer.phone),
+        },
+    )
+
+
+def _serialize_customers(rows):
     out = []
-    for c in customers:
+    for c, name, email in rows:
         d = c.to_dict()
-        if getattr(c, 'user', None):
-            try:
-                d['name'] = c.user.name
-                d['email'] = c.user.email
-            except Exception:
-                pass
+        if name is not None:
+            d['name'] = name
+            d['email'] = email
         out.append(d)
-    return jsonify(out)
+    return out
 
 
 @customer_bp.route('/areas', methods=['GET'])
+@http_cached('area')
 def list_areas():
-    areas = Area.query.all()
-    out = []
-    for a in areas:
-        out.append({'id': a.id, 'pincode': a.pincode, 'name': a.name, 'city_id': a.city_id})
-    return jsonify(out)
+    q = db.session.query(Area.id, Area.pincode, Area.name, Area.city_id)
+    return list_response(
+        q, Area.id, lambda rows: [{'id': a.id, 'pincode': a.pincode, 'name': a.name, 'city_id': a.city_id} for a in rows],
+        key='areas',
+        sorts={'pincode': Area.pincode},
+        filters={'city_id': equals(Area.city_id, int), 'pincode': equals(Area.pincode), 'q': contains(Area.name)},
+    )
 
 
 @customer_bp.route('/areas/<int:area_id>', methods=['GET'])
@@ -2,6 +2,10 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from extensions import db
 from models import Delivery, Order, Staff
+from sqlalchemy.orm import selectinload
+from inventory import summary as stock_summary
+from queries.enrich import load_by_ids, load_customers
+from scheduling.cache import slot_cache
 
 delivery_bp = Blueprint('delivery', __name__)
 
@@ -11,6 +15,13 @@ def admin_required():
     return claims.get('role') == 'admin'
 
 
+def _set_order_status(order, status):
+    # keeps the stock summary's sold-but-undelivered count in step with delivery
+    old_status = order.status
+    order.status = status
+    stock_summary.order_status_changed(order.id, old_status, status)
+
+
 @delivery_bp.route('/deliveries', methods=['POST'])
 @jwt_required()
 def create_delivery():
@@ -32,7 +43,7 @@ def create_delivery():
         db.session.add(d)
         # mark order as having a pending delivery
         try:
-            ord_obj.status = 'pending_delivery'
+            _set_order_status(ord_obj, 'pending_delivery')
         except Exception:
             pass
         db.session.commit()
@@ -59,10 +70,11 @@ def create_delivery():
         st.is_available = False
         # update order status -> dispatched (so customer sees it's out)
         try:
-            ord_obj.status = 'dispatched'
+            _set_order_status(ord_obj, 'dispatched')
         except Exception:
             pass
         db.session.commit()
+        slot_cache.staff_availability_changed(st.id, False)
         from models import Customer
         customer = Customer.query.get(ord_obj.customer_id) if ord_obj and ord_obj.customer_id else None
         return jsonify({ 'delivery': d.to_dict(), 'order': ord_obj.to_dict() if ord_obj else None, 'customer': customer.to_dict() if customer else None }), 201
@@ -92,10 +104,12 @@ def assign_delivery(delivery_id):
     try:
         ord = Order.query.get(d.order_id) if d.order_id else None
         if ord:
-            ord.status = 'out_for_delivery'
+            _set_order_status(ord, 'out_for_delivery')
     except Exception:
         pass
     db.session.commit()
+    if s:
+        slot_cache.staff_availability_changed(s.id, False)
     # include related order and customer
     from models import Customer
     order = Order.query.get(d.order_id) if d.order_id else None
@@ -122,10 +136,12 @@ def complete_delivery(delivery_id):
     try:
         ord = Order.query.get(d.order_id) if d.order_id else None
         if ord:
-            ord.status = 'delivered'
+            _set_order_status(ord, 'delivered')
     except Exception:
         pass
     db.session.commit()
+    if d.delivery_staff_id:
+        slot_cache.staff_availability_changed(d.delivery_staff_id, True)
     # include related order and customer
     from models import Customer
     order = Order.query.get(d.order_id) if d.order_id else None
@@ -150,17 +166,20 @@ def my_deliveries():
         return jsonify({'message': 'staff profile not found'}), 404
 
     dels = Delivery.query.filter_by(delivery_staff_id=st.id).all()
+    # orders (with items), customers and their users for all deliveries in one IN query each
+    orders = load_by_ids(Order, (d.order_id for d in dels), selectinload(Order.items))
+    customers, users = load_customers(o.customer_id for o in orders.values())
     out = []
     for d in dels:
-        order = Order.query.get(d.order_id) if d.order_id else None
-        customer = None
-        if order:
-            from models import Customer
-            customer = Customer.query.get(order.customer_id)
+        order = orders.get(d.order_id)
+        customer = customers.get(order.customer_id) if order else None
+        cust = customer.to_dict() if customer else None
+        if cust is not None and customer.user_id in users:
+            cust['name'] = users[customer.user_id].name
         out.append({
             'delivery': d.to_dict(),
             'order': order.to_dict() if order else None,
-            'customer': customer.to_dict() if customer else None
+            'customer': cust
         })
     return jsonify(out)
 
@@ -211,15 +230,17 @@ def update_delivery_status(delivery_id):
         ord = Order.query.get(d.order_id) if d.order_id else None
         if ord:
             if status == 'delivered':
-                ord.status = 'delivered'
+                _set_order_status(ord, 'delivered')
             elif status in ('dispatched', 'out_for_delivery'):
-                ord.status = 'out_for_delivery'
+                _set_order_status(ord, 'out_for_delivery')
             elif status in ('pending', 'pending_delivery'):
-                ord.status = 'pending_delivery'
+                _set_order_status(ord, 'pending_delivery')
     except Exception:
         ord = None
 
     db.session.commit()
+    if d.delivery_staff_id and status in ('delivered', 'dispatched', 'out_for_delivery'):
+        slot_cache.staff_availability_changed(d.delivery_staff_id, status == 'delivered')
 
     # include related order and customer for client convenience
     from models import Customer
@@ -1,7 +1,11 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt, verify_jwt_in_request
 from extensions import db
 from models import Offer
+from checkout import cart as cart_pricing
+from catalog.http_cache import http_cached
+from pricing.offers import price_book
+from pricing.schedule import live_offers
 
 offer_bp = Blueprint('offer', __name__)
 
@@ -11,10 +15,29 @@ def admin_required():
     return claims.get('role') == 'admin'
 
 
+def _offer_changed(offer):
+    # cart totals include product offers; reprice the carts it can affect
+    if offer.product_id:
+        cart_pricing.invalidate(product_ids=[offer.product_id])
+
+
+def _offers_committed():
+    # drop the in-memory prices and live list once the change is visible
+    price_book.invalidate()
+    live_offers.invalidate()
+
+
 @offer_bp.route('/offers', methods=['GET'])
+@http_cached('offer', daily=True)
 def list_offers():
-    offers = Offer.query.filter_by(is_active=True).all()
-    return jsonify([o.to_dict() for o in offers])
+    # live offers (active and valid today) from memory; admins can ask for
+    # every offer with ?all=1
+    if request.args.get('all') in ('1', 'true'):
+        verify_jwt_in_request()
+        if not admin_required():
+            return jsonify({'message': 'admin role required'}), 403
+        return jsonify([o.to_dict() for o in Offer.query.order_by(Offer.id).all()])
+    return current_app.response_class(live_offers.get().body, mimetype='application/json')
 
 
 @offer_bp.route('/offers', methods=['POST'])
@@ -25,7 +48,9 @@ def create_offer():
     data = request.get_json() or {}
     o = Offer(title=data.get('title'), description=data.get('description'), is_product_offer=data.get('is_product_offer', False), product_id=data.get('product_id'), service_id=data.get('service_id'), discount_percent=data.get('discount_percent',0), start_date=data.get('start_date'), end_date=data.get('end_date'), is_active=data.get('is_active', True))
     db.session.add(o)
+    _offer_changed(o)
     db.session.commit()
+    _offers_committed()
     return jsonify(o.to_dict()), 201
 
 
@@ -41,7 +66,9 @@ def update_offer(offer_id):
     o.title = data.get('title', o.title)
     o.description = data.get('description', o.description)
     o.is_active = data.get('is_active', o.is_active)
+    _offer_changed(o)
     db.session.commit()
+    _offers_committed()
     return jsonify(o.to_dict())
 
 
@@ -54,8 +81,10 @@ def delete_offer(offer_id):
     if not o:
         return jsonify({'message': 'not found'}), 404
     try:
+        _offer_changed(o)
         db.session.delete(o)
         db.session.commit()
+        _offers_committed()
         return jsonify({'message': 'deleted'}), 200
     except Exception as e:
         db.session.rollback()
@@ -1,7 +1,16 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from extensions import db
-from models import Cart, CartItem, Order, OrderItem, Product, Customer
+from models import Cart, Order, OrderItem, Customer
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+from checkout.cart import CartError, add_item, cart_totals, get_or_create_cart, set_items
+from checkout.orders import cart_lines, place_order
+from checkout.stock import OutOfStock, reserve_stock
+from inventory import summary as stock_summary
+from queries.enrich import attach_customers
+from queries.listing import list_response, equals, on_or_after, on_or_before
+from serialization.rows import attach_children, columns, row_dicts
 
 order_bp = Blueprint('order', __name__)
 
@@ -13,20 +22,24 @@ def list_orders():
     # allow admin or staff to view all orders
     if claims.get('role') not in ('admin', 'staff'):
         return jsonify({'message': 'forbidden'}), 403
-    orders = Order.query.order_by(Order.created_at.desc()).all()
-    out = []
-    for o in orders:
-        d = o.to_dict()
-        # attach customer name if available
-        try:
-            cust = Customer.query.get(o.customer_id)
-            if cust and getattr(cust, 'user', None):
-                d['customer_name'] = cust.user.name
-        except Exception:
-            pass
-        # created_at already in to_dict
-        out.append(d)
-    return jsonify(out)
+    return list_response(
+        db.session.query(*columns(Order)), Order.id, _serialize_orders, key='orders',
+        sorts={'created_at': Order.created_at, 'total_amount': Order.total_amount},
+        default_sort='-created_at',
+        filters={
+            'status': equals(Order.status),
+            'customer_id': equals(Order.customer_id, int),
+            'from': on_or_after(Order.created_at),
+            'to': on_or_before(Order.created_at),
+        },
+    )
+
+
+def _serialize_orders(rows):
+    # plain column rows; items, then customer names for the whole page come
+    # from one OrderItem, one Customer and one Users query
+    orders = attach_children(row_dicts(rows), columns(OrderItem), OrderItem.order_id, 'items')
+    return attach_customers(orders, [o['customer_id'] for o in orders])
 
 
 @order_bp.route('/orders/my', methods=['GET'])
@@ -52,20 +65,47 @@ def my_orders():
 @order_bp.route('/cart', methods=['POST'])
 @jwt_required()
 def add_to_cart():
+    # adds quantity (default 1) of product_id to the customer's cart, raising
+    # the existing line if the product is already there; without product_id
+    # just returns the (possibly new) cart
     user_id = get_jwt_identity()
     data = request.get_json() or {}
     customer_id = data.get('customer_id')
     product_id = data.get('product_id')
-    qty = int(data.get('quantity', 1))
-    cart = Cart.query.filter_by(customer_id=customer_id).first()
+    cart = get_or_create_cart(customer_id)
+    if product_id is not None:
+        try:
+            add_item(cart.id, product_id, data.get('quantity', 1))
+        except CartError as e:
+            db.session.rollback()
+            return jsonify({'message': str(e)}), 400
+    db.session.commit()
+    return jsonify(_cart_payload(cart.id)), 201
+
+
+@order_bp.route('/cart/<int:cart_id>/items', methods=['PUT'])
+@jwt_required()
+def update_cart_items(cart_id):
+    # batch change: {"items": [{"product_id": 1, "quantity": 2}, ...], "replace": false}
+    # sets each listed line's quantity (0 removes it); replace also drops unlisted lines
+    cart = Cart.query.get(cart_id)
     if not cart:
-        cart = Cart(customer_id=customer_id)
-        db.session.add(cart)
-        db.session.flush()
-    item = CartItem(cart_id=cart.id, product_id=product_id, quantity=qty)
-    db.session.add(item)
+        return jsonify({'message': 'not found'}), 404
+    data = request.get_json() or {}
+    items = data.get('items')
+    if not isinstance(items, list):
+        return jsonify({'message': 'items list required'}), 400
+    try:
+        set_items(cart_id, items, replace=bool(data.get('replace', False)))
+    except CartError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 400
+    except IntegrityError:
+        # a line added concurrently, or a product that does not exist
+        db.session.rollback()
+        return jsonify({'message': 'cart changed concurrently or unknown product; reload and retry'}), 409
     db.session.commit()
-    return jsonify(cart.to_dict()), 201
+    return jsonify(_cart_payload(cart_id))
 
 
 @order_bp.route('/cart/<int:cart_id>', methods=['GET'])
@@ -74,7 +114,17 @@ def view_cart(cart_id):
     cart = Cart.query.get(cart_id)
     if not cart:
         return jsonify({'message': 'not found'}), 404
-    return jsonify(cart.to_dict())
+    return jsonify(_cart_payload(cart_id))
+
+
+def _cart_payload(cart_id):
+    # cart with its items plus cached subtotal, offer discount and total;
+    # commits, so a total cart_totals repriced is stored
+    cart = Cart.query.options(selectinload(Cart.items)).filter(Cart.id == cart_id).first()
+    d = cart.to_dict()
+    d.update(cart_totals(cart_id))
+    db.session.commit()
+    return d
 
 
 @order_bp.route('/orders', methods=['POST'])
@@ -86,18 +136,15 @@ def create_order():
     cart = Cart.query.get(cart_id)
     if not cart:
         return jsonify({'message': 'cart not found'}), 404
-    total = 0
-    for it in cart.items:
-        prod = Product.query.get(it.product_id)
-        price = float(prod.price) if prod else 0
-        total += price * it.quantity
-    order = Order(customer_id=customer_id, cart_id=cart_id, total_amount=total, status='pending')
-    db.session.add(order)
-    db.session.flush()
-    for it in cart.items:
-        prod = Product.query.get(it.product_id)
-        oi = OrderItem(order_id=order.id, product_id=it.product_id, quantity=it.quantity, unit_price=(prod.price if prod else 0))
-        db.session.add(oi)
+    # one query prices the whole cart; totals are summed as Decimal
+    lines = cart_lines(cart_id)
+    try:
+        # stock is taken in the same transaction as the order is written
+        reserve_stock(lines)
+    except OutOfStock as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
+    order = place_order(customer_id, cart_id, lines)
     db.session.commit()
     return jsonify(order.to_dict()), 201
 
@@ -116,6 +163,8 @@ def update_order_status(order_id):
     order = Order.query.get(order_id)
     if not order:
         return jsonify({'message': 'not found'}), 404
+    old_status = order.status
     order.status = status
+    stock_summary.order_status_changed(order.id, old_status, status)
     db.session.commit()
     return jsonify(order.to_dict())
@@ -3,6 +3,7 @@ from flask_jwt_extended import jwt_required
 from extensions import db
 from models import Order
 
+from datetime import datetime
 import razorpay
 import os
 
@@ -75,6 +76,7 @@ def verify_payment():
     if not order:
         return jsonify({'message': 'order not found'}), 404
     order.status = 'paid'
+    order.paid_at = order.paid_at or datetime.utcnow()
     db.session.commit()
 
     return jsonify({'message': 'payment verified', 'order': order.to_dict()})
@@ -1,7 +1,12 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt
 from extensions import db
-from models import Brand, Product, ProductDetail, Supplier, Stock
+from models import Brand, Product, ProductDetail, Supplier, Stock, StockSummary
+from catalog.http_cache import http_cached
+from checkout import cart as cart_pricing
+from inventory import summary as stock_summary
+from pricing.offers import price_book, price_fields
+from queries.listing import list_response, equals, contains, at_least, at_most, as_bool
 
 prod_bp = Blueprint('product', __name__)
 
@@ -12,6 +17,7 @@ def admin_required():
 
 
 @prod_bp.route('/brands', methods=['GET'])
+@http_cached('brand')
 def list_brands():
     return jsonify([b.to_dict() for b in Brand.query.all()])
 
@@ -109,17 +115,31 @@ def delete_brand(brand_id):
 
 
 @prod_bp.route('/products', methods=['GET'])
+@http_cached('product', 'brand', 'offer', daily=True)
 def list_products():
-    prods = Product.query.all()
+    q = db.session.query(Product, Brand.name.label('brand_name')).outerjoin(Brand, Brand.id == Product.brand_id)
+    return list_response(
+        q, Product.id, _serialize_products, key='products',
+        sorts={'name': Product.name, 'price': Product.price},
+        filters={
+            'brand_id': equals(Product.brand_id, int),
+            'is_active': equals(Product.is_active, as_bool),
+            'q': contains(Product.name),
+            'min_price': at_least(Product.price),
+            'max_price': at_most(Product.price),
+        },
+    )
+
+
+def _serialize_products(rows):
+    book = price_book.get()
     out = []
-    for p in prods:
+    for p, brand_name in rows:
         d = p.to_dict()
-        try:
-            d['brand_name'] = p.brand.name if p.brand else None
-        except Exception:
-            d['brand_name'] = None
+        d['brand_name'] = brand_name
+        d.update(price_fields(book.product(p.id, p.price)))
         out.append(d)
-    return jsonify(out)
+    return out
 
 
 @prod_bp.route('/products', methods=['POST'])
@@ -150,6 +170,8 @@ def update_product(product_id):
         p.price = data.get('price', p.price)
     except Exception:
         pass
+    if 'price' in data:
+        cart_pricing.invalidate(product_ids=[p.id])
     db.session.commit()
     return jsonify(p.to_dict())
 
@@ -162,6 +184,7 @@ def delete_product(product_id):
     p = Product.query.get(product_id)
     if not p:
         return jsonify({'message': 'not found'}), 404
+    cart_pricing.invalidate(product_ids=[p.id])
     db.session.delete(p)
     db.session.commit()
     return jsonify({'ok': True})
@@ -170,24 +193,34 @@ def delete_product(product_id):
 @prod_bp.route('/stock', methods=['GET'])
 @jwt_required()
 def list_stock():
-    stocks = Stock.query.all()
+    # product totals ride along from the stock summary in the same query
+    q = db.session.query(Stock, Product.name.label('product_name'), Supplier.name.label('supplier_name'), StockSummary) \
+        .outerjoin(Product, Product.id == Stock.product_id) \
+        .outerjoin(Supplier, Supplier.id == Stock.supplier_id) \
+        .outerjoin(StockSummary, StockSummary.product_id == Stock.product_id)
+    return list_response(
+        q, Stock.id, _serialize_stock, key='stock',
+        sorts={'quantity': Stock.quantity},
+        filters={
+            'product_id': equals(Stock.product_id, int),
+            'supplier_id': equals(Stock.supplier_id, int),
+            'low': lambda v: (Stock.quantity <= Stock.reorder_level) if as_bool(v) else (Stock.quantity > Stock.reorder_level),
+        },
+    )
+
+
+def _serialize_stock(rows):
     out = []
-    for s in stocks:
+    for s, product_name, supplier_name, summary in rows:
         d = s.to_dict()
-        try:
-            d['product_name'] = s.product.name if s.product else None
-        except Exception:
-            d['product_name'] = None
-        try:
-            d['supplier_name'] = s.supplier.name if s.supplier else None
-        except Exception:
-            d['supplier_name'] = None
-        try:
-            d['updated_at'] = s.last_updated.strftime('%Y-%m-%d %H:%M') if getattr(s, 'last_updated', None) else None
-        except Exception:
-            d['updated_at'] = None
+        d['product_name'] = product_name
+        d['supplier_name'] = supplier_name
+        d['updated_at'] = s.last_updated.strftime('%Y-%m-%d %H:%M') if s.last_updated else None
+        d['product_on_hand'] = summary.on_hand if summary else None
+        d['product_reserved'] = summary.reserved if summary else None
+        d['product_low'] = summary.is_low if summary else None
         out.append(d)
-    return jsonify(out)
+    return out
 
 
 @prod_bp.route('/stock', methods=['POST'])
@@ -198,6 +231,7 @@ def add_stock():
     data = request.get_json() or {}
     s = Stock(product_id=data.get('product_id'), supplier_id=data.get('supplier_id'), quantity=data.get('quantity',0), reorder_level=data.get('reorder_level',5))
     db.session.add(s)
+    stock_summary.stock_row_changed(None, (s.product_id, s.quantity, s.reorder_level))
     db.session.commit()
     return jsonify(s.to_dict()), 201
 
@@ -205,9 +239,37 @@ def add_stock():
 @prod_bp.route('/stock/low', methods=['GET'])
 @jwt_required()
 def low_stock():
-    # simple low-stock alert
-    low = Stock.query.filter(Stock.quantity <= Stock.reorder_level).all()
-    return jsonify([s.to_dict() for s in low])
+    # Stock rows of products whose total on hand is at or below their
+    # reorder level, found through the stock summary's is_low index; each row
+    # keeps its Stock fields and carries the product totals as /stock does
+    rows = db.session.query(Stock, Product.name.label('product_name'), Supplier.name.label('supplier_name'), StockSummary) \
+        .join(StockSummary, StockSummary.product_id == Stock.product_id) \
+        .outerjoin(Product, Product.id == Stock.product_id) \
+        .outerjoin(Supplier, Supplier.id == Stock.supplier_id) \
+        .filter(StockSummary.is_low.is_(True)) \
+        .order_by(Stock.product_id, Stock.id).all()
+    return jsonify(_serialize_stock(rows))
+
+
+@prod_bp.route('/stock/summary', methods=['GET'])
+@jwt_required()
+def stock_summary_list():
+    q = db.session.query(StockSummary, Product.name.label('product_name')) \
+        .outerjoin(Product, Product.id == StockSummary.product_id)
+    return list_response(
+        q, StockSummary.product_id, _serialize_summaries, key='summary',
+        sorts={'on_hand': StockSummary.on_hand},
+        filters={'low': equals(StockSummary.is_low, as_bool)},
+    )
+
+
+def _serialize_summaries(rows):
+    out = []
+    for summary, product_name in rows:
+        d = summary.to_dict()
+        d['product_name'] = product_name
+        out.append(d)
+    return out
 
 
 @prod_bp.route('/stock/<int:stock_id>', methods=['PUT'])
@@ -219,6 +281,7 @@ def update_stock(stock_id):
     if not s:
         return jsonify({'message': 'not found'}), 404
     data = request.get_json() or {}
+    before = (s.product_id, s.quantity, s.reorder_level)
     s.product_id = data.get('product_id', s.product_id)
     s.supplier_id = data.get('supplier_id', s.supplier_id)
     try:
@@ -229,6 +292,7 @@ def update_stock(stock_id):
         s.reorder_level = int(data.get('reorder_level', s.reorder_level))
     except Exception:
         pass
+    stock_summary.stock_row_changed(before, (s.product_id, s.quantity, s.reorder_level))
     db.session.commit()
     d = s.to_dict()
     try:
@@ -255,5 +319,6 @@ def delete_stock(stock_id):
     if not s:
         return jsonify({'message': 'not found'}), 404
     db.session.delete(s)
+    stock_summary.stock_row_changed((s.product_id, s.quantity, s.reorder_level), None)
     db.session.commit()
     return jsonify({'ok': True})
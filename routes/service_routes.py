@@ -2,6 +2,9 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt
 from extensions import db
 from models import Category, SubCategory, Service, Package, PackageDetail
+from catalog.snapshot import TABLES as CATALOG_TABLES, catalog_snapshot
+from catalog.http_cache import http_cached
+from pricing.offers import price_book, price_fields
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm.exc import NoResultFound
 
@@ -13,7 +16,15 @@ def admin_required():
     return claims.get('role') == 'admin'
 
 
+@svc_bp.route('/catalog', methods=['GET'])
+@http_cached(*CATALOG_TABLES, daily=True)
+def catalog():
+    # categories, subcategories, services and packages in one prebuilt body
+    return current_app.response_class(catalog_snapshot.get().body, mimetype='application/json')
+
+
 @svc_bp.route('/categories', methods=['GET'])
+@http_cached('category')
 def list_categories():
     cats = Category.query.all()
     return jsonify([c.to_dict() for c in cats])
@@ -74,9 +85,11 @@ def delete_category(cat_id):
 
 
 @svc_bp.route('/services', methods=['GET'])
+@http_cached('service', 'offer', daily=True)
 def list_services():
     services = Service.query.all()
-    return jsonify([s.to_dict() for s in services])
+    book = price_book.get()
+    return jsonify([dict(s.to_dict(), **price_fields(book.service(s.id, s.price))) for s in services])
 
 
 @svc_bp.route('/services', methods=['POST'])
@@ -104,6 +117,7 @@ def create_service():
 
 
 @svc_bp.route('/packages', methods=['GET'])
+@http_cached('package', 'package_detail')
 def list_packages():
     packs = Package.query.filter_by(is_active=True).all()
     return jsonify([p.to_dict() for p in packs])
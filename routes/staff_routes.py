@@ -1,44 +1,52 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from extensions import db
-from models.staff import Staff
+from models.staff import Staff, StaffShift, StaffBreak, Holiday
 from models.user import Users
+from scheduling.cache import slot_cache
+from scheduling.roster import roster_store
+from queries.listing import list_response, equals, contains, as_bool
+import datetime
 
 staff_bp = Blueprint('staff', __name__)
 
 @staff_bp.route('/staff', methods=['GET'])
 def list_staff():
-    staffs = Staff.query.all()
-    result = []
-    for s in staffs:
-        user = Users.query.get(s.user_id)
-        result.append({
-            'id': s.id,
-            'user_id': s.user_id,
-            'name': user.name if user else None,
-            'email': user.email if user else None,
-            'phone': s.phone,
-            'is_active': s.is_active,
-            'is_available': s.is_available
-        })
-    return jsonify(result)
+    return list_response(
+        _staff_query(), Staff.id, _serialize_staff, key='staff',
+        sorts={'name': Users.name},
+        filters={
+            'is_active': equals(Staff.is_active, as_bool),
+            'is_available': equals(Staff.is_available, as_bool),
+            'q': contains(Users.name),
+        },
+    )
+
+
+def _staff_query():
+    return db.session.query(
+        Staff.id, Staff.user_id, Users.name.label('name'), Users.email.label('email'),
+        Staff.phone, Staff.is_active, Staff.is_available,
+    ).outerjoin(Users, Users.id == Staff.user_id)
+
+
+def _serialize_staff(rows):
+    return [{
+        'id': s.id,
+        'user_id': s.user_id,
+        'name': s.name,
+        'email': s.email,
+        'phone': s.phone,
+        'is_active': s.is_active,
+        'is_available': s.is_available
+    } for s in rows]
+
 
 @staff_bp.route('/staff/available', methods=['GET'])
 def available_staff():
-    staffs = Staff.query.filter_by(is_active=True, is_available=True).all()
-    result = []
-    for s in staffs:
-        user = Users.query.get(s.user_id)
-        result.append({
-            'id': s.id,
-            'user_id': s.user_id,
-            'name': user.name if user else None,
-            'email': user.email if user else None,
-            'phone': s.phone,
-            'is_active': s.is_active,
-            'is_available': s.is_available
-        })
-    return jsonify(result)
+    q = _staff_query().filter(Staff.is_active.is_(True), Staff.is_available.is_(True))
+    return list_response(q, Staff.id, _serialize_staff, key='staff',
+                         sorts={'name': Users.name}, filters={'q': contains(Users.name)})
 
 
 @staff_bp.route('/staff', methods=['POST'])
@@ -63,6 +71,7 @@ def create_staff():
     s = Staff(user_id=u.id, phone=phone, is_active=True, is_available=True)
     db.session.add(s)
     db.session.commit()
+    slot_cache.staff_availability_changed(s.id, True)
     return jsonify({'user': u.to_dict(), 'staff': s.to_dict()}), 201
 
 
@@ -72,11 +81,13 @@ def list_users():
     claims = get_jwt()
     if claims.get('role') != 'admin':
         return jsonify({'message': 'admin required'}), 403
-    users = Users.query.all()
-    out = []
-    for u in users:
-        out.append({'id': u.id, 'name': u.name, 'email': u.email, 'role': u.role})
-    return jsonify(out)
+    q = db.session.query(Users.id, Users.name, Users.email, Users.role)
+    return list_response(
+        q, Users.id, lambda rows: [{'id': u.id, 'name': u.name, 'email': u.email, 'role': u.role} for u in rows],
+        key='users',
+        sorts={'name': Users.name, 'email': Users.email},
+        filters={'role': equals(Users.role), 'q': contains(Users.name), 'email': contains(Users.email)},
+    )
 
 
 @staff_bp.route('/staff/<int:staff_id>', methods=['PUT'])
@@ -129,6 +140,7 @@ def delete_staff(staff_id):
         if user:
             db.session.delete(user)
         db.session.commit()
+        slot_cache.staff_availability_changed(staff_id, False)
         return jsonify({'message': 'deleted'}), 200
     except Exception as e:
         db.session.rollback()
@@ -163,6 +175,7 @@ def create_my_staff_profile():
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'failed to create staff profile', 'error': str(e)}), 500
+    slot_cache.staff_availability_changed(s.id, True)
 
     return jsonify({'staff': s.to_dict()}), 201
 
@@ -205,6 +218,7 @@ def update_my_staff_profile():
     is_available = data.get('is_available')
     if phone is not None:
         s.phone = phone
+    was_available = s.is_available
     if is_available is not None:
         # accept booleans or strings
         if isinstance(is_available, str):
@@ -217,5 +231,111 @@ def update_my_staff_profile():
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'failed to update staff profile', 'error': str(e)}), 500
+    if s.is_available != was_available:
+        slot_cache.staff_availability_changed(s.id, s.is_available and s.is_active)
 
     return jsonify({'staff': s.to_dict()})
+
+
+def _roster_changed():
+    # rosters change rarely: recompile everything instead of patching grids
+    roster_store.invalidate()
+    slot_cache.clear()
+
+
+def _parse_weekly(entries, model, staff_id):
+    # entries: [{weekday: 0-6, start: 'HH:MM', end: 'HH:MM'}]
+    rows = []
+    for e in entries:
+        weekday = int(e.get('weekday'))
+        start = datetime.time.fromisoformat(e.get('start'))
+        end = datetime.time.fromisoformat(e.get('end'))
+        if weekday < 0 or weekday > 6 or start >= end:
+            raise ValueError('invalid entry')
+        rows.append(model(staff_id=staff_id, weekday=weekday, start_time=start, end_time=end))
+    return rows
+
+
+@staff_bp.route('/staff/<int:staff_id>/roster', methods=['GET'])
+@jwt_required()
+def get_staff_roster(staff_id):
+    claims = get_jwt()
+    s = Staff.query.get(staff_id)
+    if not s:
+        return jsonify({'message': 'staff not found'}), 404
+    if claims.get('role') != 'admin' and str(s.user_id) != str(get_jwt_identity()):
+        return jsonify({'message': 'admin required'}), 403
+    return jsonify({
+        'shifts': [x.to_dict() for x in s.shifts],
+        'breaks': [x.to_dict() for x in s.breaks],
+        'holidays': [x.to_dict() for x in s.holidays]
+    })
+
+
+@staff_bp.route('/staff/<int:staff_id>/roster', methods=['PUT'])
+@jwt_required()
+def update_staff_roster(staff_id):
+    # replaces the weekly shifts and breaks; an empty shift list means default salon hours
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'message': 'admin required'}), 403
+    s = Staff.query.get(staff_id)
+    if not s:
+        return jsonify({'message': 'staff not found'}), 404
+    data = request.get_json() or {}
+    try:
+        shifts = _parse_weekly(data.get('shifts', []), StaffShift, s.id)
+        breaks = _parse_weekly(data.get('breaks', []), StaffBreak, s.id)
+    except (TypeError, ValueError):
+        return jsonify({'message': 'shifts and breaks need weekday (0-6), start and end (HH:MM)'}), 400
+    s.shifts = shifts
+    s.breaks = breaks
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'failed to update roster', 'error': str(e)}), 500
+    _roster_changed()
+    return jsonify({'shifts': [x.to_dict() for x in s.shifts], 'breaks': [x.to_dict() for x in s.breaks]})
+
+
+@staff_bp.route('/holidays', methods=['GET'])
+def list_holidays():
+    return jsonify([h.to_dict() for h in Holiday.query.order_by(Holiday.date.asc()).all()])
+
+
+@staff_bp.route('/holidays', methods=['POST'])
+@jwt_required()
+def create_holiday():
+    # staff_id omitted: the whole salon is closed that day
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'message': 'admin required'}), 403
+    data = request.get_json() or {}
+    try:
+        day = datetime.date.fromisoformat(data.get('date'))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'date (YYYY-MM-DD) required'}), 400
+    staff_id = data.get('staff_id')
+    if staff_id and not Staff.query.get(staff_id):
+        return jsonify({'message': 'staff not found'}), 404
+    h = Holiday(staff_id=staff_id or None, date=day, reason=data.get('reason'))
+    db.session.add(h)
+    db.session.commit()
+    _roster_changed()
+    return jsonify(h.to_dict()), 201
+
+
+@staff_bp.route('/holidays/<int:holiday_id>', methods=['DELETE'])
+@jwt_required()
+def delete_holiday(holiday_id):
+    claims = get_jwt()
+    if claims.get('role') != 'admin':
+        return jsonify({'message': 'admin required'}), 403
+    h = Holiday.query.get(holiday_id)
+    if not h:
+        return jsonify({'message': 'not found'}), 404
+    db.session.delete(h)
+    db.session.commit()
+    _roster_changed()
+    return jsonify({'message': 'deleted'}), 200
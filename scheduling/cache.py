@@ -0,0 +1,258 @@
+from collections import OrderedDict
+from models import Staff
+from scheduling.index import schedule_index
+from scheduling.occupancy import ACTIVE_STATUSES, occupied_interval, travel_buffer
+from scheduling.roster import roster_store
+from scheduling.slots import slot_grid_for_day
+import bisect
+import datetime
+import json
+import threading
+import time
+
+# optional imports
+try:
+    import redis
+except Exception:
+    redis = None
+
+
+class LRUBackend:
+    # in-process store, evicts the least recently used grid past maxsize
+
+    name = 'memory'
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            expires_at = time.monotonic() + ttl if ttl else None
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self, prefix=''):
+        with self._lock:
+            return [k for k in self._data if k.startswith(prefix)]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def size(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    # grids stored as JSON in a local Redis (or any server speaking its protocol),
+    # shared by every worker process
+
+    name = 'redis'
+
+    def __init__(self, url, namespace='slotgrid:'):
+        self.client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        raw = self.client.get(self.namespace + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.namespace + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.namespace + key)
+
+    def keys(self, prefix=''):
+        start = len(self.namespace)
+        return [k.decode()[start:] for k in self.client.scan_iter(match=f'{self.namespace}{prefix}*')]
+
+    def clear(self):
+        for key in self.client.scan_iter(match=f'{self.namespace}*'):
+            self.client.delete(key)
+
+    def size(self):
+        return sum(1 for _ in self.client.scan_iter(match=f'{self.namespace}*'))
+
+
+def _key(day, duration_mins, home):
+    return f"{day.isoformat()}:{duration_mins}:{'home' if home else 'salon'}"
+
+
+def _copy(grid):
+    # grids handed out by the backend may be read by other threads; patch a copy
+    return dict(grid, staff_ids=list(grid['staff_ids']),
+                slots=[[start, end, list(free)] for start, end, free in grid['slots']])
+
+
+def _parse_key(key):
+    day, duration_mins, location = key.split(':')
+    return datetime.date.fromisoformat(day), int(duration_mins), location == 'home'
+
+
+class SlotGridCache:
+    # Precomputed slot grids keyed by (date, service duration, location). A grid
+    # holds the free staff of every slot of the day and is patched in place
+    # when occupancy or staff availability changes, so only the slots touched
+    # by a write are recomputed. Patches work on a copy that replaces the
+    # stored grid. Every sync bumps a version; a grid computed on a miss is
+    # only stored if no sync happened while it was being built, since it may
+    # predate the write that sync was for.
+
+    def __init__(self):
+        self.backend = LRUBackend()
+        self.ttl = 300
+        self.hits = 0
+        self.misses = 0
+        self._version = 0
+        self._lock = threading.RLock()
+
+    def init_app(self, app):
+        backend = app.config.get('SLOT_CACHE_BACKEND', 'memory')
+        self.ttl = app.config.get('SLOT_CACHE_TTL', 300)
+        if backend == 'redis':
+            if redis is None:
+                app.logger.warning('SLOT_CACHE_BACKEND=redis but the redis package is missing; using memory')
+            else:
+                self.backend = RedisBackend(app.config.get('SLOT_CACHE_URL', 'redis://localhost:6379/0'))
+                return
+        self.backend = LRUBackend(app.config.get('SLOT_CACHE_SIZE', 512))
+
+    def slots_for_day(self, day, duration_mins, home=False):
+        # free slots in the /api/slots format, served from the grid when cached
+        key = _key(day, duration_mins, home)
+        grid = self.backend.get(key)
+        if grid is None:
+            with self._lock:
+                self.misses += 1
+                version = self._version
+            staff_ids = [s.id for s in Staff.query.filter_by(is_available=True, is_active=True).order_by(Staff.id).all()]
+            grid = slot_grid_for_day(day, duration_mins, staff_ids, home=home)
+            with self._lock:
+                if self._version == version:
+                    self.backend.set(key, grid, self.ttl)
+        else:
+            with self._lock:
+                self.hits += 1
+        return [{'start': start, 'end': end, 'available_staff': list(free)}
+                for start, end, free in grid['slots'] if free]
+
+    def _patch(self, keys, patch_fn):
+        # one patch at a time, so concurrent syncs cannot overwrite each other's copies
+        with self._lock:
+            self._version += 1
+            for key in keys:
+                grid = self.backend.get(key)
+                if grid is None:
+                    continue
+                grid = _copy(grid)
+                _, _, home = _parse_key(key)
+                pad = travel_buffer() if home else datetime.timedelta(0)
+                if patch_fn(grid, pad):
+                    self.backend.set(key, grid, self.ttl)
+
+    def _keys_for_window(self, start, end):
+        # grids of every day the (already padded) window can reach
+        keys = []
+        day = (start - travel_buffer()).date()
+        while day <= (end + travel_buffer()).date():
+            keys.extend(self.backend.keys(f'{day.isoformat()}:'))
+            day += datetime.timedelta(days=1)
+        return keys
+
+    def _recheck(self, grid, pad, staff_id, start=None, end=None):
+        # re-add staff_id to slots (optionally only those overlapping
+        # [start, end)) it works in and where the schedule index says it is free again
+        roster = roster_store.get()
+        changed = False
+        for slot in grid['slots']:
+            slot_start = datetime.datetime.fromisoformat(slot[0]) - pad
+            slot_end = datetime.datetime.fromisoformat(slot[1]) + pad
+            if start is not None and not (slot_start < end and start < slot_end):
+                continue
+            if staff_id in slot[2] or not roster.is_working(staff_id, slot_start + pad, slot_end - pad):
+                continue
+            if schedule_index.is_free(staff_id, slot_start, slot_end):
+                bisect.insort(slot[2], staff_id)
+                changed = True
+        return changed
+
+    def _sync(self, kind, staff_id, start, end, status):
+        # call after schedule_index has been synced for the same row
+        if staff_id is None:
+            return
+        start, end = occupied_interval(kind, start, end)
+        active = status in ACTIVE_STATUSES
+
+        def patch(grid, pad):
+            if staff_id not in grid['staff_ids']:
+                return False
+            if not active:
+                return self._recheck(grid, pad, staff_id, start, end)
+            changed = False
+            for slot in grid['slots']:
+                slot_start = datetime.datetime.fromisoformat(slot[0]) - pad
+                slot_end = datetime.datetime.fromisoformat(slot[1]) + pad
+                if slot_start < end and start < slot_end and staff_id in slot[2]:
+                    slot[2].remove(staff_id)
+                    changed = True
+            return changed
+
+        self._patch(self._keys_for_window(start, end), patch)
+
+    def sync_appointment(self, appt):
+        self._sync('appointment', appt.staff_id, appt.start_datetime, appt.end_datetime, appt.status)
+
+    def sync_booking(self, booking):
+        self._sync('booking', booking.staff_id, booking.start_datetime, booking.end_datetime, booking.status)
+
+    def staff_availability_changed(self, staff_id, available):
+        def patch(grid, pad):
+            if available:
+                if staff_id in grid['staff_ids']:
+                    return False
+                bisect.insort(grid['staff_ids'], staff_id)
+                self._recheck(grid, pad, staff_id)
+                return True
+            if staff_id not in grid['staff_ids']:
+                return False
+            grid['staff_ids'].remove(staff_id)
+            for slot in grid['slots']:
+                if staff_id in slot[2]:
+                    slot[2].remove(staff_id)
+            return True
+
+        self._patch(self.backend.keys(), patch)
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        return {'backend': self.backend.name, 'hits': hits, 'misses': misses, 'size': self.backend.size()}
+
+
+slot_cache = SlotGridCache()
@@ -0,0 +1,153 @@
+from flask import current_app
+from scheduling.occupancy import ACTIVE_STATUSES, load_occupancy, occupied_interval
+import bisect
+import datetime
+import threading
+import time
+
+
+class StaffTimeline:
+    # one staff member's intervals for a day, kept sorted by start together with
+    # a running maximum of end times so an overlap check is a single bisect
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []  # (start, end, key)
+        self.max_ends = []
+
+    def _rebuild_max_ends(self, from_idx):
+        running = self.max_ends[from_idx - 1] if from_idx > 0 else None
+        del self.max_ends[from_idx:]
+        for _, end, _ in self.entries[from_idx:]:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+
+    def add(self, start, end, key):
+        idx = bisect.bisect_right(self.starts, start)
+        self.starts.insert(idx, start)
+        self.entries.insert(idx, (start, end, key))
+        self._rebuild_max_ends(idx)
+
+    def remove(self, key):
+        for idx, entry in enumerate(self.entries):
+            if entry[2] == key:
+                del self.starts[idx]
+                del self.entries[idx]
+                self._rebuild_max_ends(idx)
+                return True
+        return False
+
+    def is_free(self, start, end):
+        # every interval starting before `end` is left of idx; the busiest of
+        # them overlaps [start, end) iff it ends after `start`
+        idx = bisect.bisect_left(self.starts, end)
+        return idx == 0 or self.max_ends[idx - 1] <= start
+
+
+class DaySchedule:
+    def __init__(self, day):
+        self.day = day
+        self.loaded_at = time.monotonic()
+        self.timelines = {}
+        self.keys = {}  # key -> staff_id
+
+    def add(self, key, staff_id, start, end):
+        self.timelines.setdefault(staff_id, StaffTimeline()).add(start, end, key)
+        self.keys[key] = staff_id
+
+    def remove(self, key):
+        staff_id = self.keys.pop(key, None)
+        if staff_id is not None:
+            self.timelines[staff_id].remove(key)
+
+    def is_free(self, staff_id, start, end):
+        timeline = self.timelines.get(staff_id)
+        return timeline is None or timeline.is_free(start, end)
+
+
+def _day_bounds(day):
+    start = datetime.datetime(day.year, day.month, day.day)
+    return start, start + datetime.timedelta(days=1)
+
+
+def _days_spanned(start, end):
+    day = start.date()
+    last = (end - datetime.timedelta(microseconds=1)).date() if end > start else day
+    while day <= last:
+        yield day
+        day += datetime.timedelta(days=1)
+
+
+class StaffScheduleIndex:
+    # Process-wide index of staff occupancy built from Appointment and Booking
+    # rows. Days are loaded lazily with one occupancy query and then kept up to
+    # date through sync_appointment/sync_booking after every write. Days older
+    # than SCHEDULE_INDEX_TTL seconds are reloaded so writes made by other
+    # worker processes are picked up.
+
+    def __init__(self):
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def _ttl(self):
+        try:
+            return current_app.config.get('SCHEDULE_INDEX_TTL', 30)
+        except RuntimeError:
+            return 30
+
+    def _load_day(self, day):
+        schedule = DaySchedule(day)
+        day_start, day_end = _day_bounds(day)
+        for occ in load_occupancy(day_start, day_end):
+            schedule.add((occ.kind, occ.id), occ.staff_id, occ.start, occ.end)
+        return schedule
+
+    def _day(self, day):
+        # callers hold the lock; loading under it keeps a concurrent sync from
+        # landing on a schedule that is about to be replaced
+        schedule = self._days.get(day)
+        if schedule is None or time.monotonic() - schedule.loaded_at >= self._ttl():
+            schedule = self._load_day(day)
+            self._days[day] = schedule
+        return schedule
+
+    def is_free(self, staff_id, start, end):
+        return bool(self.free_staff([staff_id], start, end))
+
+    def free_staff(self, staff_ids, start, end):
+        # candidates (in the given order) with no overlapping interval
+        with self._lock:
+            schedules = [self._day(day) for day in _days_spanned(start, end)]
+            return [staff_id for staff_id in staff_ids
+                    if all(s.is_free(staff_id, start, end) for s in schedules)]
+
+    def first_free(self, staff_ids, start, end):
+        free = self.free_staff(staff_ids, start, end)
+        return free[0] if free else None
+
+    def _sync(self, key, staff_id, start, end, status):
+        start, end = occupied_interval(key[0], start, end)
+        with self._lock:
+            for schedule in self._days.values():
+                schedule.remove(key)
+            if staff_id is None or status not in ACTIVE_STATUSES:
+                return
+            for day in _days_spanned(start, end):
+                schedule = self._days.get(day)
+                if schedule is not None:
+                    schedule.add(key, staff_id, start, end)
+
+    def sync_appointment(self, appt):
+        # call after commit whenever an appointment is created or changes status
+        self._sync(('appointment', appt.id), appt.staff_id, appt.start_datetime, appt.end_datetime, appt.status)
+
+    def sync_booking(self, booking):
+        # call after commit whenever a booking is created or changes status
+        self._sync(('booking', booking.id), booking.staff_id, booking.start_datetime, booking.end_datetime, booking.status)
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+
+
+schedule_index = StaffScheduleIndex()
@@ -0,0 +1,65 @@
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import literal
+from extensions import db
+from models import Appointment, Booking
+import datetime
+
+# statuses that keep a staff member busy, for both appointments and home bookings
+ACTIVE_STATUSES = ('approved', 'pending')
+
+# one busy interval of a staff member; home bookings are already padded with travel time
+Occupancy = namedtuple('Occupancy', 'kind id staff_id start end')
+
+
+def travel_buffer():
+    try:
+        mins = current_app.config.get('HOME_TRAVEL_BUFFER_MINS', 30)
+    except RuntimeError:
+        mins = 30
+    return datetime.timedelta(minutes=mins)
+
+
+def occupied_interval(kind, start, end):
+    # a home visit blocks the staff member for the trip there and back as well
+    if kind == 'booking':
+        buf = travel_buffer()
+        return start - buf, end + buf
+    return start, end
+
+
+def load_occupancy(window_start, window_end, staff_ids=None):
+    # Staff occupancy touching [window_start, window_end) from Appointment and
+    # Booking in a single UNION ALL query. staff_ids limits the staff members
+    # considered; None means everyone.
+    if staff_ids is not None and not staff_ids:
+        return []
+    buf = travel_buffer()
+
+    appts = db.session.query(
+        literal('appointment').label('kind'), Appointment.id, Appointment.staff_id,
+        Appointment.start_datetime, Appointment.end_datetime,
+    ).filter(
+        Appointment.staff_id.isnot(None),
+        Appointment.status.in_(ACTIVE_STATUSES),
+        Appointment.start_datetime < window_end,
+        Appointment.end_datetime > window_start,
+    )
+    bookings = db.session.query(
+        literal('booking').label('kind'), Booking.id, Booking.staff_id,
+        Booking.start_datetime, Booking.end_datetime,
+    ).filter(
+        Booking.staff_id.isnot(None),
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.start_datetime < window_end + buf,
+        Booking.end_datetime > window_start - buf,
+    )
+    if staff_ids is not None:
+        appts = appts.filter(Appointment.staff_id.in_(staff_ids))
+        bookings = bookings.filter(Booking.staff_id.in_(staff_ids))
+
+    out = []
+    for kind, row_id, staff_id, start, end in appts.union_all(bookings).all():
+        start, end = occupied_interval(kind, start, end)
+        out.append(Occupancy(kind, row_id, staff_id, start, end))
+    return out
@@ -0,0 +1,61 @@
+from contextlib import contextmanager
+from extensions import db
+from models import Staff
+from scheduling.occupancy import load_occupancy
+import threading
+
+# in-process locks used where the database has no row locking (SQLite)
+_local_locks = {}
+_local_locks_guard = threading.Lock()
+
+
+def _supports_row_locks():
+    return db.session.get_bind().dialect.name in ('mysql', 'mariadb', 'postgresql')
+
+
+@contextmanager
+def staff_lock(staff_id):
+    # Serialize reservations for one staff member. On MySQL/Postgres this is
+    # SELECT ... FOR UPDATE on the staff row, held until the surrounding
+    # transaction commits or rolls back; on SQLite a per-staff threading lock.
+    if _supports_row_locks():
+        db.session.query(Staff.id).filter(Staff.id == staff_id).with_for_update().first()
+        yield
+        return
+    with _local_locks_guard:
+        lock = _local_locks.setdefault(staff_id, threading.Lock())
+    with lock:
+        yield
+
+
+def has_conflict(staff_id, start, end):
+    # authoritative check against the database (the schedule index may lag
+    # behind writes made by other worker processes)
+    for occ in load_occupancy(start, end, [staff_id]):
+        if occ.start < end and start < occ.end:
+            return True
+    return False
+
+
+def reserve(candidates, start, end, make_row):
+    # Try candidates in order: lock the staff member, re-check the window in
+    # the database and insert make_row(staff_id) before the lock is released.
+    # A candidate that turns out to be busy is skipped for the next one.
+    # Returns the committed row, or None when every candidate was taken.
+    for staff_id in candidates:
+        # start from a fresh transaction so the conflict check below reads
+        # rows committed by whoever held the lock before us
+        db.session.commit()
+        with staff_lock(staff_id):
+            if has_conflict(staff_id, start, end):
+                db.session.rollback()
+                continue
+            row = make_row(staff_id)
+            db.session.add(row)
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            return row
+    return None
@@ -0,0 +1,158 @@
+from flask import current_app
+from extensions import db
+from models import StaffShift, StaffBreak, Holiday
+import datetime
+import threading
+import time
+
+
+def _config(key, default):
+    try:
+        return current_app.config.get(key, default)
+    except RuntimeError:
+        return default
+
+
+def salon_hours():
+    # (opening, closing) as datetime.time, from WORK_START/WORK_END ('HH:MM')
+    return (datetime.time.fromisoformat(_config('WORK_START', '09:00')),
+            datetime.time.fromisoformat(_config('WORK_END', '18:00')))
+
+
+def slot_interval():
+    return datetime.timedelta(minutes=_config('SLOT_INTERVAL_MINS', 30))
+
+
+def _at(day, t):
+    return datetime.datetime.combine(day, t)
+
+
+def _subtract(intervals, cuts):
+    # remove every cut from sorted, disjoint intervals
+    out = []
+    for start, end in intervals:
+        pieces = [(start, end)]
+        for cut_start, cut_end in cuts:
+            next_pieces = []
+            for a, b in pieces:
+                if cut_end <= a or cut_start >= b:
+                    next_pieces.append((a, b))
+                    continue
+                if a < cut_start:
+                    next_pieces.append((a, cut_start))
+                if cut_end < b:
+                    next_pieces.append((cut_end, b))
+            pieces = next_pieces
+        out.extend(pieces)
+    return out
+
+
+class Roster:
+    # Snapshot of shifts, breaks and holidays, compiled on demand into per-day
+    # working intervals and per-slot availability bitmasks.
+
+    def __init__(self, shifts, breaks, holidays):
+        self.shifts = {}  # (staff_id, weekday) -> [(start_time, end_time)]
+        self.staff_with_shifts = set()
+        for s in shifts:
+            self.shifts.setdefault((s.staff_id, s.weekday), []).append((s.start_time, s.end_time))
+            self.staff_with_shifts.add(s.staff_id)
+        self.breaks = {}
+        for b in breaks:
+            self.breaks.setdefault((b.staff_id, b.weekday), []).append((b.start_time, b.end_time))
+        self.salon_holidays = set()
+        self.staff_holidays = set()
+        for h in holidays:
+            if h.staff_id is None:
+                self.salon_holidays.add(h.date)
+            else:
+                self.staff_holidays.add((h.staff_id, h.date))
+        self._masks = {}
+        self._lock = threading.Lock()
+
+    def working_intervals(self, staff_id, day):
+        # sorted, disjoint [start, end) datetimes the staff member works on day
+        if day in self.salon_holidays or (staff_id, day) in self.staff_holidays:
+            return []
+        open_t, close_t = salon_hours()
+        opening, closing = _at(day, open_t), _at(day, close_t)
+        weekday = day.weekday()
+        if staff_id in self.staff_with_shifts:
+            shifts = sorted(self.shifts.get((staff_id, weekday), ()))
+        else:
+            shifts = [(open_t, close_t)]
+        intervals = []
+        for start_t, end_t in shifts:
+            # clip to opening hours and merge overlapping shifts
+            start, end = max(_at(day, start_t), opening), min(_at(day, end_t), closing)
+            if start >= end:
+                continue
+            if intervals and start <= intervals[-1][1]:
+                intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end))
+            else:
+                intervals.append((start, end))
+        cuts = [(_at(day, a), _at(day, b)) for a, b in self.breaks.get((staff_id, weekday), ())]
+        return _subtract(intervals, cuts)
+
+    def is_working(self, staff_id, start, end):
+        return any(a <= start and end <= b for a, b in self.working_intervals(staff_id, start.date()))
+
+    def _compile(self, day, duration_mins, staff_id):
+        # bit i is set when slot i of the day lies entirely inside a working interval
+        open_t, close_t = salon_hours()
+        cur, closing = _at(day, open_t), _at(day, close_t)
+        duration = datetime.timedelta(minutes=duration_mins)
+        step = slot_interval()
+        intervals = self.working_intervals(staff_id, day)
+        mask, bit, j = 0, 0, 0
+        while cur + duration <= closing:
+            while j < len(intervals) and intervals[j][1] < cur + duration:
+                j += 1
+            if j < len(intervals) and intervals[j][0] <= cur:
+                mask |= 1 << bit
+            bit += 1
+            cur += step
+        return mask
+
+    def day_masks(self, day, duration_mins, staff_ids):
+        # {staff_id: bitmask}; compiled once per (day, duration, staff) and reused
+        with self._lock:
+            if len(self._masks) > 20000:
+                self._masks.clear()
+            out = {}
+            for staff_id in staff_ids:
+                key = (day, duration_mins, staff_id)
+                mask = self._masks.get(key)
+                if mask is None:
+                    mask = self._masks[key] = self._compile(day, duration_mins, staff_id)
+                out[staff_id] = mask
+            return out
+
+
+class RosterStore:
+    # process-wide Roster, reloaded after invalidate() or once it is older than
+    # SCHEDULE_INDEX_TTL seconds (roster edits made in other worker processes)
+
+    def __init__(self):
+        self._roster = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            ttl = _config('SCHEDULE_INDEX_TTL', 30)
+            if self._roster is None or time.monotonic() - self._loaded_at >= ttl:
+                self._roster = Roster(
+                    db.session.query(StaffShift).all(),
+                    db.session.query(StaffBreak).all(),
+                    db.session.query(Holiday).all(),
+                )
+                self._loaded_at = time.monotonic()
+            return self._roster
+
+    def invalidate(self):
+        with self._lock:
+            self._roster = None
+
+
+roster_store = RosterStore()
@@ -0,0 +1,130 @@
+from scheduling.occupancy import load_occupancy, travel_buffer
+from scheduling.roster import roster_store, salon_hours, slot_interval
+import datetime
+
+
+def merge_intervals(intervals):
+    # collapse (start, end) pairs into sorted, non-overlapping busy blocks
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def load_busy_intervals(staff_ids, window_start, window_end):
+    # appointments and home bookings (with travel buffers) of the given staff, grouped per staff
+    busy = {sid: [] for sid in staff_ids}
+    for occ in load_occupancy(window_start, window_end, staff_ids):
+        busy[occ.staff_id].append((occ.start, occ.end))
+    return busy
+
+
+def working_hours(day):
+    # salon opening hours (WORK_START/WORK_END) as datetimes on day
+    open_t, close_t = salon_hours()
+    return datetime.datetime.combine(day, open_t), datetime.datetime.combine(day, close_t)
+
+
+def busy_blocks(staff_ids, busy):
+    return {sid: merge_intervals(busy.get(sid, ())) for sid in staff_ids}
+
+
+def sweep_day(day, duration_mins, staff_ids, blocks, cursors, masks, pad=datetime.timedelta(0)):
+    # Yield (start, end, free_staff_ids) for every slot of the day, in order.
+    # masks holds each staff member's compiled roster bitmask for the day (see
+    # scheduling.roster); a staff member is free when the slot's bit is set and
+    # no busy block overlaps. Each staff keeps a cursor into its merged busy
+    # blocks so every block is visited once instead of once per slot; cursors
+    # may be carried over to the following day. pad widens each slot on both
+    # sides (travel time for home visits).
+    start_dt, end_dt = working_hours(day)
+    duration = datetime.timedelta(minutes=duration_mins)
+    step = slot_interval()
+
+    cur = start_dt
+    bit = 0
+    while cur + duration <= end_dt:
+        slot_end = cur + duration
+        free_staff_ids = []
+        for sid in staff_ids:
+            staff_blocks = blocks[sid]
+            i = cursors[sid]
+            # blocks ending before this slot can never overlap a later one
+            while i < len(staff_blocks) and staff_blocks[i][1] <= cur - pad:
+                i += 1
+            cursors[sid] = i
+            if not (masks[sid] >> bit) & 1:
+                continue
+            if i == len(staff_blocks) or staff_blocks[i][0] >= slot_end + pad:
+                free_staff_ids.append(sid)
+        yield cur, slot_end, free_staff_ids
+        cur += step
+        bit += 1
+
+
+def compute_slots(day, duration_mins, staff_ids, busy, pad=datetime.timedelta(0)):
+    blocks = busy_blocks(staff_ids, busy)
+    cursors = dict.fromkeys(staff_ids, 0)
+    masks = roster_store.get().day_masks(day, duration_mins, staff_ids)
+    slots = []
+    for start, end, free_staff_ids in sweep_day(day, duration_mins, staff_ids, blocks, cursors, masks, pad):
+        if free_staff_ids:
+            slots.append({'start': start.isoformat(), 'end': end.isoformat(), 'available_staff': free_staff_ids})
+    return slots
+
+
+def available_slots_for_day(day, duration_mins, staff_ids, home=False):
+    pad = travel_buffer() if home else datetime.timedelta(0)
+    start_dt, end_dt = working_hours(day)
+    busy = load_busy_intervals(staff_ids, start_dt - pad, end_dt + pad)
+    return compute_slots(day, duration_mins, staff_ids, busy, pad)
+
+
+def slot_grid_for_day(day, duration_mins, staff_ids, home=False):
+    # every slot of the day, free or not, in a JSON-friendly form for caching
+    pad = travel_buffer() if home else datetime.timedelta(0)
+    start_dt, end_dt = working_hours(day)
+    blocks = busy_blocks(staff_ids, load_busy_intervals(staff_ids, start_dt - pad, end_dt + pad))
+    cursors = dict.fromkeys(staff_ids, 0)
+    masks = roster_store.get().day_masks(day, duration_mins, staff_ids)
+    slots = [[start.isoformat(), end.isoformat(), free_staff_ids]
+             for start, end, free_staff_ids in sweep_day(day, duration_mins, staff_ids, blocks, cursors, masks, pad)]
+    return {'staff_ids': list(staff_ids), 'slots': slots}
+
+
+def availability_range(first_day, last_day, duration_mins, staff_ids, home=False):
+    # Availability for every day in [first_day, last_day] from one occupancy
+    # query. Each day gets a bitmap string with one character per slot ('1'
+    # when at least one staff member is free) plus a bitmap per free staff.
+    pad = travel_buffer() if home else datetime.timedelta(0)
+    window_start = working_hours(first_day)[0] - pad
+    window_end = working_hours(last_day)[1] + pad
+    blocks = busy_blocks(staff_ids, load_busy_intervals(staff_ids, window_start, window_end))
+    cursors = dict.fromkeys(staff_ids, 0)
+    roster = roster_store.get()
+
+    slot_times = []
+    days = {}
+    day = first_day
+    while day <= last_day:
+        bitmap = []
+        staff_bits = {sid: [] for sid in staff_ids}
+        times = []
+        masks = roster.day_masks(day, duration_mins, staff_ids)
+        for start, _, free_staff_ids in sweep_day(day, duration_mins, staff_ids, blocks, cursors, masks, pad):
+            times.append(start.strftime('%H:%M'))
+            bitmap.append('1' if free_staff_ids else '0')
+            free = set(free_staff_ids)
+            for sid in staff_ids:
+                staff_bits[sid].append('1' if sid in free else '0')
+        slot_times = slot_times or times
+        days[day.isoformat()] = {
+            'bitmap': ''.join(bitmap),
+            'staff': {str(sid): ''.join(bits) for sid, bits in staff_bits.items() if '1' in bits},
+        }
+        day += datetime.timedelta(days=1)
+    return {'slot_times': slot_times, 'days': days}
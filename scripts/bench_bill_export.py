@@ -0,0 +1,121 @@
+"""
+Memory benchmark for the streamed bill export (GET /bills/export).
+
+Seeds bills with a few lines and a payment each, then streams the CSV ledger
+and the ZIP (ledger plus one PDF per bill) for growing numbers of bills,
+reporting time, output size and peak Python memory (tracemalloc) while
+consuming the response. Output is streamed, so the peak should barely move
+with the bill count: the CSV keeps one chunk of bills, the ZIP additionally
+its central directory (zipfile's ZipInfo per entry, a few hundred bytes).
+Exits 1 if the peak grows by more than 1 KiB per extra bill between the
+smallest and largest export, or if the ZIP does not list every bill. The
+smallest export spans two EXPORT_CHUNKs; the largest must be at least twice
+that.
+
+Runs against SQLALCHEMY_DATABASE_URI when set, otherwise a throwaway SQLite file:
+
+    python -m scripts.bench_bill_export [largest bill count]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+import zipfile
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'export.db')
+os.environ.setdefault('BILL_PDF_DIR', tempfile.mkdtemp())
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from app import app
+from extensions import db
+from models import Users, Customer, Bill, BillDetail, Payment
+
+LARGEST = int(sys.argv[1]) if len(sys.argv) > 1 else 4000
+LINES = 3
+# the smallest export spans two cursor batches, so every run pays for a full one
+SMALLEST = 2 * app.config['EXPORT_CHUNK']
+NOON = datetime.datetime.combine(datetime.date.today(), datetime.time(12))
+OUTSIDE = datetime.datetime(2000, 1, 1, 12)
+
+
+def setup():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        admin = Users(name='Export Admin', email=f'export_{tag}@example.com', role='admin')
+        admin.password_hash = 'x'
+        db.session.add(admin)
+        db.session.flush()
+        c = Customer(user_id=admin.id)
+        db.session.add(c)
+        db.session.flush()
+        db.session.execute(insert(Bill), [{'customer_id': c.id, 'total_amount': '30.00', 'tax_amount': '0.00',
+                                           'discount_amount': '0.00', 'status': 'paid'} for _ in range(LARGEST)])
+        ids = [b for b, in db.session.query(Bill.id).filter(Bill.customer_id == c.id).order_by(Bill.id)]
+        db.session.execute(insert(BillDetail), [
+            {'bill_id': b, 'description': f'service {n}', 'quantity': 1, 'unit_price': '10.00', 'amount': '10.00'}
+            for b in ids for n in range(LINES)])
+        db.session.execute(insert(Payment), [{'bill_id': b, 'amount': '30.00', 'method': 'cash', 'status': 'completed'}
+                                             for b in ids])
+        db.session.commit()
+        token = create_access_token(identity=str(admin.id), additional_claims={'role': 'admin'})
+        return {'Authorization': f'Bearer {token}'}, ids
+
+
+def stream(client, headers, url, keep=False):
+    # (seconds, bytes, peak traced bytes, body if keep); the body goes to a
+    # temporary file so keeping it does not count towards the peak
+    body = tempfile.TemporaryFile() if keep else None
+    size = 0
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    r = client.get(url, headers=headers)
+    assert r.status_code == 200, (url, r.status_code)
+    for chunk in r.response:
+        size += len(chunk)
+        if keep:
+            body.write(chunk)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    r.close()
+    return elapsed, size, peak, body
+
+
+if __name__ == '__main__':
+    if LARGEST < 2 * SMALLEST:
+        raise SystemExit(f'largest bill count must be at least {2 * SMALLEST}')
+    headers, ids = setup()
+    client = app.test_client()
+    today = NOON.date().isoformat()
+    failed = False
+    for fmt in ('csv', 'zip'):
+        peaks = []
+        for count in (SMALLEST, (SMALLEST + LARGEST) // 2, LARGEST):
+            # limit the range to the first `count` bills by moving the rest out of it
+            with app.app_context():
+                db.session.query(Bill).filter(Bill.id.in_(ids)).update({Bill.created_at: NOON})
+                db.session.query(Bill).filter(Bill.id.in_(ids[count:])).update({Bill.created_at: OUTSIDE})
+                db.session.commit()
+            url = f'/bills/export?from={today}&to={today}&format={fmt}'
+            if fmt == 'zip':
+                stream(client, headers, url)  # render the PDFs once; later runs read them from disk
+            elapsed, size, peak, body = stream(client, headers, url, keep=fmt == 'zip' and count == LARGEST)
+            peaks.append(peak)
+            print(f'{fmt} {count:6} bills: {elapsed:6.2f}s, {size / 1024:8.0f} KiB out, peak {peak / 1024:6.0f} KiB')
+            if body is not None:
+                names = zipfile.ZipFile(body).namelist()
+                if len(names) != count + 1 or names[0] != 'ledger.csv':
+                    print(f'FAIL zip lists {len(names)} entries for {count} bills')
+                    failed = True
+        per_bill = (peaks[-1] - peaks[0]) / (LARGEST - SMALLEST)
+        print(f'{fmt} peak growth: {per_bill:.0f} bytes per bill')
+        if per_bill > 1024:
+            print(f'FAIL {fmt}: peak memory grows with the number of bills')
+            failed = True
+    if failed:
+        raise SystemExit(1)
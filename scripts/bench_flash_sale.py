@@ -0,0 +1,140 @@
+"""
+Flash-sale contention benchmark for checkout stock reservation.
+
+A few products each have limited stock spread over several Stock rows
+(suppliers). Many customers with their own carts hit POST /orders at the
+same moment. Reports throughput and latency, then checks that nothing was
+oversold: units sold must equal the units taken from stock, no Stock row may
+go negative, every rejected checkout must have left stock untouched, and the
+stock summary must agree with the rows.
+
+Runs against SQLALCHEMY_DATABASE_URI when set (point it at a scratch MySQL
+database to exercise row-level contention), otherwise a throwaway SQLite file:
+
+    python -m scripts.bench_flash_sale [checkouts] [threads]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'flash.db')
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import func
+from app import app
+from extensions import db
+from models import Users, Customer, Product, Supplier, Stock, StockSummary, Cart, CartItem, Order, OrderItem
+
+CHECKOUTS = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+PRODUCTS = 3
+SUPPLIERS = 4
+UNITS_PER_ROW = 25   # 100 units per product, far fewer than requested
+
+
+def setup():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        products = [Product(name=f'Flash {tag} {i}', price='9.99') for i in range(PRODUCTS)]
+        suppliers = [Supplier(name=f'Flash Supplier {tag} {i}') for i in range(SUPPLIERS)]
+        db.session.add_all(products + suppliers)
+        db.session.flush()
+        for p in products:
+            for s in suppliers:
+                db.session.add(Stock(product_id=p.id, supplier_id=s.id, quantity=UNITS_PER_ROW))
+        jobs = []
+        for n in range(CHECKOUTS):
+            u = Users(name=f'Flash Customer {n}', email=f'flash_{tag}_{n}@example.com', role='user')
+            u.password_hash = 'x'
+            db.session.add(u)
+            db.session.flush()
+            c = Customer(user_id=u.id)
+            db.session.add(c)
+            db.session.flush()
+            cart = Cart(customer_id=c.id)
+            db.session.add(cart)
+            db.session.flush()
+            # every cart wants 1-3 units of one or two of the products
+            for k in range(1 + n % 2):
+                db.session.add(CartItem(cart_id=cart.id, product_id=products[(n + k) % PRODUCTS].id, quantity=1 + n % 3))
+            token = create_access_token(identity=str(u.id), additional_claims={'role': 'user'})
+            jobs.append(({'Authorization': f'Bearer {token}'}, c.id, cart.id))
+        db.session.commit()
+        return [p.id for p in products], jobs
+
+
+def fire(jobs):
+    barrier = threading.Barrier(THREADS)
+    queue = iter(jobs)
+    lock = threading.Lock()
+    statuses, latencies, errors = {}, [], []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        while True:
+            with lock:
+                job = next(queue, None)
+            if job is None:
+                return
+            headers, customer_id, cart_id = job
+            t0 = time.perf_counter()
+            try:
+                r = client.post('/orders', headers=headers, json={'customer_id': customer_id, 'cart_id': cart_id})
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses, latencies, errors, time.perf_counter() - t0
+
+
+def check(product_ids):
+    with app.app_context():
+        problems = []
+        for pid in product_ids:
+            left = db.session.query(func.coalesce(func.sum(Stock.quantity), 0)).filter(Stock.product_id == pid).scalar()
+            sold = db.session.query(func.coalesce(func.sum(OrderItem.quantity), 0)).filter(OrderItem.product_id == pid).scalar()
+            negative = Stock.query.filter(Stock.product_id == pid, Stock.quantity < 0).count()
+            print(f'  product {pid}: sold {sold}, left {left}, stocked {SUPPLIERS * UNITS_PER_ROW}')
+            if sold + left != SUPPLIERS * UNITS_PER_ROW:
+                problems.append(f'product {pid}: sold {sold} + left {left} != {SUPPLIERS * UNITS_PER_ROW}')
+            if negative:
+                problems.append(f'product {pid}: {negative} stock rows below zero')
+            summary = db.session.get(StockSummary, pid)
+            if summary is None or (summary.on_hand, summary.reserved) != (left, sold):
+                problems.append(f'product {pid}: stock summary {summary and summary.to_dict()} disagrees')
+        print('  orders written:', Order.query.count())
+        return problems
+
+
+if __name__ == '__main__':
+    product_ids, jobs = setup()
+    statuses, latencies, errors, elapsed = fire(jobs)
+    latencies.sort()
+    print(f'{len(jobs)} checkouts on {THREADS} threads in {elapsed:.2f}s ({len(jobs) / elapsed:.0f}/s)')
+    print('responses:', statuses)
+    if latencies:
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        print(f'latency p50 {pct(0.5):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms')
+    if errors:
+        print('request errors:', len(errors), errors[:3])
+    problems = check(product_ids)
+    if problems or errors:
+        print('OVERSOLD' if problems else 'ERRORS')
+        for p in problems:
+            print('  ', p)
+        raise SystemExit(1)
+    print('no overselling')
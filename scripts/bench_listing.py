@@ -0,0 +1,100 @@
+"""
+Benchmark for the keyset-paginated collection endpoints.
+
+Seeds ROWS products and users, then times GET /products and GET /api/users
+page by page: the first page, a page reached by walking cursors deep into the
+table, and the same depth reached with OFFSET for comparison. With keyset
+pagination the page latency should stay flat however deep the page is.
+
+Runs against SQLALCHEMY_DATABASE_URI when set, otherwise a throwaway SQLite file:
+
+    python -m scripts.bench_listing [rows] [page_size]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from flask_jwt_extended import create_access_token
+from app import app
+from extensions import db
+from models import Users, Product
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+PAGE = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+BATCH = 5000
+
+
+def seed():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        for start in range(0, ROWS, BATCH):
+            n = range(start, min(start + BATCH, ROWS))
+            db.session.execute(Product.__table__.insert(), [
+                {'name': f'Bench Product {i:06d}', 'sku': f'{tag}-{i}', 'price': i % 1000, 'is_active': True} for i in n
+            ])
+            db.session.execute(Users.__table__.insert(), [
+                {'name': f'Bench User {i:06d}', 'email': f'bench_{tag}_{i}@example.com', 'password_hash': 'x', 'role': 'user'} for i in n
+            ])
+        db.session.commit()
+        admin = Users(name='Bench Admin', email=f'bench_admin_{tag}@example.com', role='admin')
+        admin.set_password('x')
+        db.session.add(admin)
+        db.session.commit()
+        token = create_access_token(identity=str(admin.id), additional_claims={'role': 'admin'})
+        return {'Authorization': f'Bearer {token}'}
+
+
+def timed(client, url, headers):
+    t0 = time.perf_counter()
+    r = client.get(url, headers=headers)
+    elapsed = (time.perf_counter() - t0) * 1000
+    assert r.status_code == 200, (url, r.status_code, r.get_data(as_text=True)[:200])
+    return elapsed, r.get_json()
+
+
+def bench(client, path, headers, sort=''):
+    checkpoints = {0, 10, 100, 1000, ROWS // PAGE // 2, ROWS // PAGE - 1}
+    results = []
+    cursor = None
+    page = 0
+    while True:
+        url = f'{path}?limit={PAGE}{sort}' + (f'&cursor={cursor}' if cursor else '')
+        ms, data = timed(client, url, headers)
+        if page in checkpoints:
+            results.append((page, ms))
+        cursor = data['next_cursor']
+        page += 1
+        if not cursor or page > max(checkpoints):
+            break
+    print(f'{path}{" " + sort.lstrip("&") if sort else ""}: keyset page latency')
+    for page, ms in results:
+        print(f'  page {page:>6} (row {page * PAGE:>7}): {ms:7.2f} ms')
+    return results
+
+
+def bench_offset(path, columns):
+    # the same page depths read with LIMIT/OFFSET, which rescans every skipped row
+    with app.app_context():
+        model = Product if path == '/products' else Users
+        print(f'{path}: OFFSET page latency (for comparison)')
+        for page in (0, 100, 1000, ROWS // PAGE - 1):
+            t0 = time.perf_counter()
+            db.session.query(*columns).order_by(model.name, model.id).offset(page * PAGE).limit(PAGE).all()
+            print(f'  page {page:>6} (row {page * PAGE:>7}): {(time.perf_counter() - t0) * 1000:7.2f} ms')
+
+
+if __name__ == '__main__':
+    t0 = time.perf_counter()
+    headers = seed()
+    print(f'seeded {ROWS} products and users in {time.perf_counter() - t0:.1f}s')
+    client = app.test_client()
+    bench(client, '/products', headers)
+    bench(client, '/products', headers, sort='&sort=name&fields=id,name,price')
+    bench(client, '/api/users', headers, sort='&sort=name')
+    bench_offset('/products', (Product.id, Product.name, Product.price))
+    bench_offset('/api/users', (Users.id, Users.name, Users.email))
@@ -0,0 +1,145 @@
+"""
+Serialization benchmark for the large list endpoints (/bills with details,
+/orders with items).
+
+Seeds N bills and N orders with several lines each, then times building the
+JSON body four ways: ORM instances + to_dict() against column projection
+(serialization.rows), each with the stdlib and the orjson encoder
+(serialization.provider). Checks that every path produces the same JSON, then
+times the endpoints end to end with each encoder.
+
+Runs against SQLALCHEMY_DATABASE_URI when set, otherwise a throwaway SQLite file:
+
+    python -m scripts.bench_serialization [rows] [lines per row]
+"""
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'serialize.db')
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+from sqlalchemy.orm import selectinload
+from app import app
+from extensions import db
+from models import Users, Customer, Product, Bill, BillDetail, Order, OrderItem
+from serialization.provider import orjson
+from serialization.rows import attach_children, columns, row_dicts
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+LINES = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+REPEAT = 5
+
+
+def setup():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        admin = Users(name='Bench Admin', email=f'ser_admin_{tag}@example.com', role='admin')
+        admin.password_hash = 'x'
+        db.session.add(admin)
+        db.session.flush()
+        c = Customer(user_id=admin.id)
+        p = Product(name=f'Serialize {tag}', price='12.50')
+        db.session.add_all([c, p])
+        db.session.flush()
+        db.session.execute(insert(Bill), [{'customer_id': c.id, 'total_amount': '49.96', 'tax_amount': '2.38',
+                                           'discount_amount': '0.00', 'status': 'unpaid'} for _ in range(ROWS)])
+        db.session.execute(insert(Order), [{'customer_id': c.id, 'total_amount': '49.96', 'status': 'pending'}
+                                           for _ in range(ROWS)])
+        bill_ids = [b for b, in db.session.query(Bill.id).filter(Bill.customer_id == c.id)]
+        order_ids = [o for o, in db.session.query(Order.id).filter(Order.customer_id == c.id)]
+        db.session.execute(insert(BillDetail), [
+            {'bill_id': b, 'product_id': p.id, 'description': f'line {n}', 'quantity': 1,
+             'unit_price': '12.49', 'amount': '12.49'} for b in bill_ids for n in range(LINES)])
+        db.session.execute(insert(OrderItem), [
+            {'order_id': o, 'product_id': p.id, 'quantity': 1, 'unit_price': '12.49'}
+            for o in order_ids for _ in range(LINES)])
+        db.session.commit()
+        token = create_access_token(identity=str(admin.id), additional_claims={'role': 'admin'})
+        return c.id, {'Authorization': f'Bearer {token}'}
+
+
+def orm_bills(customer_id):
+    bills = Bill.query.options(selectinload(Bill.details)).filter(Bill.customer_id == customer_id).order_by(Bill.id).all()
+    return [b.to_dict() for b in bills]
+
+
+def projected_bills(customer_id):
+    rows = db.session.query(*columns(Bill)).filter(Bill.customer_id == customer_id).order_by(Bill.id).all()
+    return attach_children(row_dicts(rows), columns(BillDetail), BillDetail.bill_id, 'details')
+
+
+def orm_orders(customer_id):
+    orders = Order.query.options(selectinload(Order.items)).filter(Order.customer_id == customer_id).order_by(Order.id).all()
+    return [o.to_dict() for o in orders]
+
+
+def projected_orders(customer_id):
+    rows = db.session.query(*columns(Order)).filter(Order.customer_id == customer_id).order_by(Order.id).all()
+    return attach_children(row_dicts(rows), columns(OrderItem), OrderItem.order_id, 'items')
+
+
+def timed(fn):
+    # best of REPEAT runs, in ms, with a fresh session each time
+    best, result = None, None
+    for _ in range(REPEAT):
+        db.session.remove()
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - t0) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def compare(customer_id):
+    failed = False
+    with app.app_context():
+        for name, orm_fn, projected_fn in (('bills', orm_bills, projected_bills),
+                                           ('orders', orm_orders, projected_orders)):
+            bodies = {}
+            for path, build in (('orm + to_dict', orm_fn), ('projection', projected_fn)):
+                for encoder in ('stdlib', 'orjson'):
+                    if encoder == 'orjson' and orjson is None:
+                        continue
+                    app.json.fast = encoder == 'orjson'
+                    ms, body = timed(lambda: app.json.dumps_bytes(build(customer_id)))
+                    bodies[(path, encoder)] = body
+                    print(f'  {name:6} {path:14} {encoder:6} {ms:8.1f} ms  ({len(body) // 1024} KiB)')
+            parsed = {key: app.json.loads(body) for key, body in bodies.items()}
+            first = next(iter(parsed.values()))
+            if any(p != first for p in parsed.values()):
+                print(f'FAIL {name}: paths disagree')
+                failed = True
+    return failed
+
+
+def endpoints(headers):
+    client = app.test_client()
+    for url in ('/bills', '/orders'):
+        for encoder in ('stdlib', 'orjson'):
+            if encoder == 'orjson' and orjson is None:
+                continue
+            app.json.fast = encoder == 'orjson'
+            best = None
+            for _ in range(REPEAT):
+                t0 = time.perf_counter()
+                r = client.get(url, headers=headers)
+                elapsed = (time.perf_counter() - t0) * 1000
+                assert r.status_code == 200, (url, r.status_code)
+                best = elapsed if best is None else min(best, elapsed)
+            print(f'  GET {url:8} {encoder:6} {best:8.1f} ms')
+
+
+if __name__ == '__main__':
+    customer_id, headers = setup()
+    print(f'{ROWS} bills and {ROWS} orders with {LINES} lines each (best of {REPEAT})')
+    if orjson is None:
+        print('orjson is not installed; timing the stdlib encoder only')
+    failed = compare(customer_id)
+    endpoints(headers)
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,107 @@
+"""
+Query-count check for the listing endpoints that decorate rows with customer
+names (orders, complaints, a staff member's deliveries).
+
+Seeds N customers each with an order, a complaint and a delivery, calls each
+endpoint and asserts the number of SQL statements it ran does not depend on
+N. Exits 1 on the first endpoint that regresses to per-row lookups.
+
+Runs against SQLALCHEMY_DATABASE_URI when set, otherwise a throwaway SQLite file:
+
+    python -m scripts.check_query_counts [rows]
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'queries.db')
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import app
+from extensions import db
+from models import Users, Customer, Staff, Order, Complaint, Delivery
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+# endpoint -> maximum statements per request, whatever the number of rows
+BUDGETS = {
+    '/orders': 4,                # orders, order items, customers, users
+    '/orders?limit=20': 4,
+    '/complaints': 3,            # complaints, customers, users
+    '/complaints?limit=20': 3,
+    '/deliveries/my': 6,         # staff, deliveries, orders, order items, customers, users
+}
+
+
+def headers(user_id, role):
+    token = create_access_token(identity=str(user_id), additional_claims={'role': role})
+    return {'Authorization': f'Bearer {token}'}
+
+
+def setup():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        admin = Users(name='Query Admin', email=f'q_admin_{tag}@example.com', role='admin')
+        staff_user = Users(name='Query Staff', email=f'q_staff_{tag}@example.com', role='staff')
+        for u in (admin, staff_user):
+            u.set_password('x')
+            db.session.add(u)
+        db.session.flush()
+        staff = Staff(user_id=staff_user.id)
+        db.session.add(staff)
+        db.session.flush()
+        for i in range(ROWS):
+            u = Users(name=f'Query Customer {i}', email=f'q_customer_{tag}_{i}@example.com', role='user')
+            u.set_password('x')
+            db.session.add(u)
+            db.session.flush()
+            c = Customer(user_id=u.id)
+            db.session.add(c)
+            db.session.flush()
+            o = Order(customer_id=c.id, total_amount=i)
+            db.session.add(o)
+            db.session.add(Complaint(customer_id=c.id, subject=f'complaint {i}'))
+            db.session.flush()
+            db.session.add(Delivery(order_id=o.id, delivery_staff_id=staff.id, status='dispatched'))
+        db.session.commit()
+        return {
+            'admin': headers(admin.id, 'admin'),
+            'staff': headers(staff_user.id, 'staff'),
+        }
+
+
+def count_queries(client, url, hdrs):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        r = client.get(url, headers=hdrs)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    assert r.status_code == 200, (url, r.status_code)
+    body = r.get_json()
+    rows = body if isinstance(body, list) else next(v for v in body.values() if isinstance(v, list))
+    return len(statements), rows
+
+
+if __name__ == '__main__':
+    auth = setup()
+    client = app.test_client()
+    failed = False
+    for url, budget in BUDGETS.items():
+        hdrs = auth['staff'] if url.startswith('/deliveries') else auth['admin']
+        n, rows = count_queries(client, url, hdrs)
+        named = sum(1 for r in rows if r.get('customer_name') or (r.get('customer') or {}).get('name'))
+        ok = n <= budget and named == len(rows)
+        failed |= not ok
+        print(f'{"ok  " if ok else "FAIL"} {url}: {len(rows)} rows, {named} with customer name, {n} queries (budget {budget})')
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,146 @@
+"""
+Local stand-in for Razorpay, to load-test the payment webhook
+(POST /webhook/razorpay) without the real service.
+
+Seeds bills with one payment each, stored as /payments/create_order stores
+it (a Razorpay order id, here a made-up one). Then plays Razorpay: builds a
+payment.captured event per payment, signed with RAZORPAY_WEBHOOK_SECRET and
+carrying an X-Razorpay-Event-Id, and delivers them from several threads,
+redelivering a share of them as Razorpay does when it gets no timely 200.
+Reports acknowledgement latency, how many deliveries were stored and how long
+the webhook worker took to apply them. Exits 1 unless every event was stored
+exactly once and every payment ended completed with its Razorpay payment id.
+
+Runs against SQLALCHEMY_DATABASE_URI when set, otherwise a throwaway SQLite file:
+
+    python -m scripts.razorpay_standin [payments] [threads] [redelivered share]
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'webhooks.db')
+os.environ.setdefault('RAZORPAY_WEBHOOK_SECRET', 'standin_secret')
+os.environ.setdefault('WEBHOOK_POLL_INTERVAL', '0.5')
+
+from sqlalchemy import func, insert
+from app import app
+from extensions import db
+from models import Users, Customer, Bill, Payment, WebhookEvent
+
+PAYMENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+REDELIVERED = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+SECRET = os.environ['RAZORPAY_WEBHOOK_SECRET']
+APPLY_TIMEOUT = 120
+
+
+def setup():
+    # {order id: payment id Razorpay will report} for PAYMENTS fresh payments
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        user = Users(name='Standin Customer', email=f'standin_{tag}@example.com', role='user')
+        user.password_hash = 'x'
+        db.session.add(user)
+        db.session.flush()
+        c = Customer(user_id=user.id)
+        db.session.add(c)
+        db.session.flush()
+        db.session.execute(insert(Bill), [{'customer_id': c.id, 'total_amount': '100.00', 'status': 'unpaid'}
+                                          for _ in range(PAYMENTS)])
+        bill_ids = [b for b, in db.session.query(Bill.id).filter(Bill.customer_id == c.id).order_by(Bill.id)]
+        orders = {f'order_{tag}{n:06d}': f'pay_{tag}{n:06d}' for n in range(PAYMENTS)}
+        db.session.execute(insert(Payment), [
+            {'bill_id': b, 'amount': '100.00', 'method': 'razorpay', 'provider': 'razorpay',
+             'provider_payment_id': order_id, 'status': 'created'}
+            for b, order_id in zip(bill_ids, orders)])
+        db.session.commit()
+        return orders
+
+
+def captured_event(order_id, payment_id):
+    # (event id, body) of a payment.captured event as Razorpay sends it
+    body = {
+        'entity': 'event', 'account_id': 'acc_standin', 'event': 'payment.captured',
+        'contains': ['payment'], 'created_at': int(time.time()),
+        'payload': {'payment': {'entity': {
+            'id': payment_id, 'entity': 'payment', 'amount': 10000, 'currency': 'INR',
+            'status': 'captured', 'order_id': order_id, 'method': 'upi', 'captured': True,
+        }}},
+    }
+    return 'evt_' + payment_id[4:], json.dumps(body).encode()
+
+
+def deliver(deliveries, latencies, statuses):
+    client = app.test_client()
+    for event_key, body in deliveries:
+        signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+        t0 = time.perf_counter()
+        r = client.post('/webhook/razorpay', data=body, content_type='application/json',
+                        headers={'X-Razorpay-Signature': signature, 'X-Razorpay-Event-Id': event_key})
+        latencies.append(time.perf_counter() - t0)
+        statuses.append(r.status_code)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def counts(prefix):
+    with app.app_context():
+        stored = dict(db.session.query(WebhookEvent.status, func.count())
+                      .filter(WebhookEvent.event_id.like(f'evt_{prefix}%')).group_by(WebhookEvent.status).all())
+        db.session.remove()
+        return stored
+
+
+if __name__ == '__main__':
+    orders = setup()
+    events = [captured_event(order_id, payment_id) for order_id, payment_id in orders.items()]
+    deliveries = events + random.sample(events, int(len(events) * REDELIVERED))
+    random.shuffle(deliveries)
+    prefix = next(iter(orders.values()))[4:12]
+    latencies, statuses = [], []
+    threads = [threading.Thread(target=deliver, args=(deliveries[n::THREADS], latencies, statuses))
+               for n in range(THREADS)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    sent = time.perf_counter() - t0
+    print(f'{len(deliveries)} deliveries ({len(events)} events) from {THREADS} threads in {sent:.2f}s, '
+          f'{len(deliveries) / sent:.0f}/s')
+    print(f'acknowledged in p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+          f'p95 {percentile(latencies, 0.95) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms')
+    failed = False
+    if any(s != 200 for s in statuses):
+        print(f'FAIL {sum(s != 200 for s in statuses)} deliveries were not acknowledged with 200')
+        failed = True
+    while True:
+        stored = counts(prefix)
+        if stored.get('processed', 0) + stored.get('failed', 0) >= sum(stored.values()) or \
+                time.perf_counter() - t0 > APPLY_TIMEOUT:
+            break
+        time.sleep(0.2)
+    print(f'stored {sum(stored.values())} events {stored}; all applied {time.perf_counter() - t0:.2f}s after the first delivery')
+    if sum(stored.values()) != len(events) or stored.get('processed', 0) != len(events):
+        print(f'FAIL expected {len(events)} events stored once and processed')
+        failed = True
+    with app.app_context():
+        done = db.session.query(func.count()).select_from(Payment) \
+            .filter(Payment.provider_payment_id.in_(list(orders.values())), Payment.status == 'completed').scalar()
+    if done != len(orders):
+        print(f'FAIL {done} of {len(orders)} payments completed')
+        failed = True
+    if failed:
+        raise SystemExit(1)
@@ -0,0 +1,124 @@
+"""
+Concurrency stress test for appointment/booking reservation.
+
+Fires hundreds of simultaneous POST /api/appointments and /api/bookings
+requests for a handful of overlapping time slots and fails if any staff
+member ends up holding two overlapping reservations.
+
+Runs against SQLALCHEMY_DATABASE_URI when set (point it at a scratch MySQL
+database to exercise SELECT ... FOR UPDATE), otherwise a throwaway SQLite file:
+
+    python -m scripts.stress_reservations [requests] [threads]
+"""
+import os
+import sys
+import tempfile
+import threading
+import uuid
+
+if not os.getenv('SQLALCHEMY_DATABASE_URI'):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+
+from flask_jwt_extended import create_access_token
+from app import app
+from extensions import db
+from models import Users, Customer, Staff, Service, Appointment, Booking
+from scheduling.occupancy import ACTIVE_STATUSES, occupied_interval
+
+REQUESTS = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+THREADS = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+STAFF = 8
+DATE = '2030-01-15'
+TIMES = ['10:00', '10:30', '11:00', '14:00']
+
+
+def setup():
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        for i in range(STAFF):
+            u = Users(name=f'Stress Staff {i}', email=f'stress_staff_{tag}_{i}@example.com', role='staff')
+            u.set_password('x')
+            db.session.add(u)
+            db.session.flush()
+            db.session.add(Staff(user_id=u.id, is_active=True, is_available=True))
+        cu = Users(name='Stress Customer', email=f'stress_customer_{tag}@example.com', role='user')
+        cu.set_password('x')
+        db.session.add(cu)
+        db.session.flush()
+        db.session.add(Customer(user_id=cu.id))
+        svc = Service(name=f'Stress Service {tag}', price=100, duration_mins=60)
+        db.session.add(svc)
+        db.session.commit()
+        token = create_access_token(identity=str(cu.id), additional_claims={'role': 'user'})
+        return {'Authorization': f'Bearer {token}'}, svc.id
+
+
+def fire(headers, service_id):
+    barrier = threading.Barrier(THREADS)
+    counter = iter(range(REQUESTS))
+    counter_lock = threading.Lock()
+    statuses = {}
+    errors = []
+
+    def worker():
+        client = app.test_client()
+        barrier.wait()
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            time = TIMES[n % len(TIMES)]
+            try:
+                if n % 3 == 2:
+                    r = client.post('/api/bookings', headers=headers,
+                                    json={'service_id': service_id, 'date': DATE, 'time': time, 'address': 'stress test'})
+                else:
+                    r = client.post('/api/appointments', headers=headers,
+                                    json={'service_id': service_id, 'date': DATE, 'time': time})
+                with counter_lock:
+                    statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+            except Exception as e:
+                errors.append(repr(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return statuses, errors
+
+
+def double_bookings(service_id):
+    with app.app_context():
+        rows = []
+        for model, kind in ((Appointment, 'appointment'), (Booking, 'booking')):
+            for r in model.query.filter(model.service_id == service_id, model.staff_id.isnot(None),
+                                        model.status.in_(ACTIVE_STATUSES)).all():
+                start, end = occupied_interval(kind, r.start_datetime, r.end_datetime)
+                rows.append((r.staff_id, start, end, kind, r.id))
+        rows.sort()
+        clashes = []
+        latest = None  # reservation with the latest end so far for the current staff member
+        for row in rows:
+            if latest and latest[0] == row[0] and row[1] < latest[2]:
+                clashes.append((latest, row))
+            if not latest or latest[0] != row[0] or row[2] > latest[2]:
+                latest = row
+        return len(rows), clashes
+
+
+if __name__ == '__main__':
+    headers, service_id = setup()
+    statuses, errors = fire(headers, service_id)
+    assigned, clashes = double_bookings(service_id)
+    print('responses:', statuses)
+    print('assigned reservations:', assigned)
+    if errors:
+        print('request errors:', len(errors), errors[:3])
+    if clashes:
+        print('DOUBLE BOOKINGS:', len(clashes))
+        for a, b in clashes[:10]:
+            print('  ', a, b)
+        raise SystemExit(1)
+    print('no double bookings')
@@ -0,0 +1,76 @@
+from flask.json.provider import DefaultJSONProvider
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+
+# optional imports
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+
+def _default(obj):
+    # what neither encoder handles itself: Decimal as a number and dates in
+    # ISO 8601, as the models' to_dict() already produce them
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, tuple):
+        # named tuples and SQLAlchemy rows
+        return list(obj)
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # app.json / jsonify() backed by orjson when it is installed and the
+    # standard library otherwise. Decimal, date and datetime values are
+    # encoded directly, so rows can be serialized without converting every
+    # field in Python first. JSON_ENCODER='stdlib' forces the fallback.
+
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.fast = orjson is not None and app.config.get('JSON_ENCODER', 'auto') != 'stdlib'
+
+    def _orjson_options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj, indent=False):
+        if self.fast:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options(indent))
+        return json.dumps(obj, default=_default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+                          indent=2 if indent else None, separators=None if indent else (',', ':')).encode()
+
+    def dumps(self, obj, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.dumps(obj, default=_default, option=self._orjson_options()).decode()
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if self.fast and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,39 @@
+from sqlalchemy import inspect
+from extensions import db
+
+# Column projection: response dicts built straight from result tuples of
+# plain columns, skipping ORM instances, the identity map and to_dict().
+# Decimal and datetime values are left as they are for the JSON provider
+# (serialization.provider) to encode, which gives the same JSON as to_dict().
+
+
+def columns(model, names=None):
+    # the model's mapped columns (or the named ones), labelled by attribute name
+    if names is None:
+        names = [attr.key for attr in inspect(model).column_attrs]
+    return [getattr(model, name).label(name) for name in names]
+
+
+def row_dicts(rows):
+    # [{column label: value}] for result rows
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def attach_children(parents, child_columns, parent_column, key, parent_key='id'):
+    # Load the children of every parent dict in one IN query on parent_column
+    # and put them, as dicts ordered by the first child column, in parent[key].
+    by_id = {}
+    for parent in parents:
+        parent[key] = []
+        by_id[parent[parent_key]] = parent
+    if not by_id:
+        return parents
+    rows = db.session.query(*child_columns) \
+        .filter(parent_column.in_(list(by_id))) \
+        .order_by(child_columns[0]).all()
+    for child in row_dicts(rows):
+        by_id[child[parent_column.key]][key].append(child)
+    return parents
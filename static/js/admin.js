@@ -22,7 +22,7 @@ document.addEventListener('DOMContentLoaded', async function() {
 async function loadOffersPage() {
     try {
         LoadingOverlay.show('Loading offers...');
-        const res = await apiClient.getOffers();
+        const res = await apiClient.getOffers(true);
         const offers = res.offers || [];
         const tbody = document.getElementById('offersTableBody');
         tbody.innerHTML = '';
@@ -45,15 +45,52 @@ class APIClient {
         return data;
     }
     
+    // One page of a collection endpoint. params: limit, cursor (next_cursor of
+    // the previous page), sort ('name' or '-name'), fields ('id,name') and filters.
+    // Resolves to { <collection key>: [...], next_cursor }.
+    async getPage(endpoint, params = {}, includeAuth = true) {
+        const query = new URLSearchParams({ limit: 50, ...params });
+        for (const [key, value] of [...query.entries()]) {
+            if (value === '' || value === 'null' || value === 'undefined') query.delete(key);
+        }
+        return await this.get(`${endpoint}?${query.toString()}`, includeAuth);
+    }
+
+    // Responses that came with an ETag (the catalog endpoints) are kept in
+    // sessionStorage and revalidated with If-None-Match; a 304 reuses them.
+    readCached(endpoint) {
+        try {
+            return JSON.parse(sessionStorage.getItem(`etag:${endpoint}`));
+        } catch (e) {
+            return null;
+        }
+    }
+
+    storeCached(endpoint, etag, data) {
+        try {
+            sessionStorage.setItem(`etag:${endpoint}`, JSON.stringify({ etag, data }));
+        } catch (e) {
+            // storage full or disabled; just skip caching
+        }
+    }
+
     // GET request
     async get(endpoint, includeAuth = true) {
         try {
+            const headers = this.getHeaders(includeAuth);
+            const cached = this.readCached(endpoint);
+            if (cached) headers['If-None-Match'] = cached.etag;
             const response = await fetch(`${this.baseURL}${endpoint}`, {
                 method: 'GET',
-                headers: this.getHeaders(includeAuth)
+                headers,
+                cache: 'no-store'
             });
-            
-            return await this.handleResponse(response);
+
+            if (response.status === 304 && cached) return cached.data;
+            const data = await this.handleResponse(response);
+            const etag = response.headers.get('ETag');
+            if (etag) this.storeCached(endpoint, etag, data);
+            return data;
         } catch (error) {
             console.error('GET request error:', error);
             throw error;
@@ -164,6 +201,23 @@ class APIClient {
         return await this.delete(`/api/services/${id}`);
     }
     
+    // Whole service catalog in one request: { version, categories (each with
+    // subcategories and their services), services (uncategorized), packages }
+    async getCatalog() {
+        return await this.get('/api/catalog', false);
+    }
+
+    // every service of a catalog as a flat list
+    catalogServices(catalog) {
+        const out = [];
+        (catalog.categories || []).forEach(c => {
+            (c.subcategories || []).forEach(sub => out.push(...(sub.services || [])));
+            out.push(...(c.services || []));
+        });
+        out.push(...(catalog.services || []));
+        return out;
+    }
+
     // Categories endpoints
     async getCategories() {
         const data = await this.get('/api/categories', false);
@@ -186,6 +240,14 @@ class APIClient {
         return await this.get('/api/packages', false);
     }
     
+    // Availability endpoints
+    // one call covers a whole calendar (up to 31 days): per-day slot bitmaps plus free staff per slot
+    async getSlotRange(serviceId, from, to, location = '') {
+        const params = new URLSearchParams({ service_id: serviceId, from, to });
+        if (location) params.set('location', location);
+        return await this.get(`/api/slots/range?${params.toString()}`, false);
+    }
+    
     // Appointments endpoints
     async createAppointment(appointmentData) {
         return await this.post('/api/appointments', appointmentData);
@@ -260,24 +322,28 @@ class APIClient {
         }
         const customerId = customerResp.id || customerResp.customer_id || customerResp.user_id || customerResp.id;
 
-        // Post each item to /cart; the first response contains cart id
-        let cartId = null;
-        for (const item of cartItems) {
-            const resp = await this.post('/cart', {
-                customer_id: customerId,
-                product_id: item.id,
-                quantity: item.quantity
-            });
-            if (!cartId && resp && resp.id) cartId = resp.id;
-        }
-
+        // Get or create the server cart, then make its lines match the local
+        // cart in one batch request
+        const cart = await this.post('/cart', { customer_id: customerId });
+        const cartId = cart && cart.id;
         if (!cartId) throw new Error('Failed to create cart on server');
+        await this.updateCartItems(cartId, cartItems.map(item => ({
+            product_id: item.id,
+            quantity: item.quantity
+        })), true);
 
         // Create order
         const order = await this.post('/orders', { customer_id: customerId, cart_id: cartId });
         return order;
     }
     
+    // Batch cart change: items [{product_id, quantity}] set each line's quantity
+    // (0 removes it); replace=true also removes lines not listed. Resolves to
+    // the cart with subtotal, discount and total.
+    async updateCartItems(cartId, items, replace = false) {
+        return await this.put(`/cart/${cartId}/items`, { items, replace });
+    }
+
     async createProduct(productData) {
         return await this.post('/products', productData);
     }
@@ -325,9 +391,10 @@ class APIClient {
         return await this.delete(`/stock/${id}`);
     }
 
-    // Offers endpoints
-    async getOffers() {
-        const data = await this.get('/offers', false);
+    // Offers endpoints; customers get today's live offers, admins can ask
+    // for every offer including expired and inactive ones
+    async getOffers(all = false) {
+        const data = all ? await this.get('/offers?all=1') : await this.get('/offers', false);
         return Array.isArray(data) ? { offers: data } : data;
     }
 
@@ -453,6 +520,13 @@ class APIClient {
         return Array.isArray(data) ? data : (data.assignments || data);
     }
 
+    // Incremental assignments feed: pass the cursor from the previous call to
+    // get only rows changed since then. Returns { assignments, cursor }.
+    async syncStaffAssignments(since = null) {
+        const query = since ? `?since=${encodeURIComponent(since)}` : '';
+        return await this.get(`/api/staff/me/assignments${query}`);
+    }
+
     async getMyDeliveries() {
         const data = await this.get('/deliveries/my');
         return data;
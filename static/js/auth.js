@@ -49,6 +49,8 @@ class AuthManager {
         localStorage.removeItem(this.tokenKey);
         localStorage.removeItem(this.userKey);
         localStorage.removeItem('cart'); // Clear cart on logout
+        // drop responses cached by apiClient.get (some are admin-only)
+        Object.keys(sessionStorage).filter(k => k.startsWith('etag:')).forEach(k => sessionStorage.removeItem(k));
         this.updateNavigationState();
     }
     